@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+# Run the TFT benchmark suite (tft_benchmark.py) with the host emulation.
+
+# Usage:
+# ./bench.py -o bench.json                  # run all tasks and save the results
+# ./bench.py -c old.json                    # compare with the results of a previous run
+# ./bench.py -s line_                       # run only the line tasks
+# The times measured on the host are not the times of the board, but the
+# bus statistics and the estimated bus times are the same.
+
+import os
+import sys
+import json
+import argparse
+
+import tft_emu
+
+def compare(old, new):
+    print("{:<24}{:>12}{:>12}{:>8}{:>12}{:>12}{:>8}".format(
+        "task", "old est_us", "new est_us", "ratio", "old us", "new us", "ratio"))
+    for name, res in new["results"].items():
+        prev = old["results"].get(name)
+        if prev is None:
+            continue
+        print("{:<24}{:>12}{:>12}{:>8.2f}{:>12}{:>12}{:>8.2f}".format(
+            name, prev.get("est_us", 0), res.get("est_us", 0),
+            res.get("est_us", 0) / max(prev.get("est_us", 0), 1),
+            prev["us"], res["us"], res["us"] / max(prev["us"], 1)))
+
+
+def main():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description="Run the TFT benchmarks with the emulated SSD1963")
+    parser.add_argument("-o", "--output", help="save the results as JSON file")
+    parser.add_argument("-c", "--compare", help="compare with the results in this JSON file")
+    parser.add_argument("-s", "--select", help="run only tasks whose name starts with SELECT")
+    parser.add_argument("-l", "--lcd", default="LB04301", help="LCD type, default LB04301")
+    parser.add_argument("-p", "--portrait", action="store_true", help="use portrait orientation")
+    parser.add_argument("--pictures", default=os.path.join(root, "Pictures"),
+                        help="directory with the sample pictures")
+    parser.add_argument("--no-pictures", action="store_true", help="skip the picture tasks")
+    args = parser.parse_args()
+
+    tft_emu.install()
+    import tft
+    import tft_benchmark
+
+    mytft = tft.TFT("SSD1963", args.lcd, tft.PORTRAIT if args.portrait else tft.LANDSCAPE)
+    report = tft_benchmark.run(mytft, None if args.no_pictures else args.pictures,
+                               select=args.select)
+    report["backend"] = "emulator"
+    report["lcd"] = args.lcd
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=1, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+
+# Convert BMP, PNG or JPEG files to TFI files, a display native image format,
+# which tft_image.py draws without any conversion on the board.
+
+# Usage:
+# ./img_to_tfi.py F0020.bmp F0013.bmp           # produces F0020.tfi and F0013.tfi
+# ./img_to_tfi.py -m 16 photo.jpg               # 565 type data, 2 bytes per pixel
+# ./img_to_tfi.py -m 8 -W 480 -H 272 photo.jpg  # 256 color palette, scaled to fit
+# ./img_to_tfi.py -r background.bmp             # PackBits compressed rows
+# BMP files are read directly. PNG, JPEG and the scaling and palette
+# reduction require the Pillow package.
+#
+# TFI file layout, all numbers little endian:
+#   header: 4s magic b"TFI1", B bits per pixel (1, 2, 4, 8, 16 or 24),
+#           B flags (1: RLE), H reserved, H width, H height, H palette entries,
+#           H reserved
+#   palette: 4 bytes blue, green, red, 0 per entry, like BMP files
+#   rows: top down, as drawBitmap() takes them. Pixels of less than 8 bits
+#         are packed MSB first, and every row starts at a byte boundary.
+#         16 bit pixels are 565 type data with the low byte first, and 24 bit
+#         pixels are red, green, blue bytes.
+#         With the flag RLE, the rows are PackBits compressed in blocks of
+#         H size, H rows, followed by size bytes of data for these rows, as
+#         drawBitmap() takes them with the mode RLE | bits. Compressed
+#         files have 8, 16 or 24 bits per pixel.
+
+import os
+import sys
+import argparse
+from struct import pack, unpack
+
+TFI_MAGIC = b"TFI1"
+TFI_RLE = 1  # flag of PackBits compressed rows
+RLE_BLOCK = 4096  # compressed rows are grouped into blocks of at most this size
+
+def getname(sourcefile):
+    return os.path.splitext(sourcefile)[0]
+#
+# Return the bits per pixel of a BMP file
+#
+def read_bmp_bits(name):
+    with open(name, "rb") as f:
+        return unpack("<h", f.read(30)[28:30])[0]
+#
+# Read a BMP file into (width, height, bits, palette, rows), where rows is the
+# list of the top down rows without padding
+#
+def read_bmp(name):
+    with open(name, "rb") as f:
+        BM, filesize, res0, offset = unpack("<hiii", f.read(14))
+        (hdrsize, imgwidth, imgheight, planes, colors, compress, imgsize,
+         h_res, v_res, ct_size, cti_size) = unpack("<iiihhiiiiii", f.read(40))
+        if colors not in (1, 2, 4, 8, 16, 24):
+            raise ValueError("Unsupported color depth: {}".format(colors))
+        palette = b""
+        if colors <= 8:
+            if ct_size == 0: # if 0, size is 2**colors
+                ct_size = 1 << colors
+            f.seek(hdrsize + 14)
+            palette = f.read(ct_size * 4)
+        f.seek(offset)
+        bsize = (imgwidth * colors + 7) // 8
+        rsize = (bsize + 3) & ~3 # rows are padded to 4 bytes
+        rows = [f.read(rsize)[:bsize] for row in range(abs(imgheight))]
+    if imgheight > 0: # bottom up
+        rows.reverse()
+    return imgwidth, abs(imgheight), colors, palette, rows
+#
+# Read any image with Pillow into (width, height, bits, palette, rows).
+# mode 24 or 16 gives RGB rows, mode 8, 4, 2 or 1 palette indices.
+#
+def read_pillow(name, mode, width, height):
+    try:
+        from PIL import Image
+    except ImportError:
+        raise ValueError("Reading {} requires the Pillow package".format(name))
+    img = Image.open(name)
+    if width or height:
+        img.thumbnail((width or img.width, height or img.height))
+    if mode >= 16:
+        img = img.convert("RGB")
+        data = img.tobytes()
+        row = img.width * 3
+        rows = [data[i:i + row] for i in range(0, len(data), row)]
+        return img.width, img.height, 24, b"", rows
+    img = img.convert("RGB").quantize(1 << mode)
+    colors = img.getpalette()[:(1 << mode) * 3]
+    palette = bytearray()
+    for i in range(0, len(colors), 3):
+        palette += bytes((colors[i + 2], colors[i + 1], colors[i], 0))
+    data = img.tobytes()
+    rows = []
+    for y in range(img.height):
+        rows.append(pack_indices(data[y * img.width:(y + 1) * img.width], mode))
+    return img.width, img.height, mode, bytes(palette), rows
+#
+# Pack palette indices MSB first into bytes of 8 // bits pixels
+#
+def pack_indices(indices, bits):
+    if bits == 8:
+        return bytes(indices)
+    per_byte = 8 // bits
+    res = bytearray((len(indices) + per_byte - 1) // per_byte)
+    for i, index in enumerate(indices):
+        res[i // per_byte] |= index << (8 - bits - (i % per_byte) * bits)
+    return bytes(res)
+#
+# Convert an RGB row to the row data of mode 16 or 24
+#
+def encode_rgb(row, mode):
+    if mode == 24:
+        return bytes(row)
+    res = bytearray()
+    for i in range(0, len(row), 3):
+        red, green, blue = row[i], row[i + 1], row[i + 2]
+        res += pack("<H", ((red & 0xf8) << 8) | ((green & 0xfc) << 3) | (blue >> 3))
+    return bytes(res)
+#
+# Decode a BMP row into RGB data
+#
+def decode_bmp_row(row, bits, palette, width):
+    res = bytearray()
+    if bits == 24:
+        for i in range(0, width * 3, 3):
+            res += bytes((row[i + 2], row[i + 1], row[i]))
+    elif bits == 16:
+        for i in range(0, width * 2, 2):
+            value = row[i] | (row[i + 1] << 8)
+            res += bytes(((value >> 8) & 0xf8, (value >> 3) & 0xfc, (value << 3) & 0xf8))
+    else:
+        per_byte = 8 // bits
+        for i in range(width):
+            index = (row[i // per_byte] >> (8 - bits - (i % per_byte) * bits)) & ((1 << bits) - 1)
+            res += bytes((palette[index * 4 + 2], palette[index * 4 + 1], palette[index * 4]))
+    return bytes(res)
+
+#
+# PackBits compress data of pixels of size bytes, as drawBitmap() takes it
+# with the mode flag RLE: a control byte n = 0..127 is followed by n + 1
+# literal pixels, n = 129..255 by a pixel repeated 257 - n times
+#
+def packbits(data, size):
+    pixels = [bytes(data[i:i + size]) for i in range(0, len(data), size)]
+    res = bytearray()
+    literal = []
+    def flush():
+        if literal:
+            res.append(len(literal) - 1)
+            res.extend(b"".join(literal))
+            del literal[:]
+    i = 0
+    while i < len(pixels):
+        run = 1
+        while i + run < len(pixels) and run < 128 and pixels[i + run] == pixels[i]:
+            run += 1
+        if run >= 3 or (run == 2 and not literal):
+            flush()
+            res.append(257 - run)
+            res.extend(pixels[i])
+            i += run
+        else:
+            literal.append(pixels[i])
+            if len(literal) == 128:
+                flush()
+            i += 1
+    flush()
+    return bytes(res)
+
+#
+# Unpack indices of less than 8 bits into bytes
+#
+def unpack_indices(row, bits, width):
+    per_byte = 8 // bits
+    return bytes((row[i // per_byte] >> (8 - bits - (i % per_byte) * bits)) & ((1 << bits) - 1)
+                 for i in range(width))
+#
+# Compress the rows into blocks of at most RLE_BLOCK bytes, as long as a
+# single row fits
+#
+def rle_blocks(rows, bits):
+    blocks = []
+    block = bytearray()
+    count = 0
+    for row in rows:
+        data = packbits(row, bits // 8)
+        if count and len(block) + len(data) > RLE_BLOCK:
+            blocks.append(pack("<HH", len(block), count) + block)
+            block = bytearray()
+            count = 0
+        block += data
+        count += 1
+    if count:
+        blocks.append(pack("<HH", len(block), count) + block)
+    return blocks
+
+def convert(sourcefile, destfile, mode, width, height, rle=False):
+    if (os.path.splitext(sourcefile)[1].lower() == ".bmp" and not (width or height)
+            and mode in (0, 16, 24, read_bmp_bits(sourcefile))):
+        imgwidth, imgheight, bits, palette, rows = read_bmp(sourcefile)
+        if bits == 24 and mode in (0, 24):
+            mode = 24 # BMP files hold blue, green, red
+        if mode and (mode != bits or bits == 24):
+            rows = [encode_rgb(decode_bmp_row(row, bits, palette, imgwidth), mode) for row in rows]
+            bits, palette = mode, b""
+    else:
+        imgwidth, imgheight, bits, palette, rows = read_pillow(sourcefile, mode or 16, width, height)
+        if bits == 24:
+            bits = mode or 16
+            rows = [encode_rgb(row, bits) for row in rows]
+    if rle:
+        if bits < 8:
+            rows = [unpack_indices(row, bits, imgwidth) for row in rows]
+            bits = 8
+        rows = rle_blocks(rows, bits)
+    with open(destfile, "wb") as f:
+        f.write(pack("<4sBBHHHHH", TFI_MAGIC, bits, TFI_RLE if rle else 0, 0,
+                     imgwidth, imgheight, len(palette) // 4, 0))
+        f.write(palette)
+        for row in rows:
+            f.write(row)
+    print("{}: {} x {} pixels, {} bits per pixel{}".format(destfile, imgwidth, imgheight,
+          bits, ", RLE" if rle else ""))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(__file__, description =
+"""Utility for converting BMP, PNG or JPEG files into TFI files, which
+tft_image.py draws without conversion.
+Sample usage: ./img_to_tfi.py F0020.bmp
+Produces F0020.tfi""",
+    formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('infiles', metavar ='N', type = str, nargs = '+', help = 'input file paths')
+    parser.add_argument("--mode", "-m", type = int, choices = (1, 2, 4, 8, 16, 24), default = 0,
+                        help = "bits per pixel, default: those of a BMP file, 16 else")
+    parser.add_argument("--width", "-W", type = int, default = 0, help = "scale down to fit this width")
+    parser.add_argument("--height", "-H", type = int, default = 0, help = "scale down to fit this height")
+    parser.add_argument("--outdir", "-o", default = None, help = "directory for the output files")
+    parser.add_argument("--rle", "-r", action = "store_true", help = "PackBits compress the rows")
+    args = parser.parse_args()
+    errlist = [f for f in args.infiles if not os.path.isfile(f)]
+    if len(errlist):
+        print("These image filenames don't exist:")
+        for f in errlist:
+            print(f)
+        sys.exit(1)
+    for sourcefile in args.infiles:
+        destfile = getname(sourcefile) + ".tfi"
+        if args.outdir is not None:
+            destfile = os.path.join(args.outdir, os.path.basename(destfile))
+        try:
+            convert(sourcefile, destfile, args.mode, args.width, args.height, args.rle)
+        except (OSError, ValueError) as err:
+            print(err)
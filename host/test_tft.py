@@ -0,0 +1,504 @@
+#!/usr/bin/env python3
+
+# Regression tests of the TFT class with the host emulation.
+
+# Usage:
+# python -m pytest host/test_tft.py
+
+import random
+
+import pytest
+
+import tft_emu
+
+tft_emu.install()
+import tft
+from img_to_tfi import packbits
+
+
+@pytest.fixture
+def mytft():
+    return tft.TFT("SSD1963", "LB04301", tft.LANDSCAPE)
+
+#
+# Return the RGB data of the rectangle as shown in the frame memory
+#
+def frame(mytft, x1, y1, x2, y2):
+    buf = bytearray((x2 - x1 + 1) * (y2 - y1 + 1) * 3)
+    mytft.readRegion(x1, y1, x2, y2, buf)
+    return buf
+
+#
+# A PackBits compressed bitmap covering two shadow regions has to leave
+# both regions with the same data as the frame memory
+#
+@pytest.mark.parametrize("bits", (8, 16, 24))
+def test_rle_two_shadow_regions(mytft, bits):
+    rnd = random.Random(bits)
+    sx, sy, size = 200, 100, bits // 8
+    data = bytearray()
+    while len(data) < sx * sy * size:
+        pixel = bytes(rnd.randrange(256) for i in range(size))
+        if rnd.random() < 0.5:
+            data += pixel * rnd.randrange(1, 300)
+        else:
+            data += bytes(rnd.randrange(256) for i in range(size * rnd.randrange(1, 500)))
+    colortable = bytes(rnd.randrange(256) for i in range(1024))
+    regions = ((20, 20, 120, 80), (60, 40, 250, 130))
+    for region in regions:
+        mytft.add_shadow(*region)
+    mytft.drawBitmap(10, 15, sx, sy, packbits(data[:sx * sy * size], size),
+                     tft.RLE | bits, colortable)
+    for region, shadow in zip(regions, mytft.shadow.regions):
+        assert shadow[5] == frame(mytft, *region)
+
+#
+# Return the screen after printing the parts of the text with printString(),
+# or char by char with printChar() if parts is None, over a striped background
+#
+def print_screen(mytft, text, parts, transparency, gap, shadow=None):
+    from font14 import font14
+    width, height = mytft.getScreensize()
+    for x in range(0, width, 7):
+        mytft.fillRectangle(x, 0, x + 3, height - 1, (x & 0xff, 80, 160))
+    if shadow is not None:
+        mytft.add_shadow(*shadow)
+    mytft.setTextStyle((255, 255, 0), (0, 0, 90), transparency, font14, gap)
+    mytft.setTextPos(10, 20)
+    if parts is None:
+        for c in text:
+            mytft.printChar(c)
+    else:
+        for part in parts:
+            mytft.printString(part)
+    mytft.sync()
+    return frame(mytft, 0, 0, width - 1, height - 1)
+
+#
+# printString() has to give the same pixels as printChar(), however the
+# text is split into runs
+#
+@pytest.mark.parametrize("transparency", (0, 1, 2))
+@pytest.mark.parametrize("gap", (0, 3))
+def test_print_runs(transparency, gap):
+    ref = print_screen(tft.TFT("SSD1963", "LB04301"), "abcd", None, transparency, gap)
+    for parts in (("abcd",), ("a", "b", "cd"), ("ab", "cd")):
+        mytft = tft.TFT("SSD1963", "LB04301")
+        assert print_screen(mytft, "abcd", parts, transparency, gap) == ref
+
+@pytest.mark.parametrize("gap", (0, 3))
+def test_print_runs_shadow(gap):
+    for shadow in ((0, 0, 479, 271), (0, 0, 40, 271)):
+        ref = print_screen(tft.TFT("SSD1963", "LB04301"), "abcd", None, 2, gap, shadow)
+        mytft = tft.TFT("SSD1963", "LB04301")
+        assert print_screen(mytft, "abcd", ("abcd",), 2, gap, shadow) == ref
+
+#
+# Reading back is no damage
+#
+@pytest.mark.parametrize("mode", (None, "async", "ring", "list"))
+def test_read_no_damage(mytft, mode):
+    import io
+    if mode == "async":
+        mytft.setAsync()
+    elif mode == "ring":
+        mytft.startRender()
+    elif mode == "list":
+        mytft.startList()
+    mytft.track_damage()
+    mytft.fillRectangle(10, 10, 19, 19, (255, 0, 0))
+    buf = bytearray(100 * 2)
+    mytft.readRegion(100, 100, 109, 109, buf, 16)
+    mytft.capture(io.BytesIO())
+    mytft.fillRectangle(200, 200, 209, 209, (0, 255, 0))
+    mytft.sync() if mode != "list" else mytft.flush()
+    assert sorted(mytft.get_damage()) == [(10, 10, 19, 19), (200, 200, 209, 209)]
+    mytft.stopRender()
+    mytft.stopList()
+
+#
+# copyRect() damages the destination only
+#
+@pytest.mark.parametrize("mode", (None, "ring", "list"))
+def test_copy_rect_damage(mytft, mode):
+    if mode == "ring":
+        mytft.startRender()
+    elif mode == "list":
+        mytft.startList()
+    mytft.track_damage()
+    mytft.copyRect((0, 0, 49, 49), (300, 200))
+    mytft.sync() if mode != "list" else mytft.flush()
+    assert mytft.get_damage() == [(300, 200, 349, 249)]
+    mytft.stopRender()
+    mytft.stopList()
+
+#
+# copy_page() damages the lines of the destination page only
+#
+def test_copy_page_damage():
+    mytft = tft.TFT("SSD1963", "LB04301")
+    if mytft.pages < 2:
+        pytest.skip("a single page")
+    mytft.track_damage()
+    mytft.copy_page(0, 1)
+    lines = mytft.page_lines
+    assert mytft.get_damage() == [(0, lines, 479, 2 * lines - 1)]
+
+#
+# Adding a shadow region reads the background, which is no damage
+#
+def test_add_shadow_damage(mytft):
+    mytft.track_damage()
+    mytft.add_shadow(10, 10, 109, 59)
+    assert mytft.get_damage() == []
+
+#
+# Return the set of the pixels of a line with the color, stepped pixel by
+# pixel as the UTFT Library does
+#
+def line_pixels(x1, y1, x2, y2):
+    dx, xstep = (x2 - x1, 1) if x2 > x1 else (x1 - x2, -1)
+    dy, ystep = (y2 - y1, 1) if y2 > y1 else (y1 - y2, -1)
+    col, row = x1, y1
+    pixels = {(col, row)}
+    if dx < dy:
+        t = - (dy >> 1)
+        while row != y2:
+            row += ystep
+            t += dx
+            if t >= 0:
+                col += xstep
+                t -= dy
+            pixels.add((col, row))
+    else:
+        t = - (dx >> 1)
+        while col != x2:
+            col += xstep
+            t += dy
+            if t >= 0:
+                row += ystep
+                t -= dx
+            pixels.add((col, row))
+    return pixels
+
+#
+# Return the set of the pixels of the rectangle with the color
+#
+def lit_pixels(mytft, x1, y1, x2, y2, color):
+    buf = frame(mytft, x1, y1, x2, y2)
+    width = x2 - x1 + 1
+    return {(x1 + i % width, y1 + i // width) for i in range(len(buf) // 3)
+            if bytes(buf[i * 3:i * 3 + 3]) == bytes(color)}
+
+#
+# drawLine() has to light the same pixels as the per pixel Bresenham steps,
+# for lines in all octants, horizontal, vertical, steep and flat ones
+#
+def test_draw_line(mytft):
+    x, y = 240, 136
+    ends = [(x + dx, y + dy) for dx, dy in
+            ((100, 0), (-100, 0), (0, 100), (0, -100), (0, 0),
+             (100, 37), (37, 100), (-37, 100), (-100, 37),
+             (-100, -37), (-37, -100), (37, -100), (100, -37),
+             (100, 100), (-100, -100), (100, -100), (-100, 100),
+             (100, 1), (-100, -1), (1, 100), (-1, -100), (2, 1), (1, 2))]
+    color = (255, 255, 255)
+    for x2, y2 in ends:
+        mytft.fillRectangle(x - 100, y - 100, x + 100, y + 100, (0, 0, 0))
+        mytft.drawLine(x, y, x2, y2, color)
+        assert lit_pixels(mytft, x - 100, y - 100, x + 100, y + 100, color) == \
+            line_pixels(x, y, x2, y2), (x2, y2)
+
+#
+# Fill a circle and return the set of the pixels lit with the color and the
+# list of the windows set while filling
+#
+def fill_circle(mytft, x, y, radius, color):
+    windows = []
+    set_xy = mytft.setXY
+    def record(x1, y1, x2, y2):
+        windows.append((x1, y1, x2, y2))
+        set_xy(x1, y1, x2, y2)
+    width, height = mytft.getScreensize()
+    box = (max(x - radius - 1, 0), max(y - radius - 1, 0),
+           min(x + radius + 1, width - 1), min(y + radius + 1, height - 1))
+    if box[0] > box[2] or box[1] > box[3]:  # off the screen
+        box = (0, 0, 0, 0)
+    mytft.fillRectangle(*box, (0, 0, 0))
+    mytft.setXY = record
+    try:
+        mytft.fillCircle(x, y, radius, color)
+    finally:
+        mytft.setXY = set_xy
+    return lit_pixels(mytft, *box, color), windows
+
+#
+# fillCircle() has to write every row once, with the same edges as the
+# outline of drawCircle(), and clip rows and columns at the screen edges
+#
+def test_fill_circle(mytft):
+    width, height = mytft.getScreensize()
+    x, y, color = 240, 136, (0, 255, 0)
+    for radius in (0, 1, 2, 3, 7, 20, 61, 130):
+        box = (x - radius, y - radius, x + radius, y + radius)
+        mytft.fillRectangle(*box, (0, 0, 0))
+        mytft.drawCircle(x, y, radius, color)
+        outline = lit_pixels(mytft, *box, color)
+        filled, windows = fill_circle(mytft, x, y, radius, color)
+        rows = [row for x1, y1, x2, y2 in windows for row in range(y1, y2 + 1)]
+        assert sorted(rows) == list(range(y - radius, y + radius + 1))
+        for row in range(y - radius, y + radius + 1):
+            edges = [col for col, r in outline if r == row]
+            cols = sorted(col for col, r in filled if r == row)
+            assert cols == list(range(min(edges), max(edges) + 1)), (radius, row)
+        for dx, dy in ((-235, -130), (230, 130), (0, -130), (-300, 0), (0, 150)):
+            clipped, windows = fill_circle(mytft, x + dx, y + dy, radius, color)
+            assert clipped == {(col + dx, row + dy) for col, row in filled
+                               if 0 <= col + dx < width and 0 <= row + dy < height}
+            rows = [row for x1, y1, x2, y2 in windows for row in range(y1, y2 + 1)]
+            assert len(rows) == len(set(rows))
+            for x1, y1, x2, y2 in windows:
+                assert 0 <= x1 <= x2 < width and 0 <= y1 <= y2 < height
+
+#
+# Close rectangles are merged if the union adds at most threshold pixels,
+# and rectangles inside a recorded one are dropped
+#
+def test_damage_merge():
+    from tft_damage import Damage
+    damage = Damage(100)
+    damage.add(0, 0, 9, 9)
+    damage.add(10, 0, 19, 9)  # adjacent: no extra pixels
+    assert damage.get() == [(0, 0, 19, 9)]
+    damage.add(5, 2, 15, 7)  # inside
+    assert damage.get() == [(0, 0, 19, 9)]
+    damage.add(9, 19, 0, 10)  # swapped corners, 100 extra pixels
+    assert damage.get() == [(0, 0, 19, 19)]
+    damage.add(0, 21, 19, 30)  # 20 extra pixels
+    damage.add(40, 0, 49, 9)  # 100 extra pixels, but more with the union
+    damage.add(0, 50, 9, 59)  # 300 extra pixels
+    assert sorted(damage.get()) == [(0, 0, 19, 30), (0, 50, 9, 59), (40, 0, 49, 9)]
+    damage.clear()
+    assert damage.get() == []
+
+#
+# Beyond max_rects rectangles, the pair with the least extra area is merged
+#
+def test_damage_max_rects():
+    from tft_damage import Damage
+    damage = Damage(0, max_rects=4)
+    for x, y in ((0, 0), (0, 200), (200, 200), (200, 0)):
+        damage.add(x, y, x + 9, y + 9)
+    assert len(damage.get()) == 4
+    damage.add(220, 0, 229, 9)  # 100 extra pixels with the last one
+    assert sorted(damage.get()) == [(0, 0, 9, 9), (0, 200, 9, 209),
+                                    (200, 0, 229, 9), (200, 200, 209, 209)]
+    assert Damage.extra((200, 0, 209, 9), (220, 0, 229, 9)) == 100
+    assert Damage.extra((0, 0, 9, 9), (5, 5, 14, 14)) == 50
+
+#
+# Nothing is recorded while paused
+#
+def test_damage_paused(mytft):
+    from tft_damage import Damage
+    damage = Damage(0)
+    damage.paused = True
+    damage.add(0, 0, 9, 9)
+    damage.paused = False
+    damage.add(20, 20, 29, 29)
+    assert damage.get() == [(20, 20, 29, 29)]
+    mytft.track_damage()
+    mytft.damage.paused = True
+    mytft.fillRectangle(10, 10, 19, 19, (255, 0, 0))
+    mytft.drawPixel(30, 30, bytearray((255, 0, 0)))
+    mytft.damage.paused = False
+    mytft.drawPixel(40, 40, bytearray((255, 0, 0)))
+    assert mytft.get_damage() == [(40, 40, 40, 40)]
+
+#
+# Drawing to another page records the frame memory lines of that page
+#
+def test_damage_pages(mytft):
+    if mytft.pages < 2:
+        pytest.skip("a single page")
+    lines = mytft.page_lines
+    mytft.track_damage(threshold=0)
+    mytft.draw_to(1)
+    mytft.fillRectangle(10, 10, 19, 19, (255, 0, 0))
+    mytft.drawPixel(30, 30, bytearray((255, 0, 0)))
+    mytft.draw_to(0)
+    mytft.drawPixel(40, 40, bytearray((255, 0, 0)))
+    assert sorted(mytft.get_damage()) == [(10, lines + 10, 19, lines + 19),
+                                          (30, lines + 30, 30, lines + 30),
+                                          (40, 40, 40, 40)]
+
+#
+# Draw a mix of fills, bitmaps, raw writes and text and return the screen
+#
+def draw_scene(mytft):
+    from font14 import font14
+    rnd = random.Random(4)
+    mytft.fillRectangle(0, 0, 479, 271, (0, 0, 64))
+    mytft.fillRectangle(20, 20, 119, 69, (255, 0, 0))  # covered by the next one
+    mytft.fillRectangle(10, 10, 129, 79, (0, 255, 0))
+    for y in range(100, 140, 10):  # merged across the squares in between
+        mytft.fillRectangle(0, y, 99, y + 9, (255, 255, 0))
+        mytft.fillRectangle(200 + y, 20, 205 + y, 25, (0, 0, 255))
+    for x in range(150, 190, 10):  # merged to the right
+        mytft.fillRectangle(x, 100, x + 9, 119, (0, 255, 255))
+    colortable = bytes(rnd.randrange(256) for i in range(1024))
+    for i, bits in enumerate((1, 4, 8, 16, 24)):
+        data = bytes(rnd.randrange(256) for i in range((40 * 30 * bits) // 8))
+        mytft.drawBitmap(150 + i * 45, 150, 40, 30, data, bits,
+                         None if bits in (1, 16, 24) else colortable)
+    data = bytes(rnd.randrange(256) for i in range(20 * 20 * 3))
+    mytft.drawBitmap(10, 200, 20, 10, data[:600], 24)  # blits of a column
+    mytft.drawBitmap(10, 210, 20, 10, data[600:], 24)
+    mytft.setXY(300, 200, 319, 209)  # raw writes
+    mytft.tft_data(data[:210])
+    mytft.fillSCR(bytearray((255, 255, 255)), 50)
+    mytft.tft_data(data[210:420])
+    mytft.drawLine(0, 271, 479, 150, (255, 128, 0))
+    mytft.drawPixel(470, 10, bytearray((255, 255, 255)))
+    mytft.drawCircle(400, 200, 40, (128, 255, 128))
+    mytft.setTextStyle((255, 255, 0), (0, 0, 90), 0, font14)
+    mytft.setTextPos(10, 240)
+    mytft.printString("Display list")
+    mytft.setTextStyle((255, 255, 255), None, 1, font14)
+    mytft.setTextPos(200, 240)
+    mytft.printString("transparent")
+    return frame(mytft, 0, 0, 479, 271)
+
+#
+# Drawing through a display list has to give the same screen as drawing
+# directly, with the covered fill dropped and the fills of the same color
+# merged
+#
+def test_display_list():
+    ref = draw_scene(tft.TFT("SSD1963", "LB04301"))
+    mytft = tft.TFT("SSD1963", "LB04301")
+    mytft.startList()
+    windows = []
+    send_chain = mytft.dlist.io_tft_chain
+    def record(ops):
+        windows.extend(op[1:] for op in ops if op[0] == 3)
+        send_chain(ops)
+    mytft.dlist.io_tft_chain = record
+    assert draw_scene(mytft) == ref
+    assert (20, 20, 119, 69) not in windows
+    assert (0, 100, 99, 139) in windows
+    assert (150, 100, 189, 119) in windows
+    assert (10, 200, 29, 219) in windows
+    mytft.stopList()
+
+#
+# Drawing through the ring on core 1 has to give the same screen as drawing
+# directly, and an exception on core 1 has to be raised by check()
+#
+def test_ring():
+    ref = draw_scene(tft.TFT("SSD1963", "LB04301"))
+    mytft = tft.TFT("SSD1963", "LB04301")
+    mytft.startRender(16)
+    assert draw_scene(mytft) == ref
+    def fail(data, pixels):
+        raise ValueError("failed on core 1")
+    mytft.ring.io_fillSCR = fail
+    mytft.check()
+    mytft.fillRectangle(0, 0, 9, 9, (255, 0, 0))
+    while mytft.ring.running:
+        tft.time.sleep_ms(1)
+    with pytest.raises(ValueError):
+        mytft.check()
+    with pytest.raises(RuntimeError):
+        mytft.sync()
+    mytft.stopRender()
+    assert frame(mytft, 0, 0, 9, 9) == b"".join(ref[y * 1440:y * 1440 + 30] for y in range(10))
+
+#
+# Drawing to a hidden page leaves the panel unchanged, show() presents the
+# page and copy_page() copies it
+#
+def test_pages(mytft):
+    if mytft.pages < 3:
+        pytest.skip("less than three pages")
+    mytft.fillRectangle(0, 0, 479, 271, (0, 0, 128))
+    shown = mytft.tft_io.panel()[2]
+    assert shown == frame(mytft, 0, 0, 479, 271)
+    mytft.draw_to(1)
+    page1 = draw_scene(mytft)
+    assert mytft.tft_io.panel()[2] == shown
+    mytft.copy_page(1, 2)
+    mytft.draw_to(2)
+    assert frame(mytft, 0, 0, 479, 271) == page1
+    mytft.draw_to(0)
+    assert frame(mytft, 0, 0, 479, 271) == shown
+    assert mytft.tft_io.panel()[2] == shown
+    for page, screen in ((1, page1), (2, page1), (0, shown)):
+        mytft.show(page)
+        assert mytft.tft_io.panel()[2] == screen
+
+#
+# Print the lines of (color, text) pairs with printString(), or char by char
+# with printChar(), and return the screen
+#
+def print_lines(mytft, lines, by_char=False):
+    from font14 import font14
+    for i, (color, text) in enumerate(lines):
+        mytft.setTextStyle(color, (0, 0, 90), 0, font14)
+        mytft.setTextPos(10, 10 + i * 25)
+        if by_char:
+            for c in text:
+                mytft.printChar(c)
+        else:
+            mytft.printString(text)
+    return frame(mytft, 0, 0, 479, 271)
+
+#
+# Text printed with the glyph cache has to look like uncached text. A glyph
+# is built again after a change of the color and after it was dropped.
+#
+@pytest.mark.parametrize("by_char", (False, True))
+def test_glyph_cache(by_char):
+    lines = [((255, 255, 0), "abba"), ((255, 255, 0), "ab"),
+             ((0, 255, 255), "ab"), ((255, 255, 0), "ba")]
+    ref = print_lines(tft.TFT("SSD1963", "LB04301"), lines, by_char)
+    mytft = tft.TFT("SSD1963", "LB04301")
+    mytft.cache_glyphs()
+    assert print_lines(mytft, lines, by_char) == ref
+    hits, misses, glyphs, size = mytft.get_glyph_stats()
+    assert (hits, misses, glyphs) == (6, 4, 4)
+    assert size == 23 * (12 + 11) * 3 * 2
+    mytft = tft.TFT("SSD1963", "LB04301")
+    mytft.cache_glyphs(True, 23 * 12 * 3)  # room for a single glyph
+    assert print_lines(mytft, lines, by_char) == ref
+    hits, misses, glyphs, size = mytft.get_glyph_stats()
+    assert (hits, misses, glyphs) == (2, 8, 1)
+    assert size <= 23 * 12 * 3
+
+#
+# A BMP file converted to TFI, raw and PackBits compressed, has to look like
+# the BMP file when drawn. BMP files with 24 bits per pixel hold blue, green,
+# red, which tft_image sends unchanged, while the TFI file holds red, green,
+# blue, so red and blue are swapped for the comparison. Converted to mode 16,
+# the colors keep the upper 5, 6 and 5 bits.
+#
+@pytest.mark.parametrize("name", ("F0020_1", "F0020_4", "F0020_8", "F0012", "F0013"))
+@pytest.mark.parametrize("mode", (0, 16))
+@pytest.mark.parametrize("rle", (False, True))
+def test_tfi_round_trip(tmp_path, name, mode, rle):
+    import os
+    import tft_image
+    from img_to_tfi import convert, read_bmp_bits
+    source = os.path.join(os.path.dirname(__file__), "..", "Pictures", name + ".bmp")
+    tfi = str(tmp_path / (name + ".tfi"))
+    convert(source, tfi, mode, 0, 0, rle)
+    mytft = tft.TFT("SSD1963", "LB04301")
+    tft_image.displayfile(mytft, source, 480, 272)
+    ref = frame(mytft, 0, 0, 479, 271)
+    if read_bmp_bits(source) == 24:
+        ref[0::3], ref[2::3] = ref[2::3], ref[0::3]
+    if mode == 16:
+        ref = bytearray(value & mask for value, mask in zip(ref, b"\xf8\xfc\xf8" * 480 * 272))
+    mytft = tft.TFT("SSD1963", "LB04301")
+    tft_image.displayfile(mytft, tfi, 480, 272)
+    assert frame(mytft, 0, 0, 479, 271) == ref
@@ -0,0 +1,1281 @@
+#
+# Host side emulation of the SSD1963 controller and of the RP2040 hardware
+# used by the RP2040 port. rp2040/tft_pio.py runs unchanged on it: the viper
+# functions run as Python functions on emulated ptr8, ptr16 and ptr32
+# pointers, the state machines take the words written into their FIFOs like
+# the PIO programs do, and the DMA channels copy between buffers, FIFOs and
+# registers. With that, the TFT class, vt100.py and slides.displayfile() run
+# under CPython on a PC, which allows to measure and regression-test
+# rendering changes without a board.
+#
+# Usage:
+#
+#   import tft_emu
+#   tft_emu.install()      # register the MicroPython stand-in modules
+#   import tft             # this is rp2040/tft.py, now using the emulator
+#   mytft = tft.TFT("SSD1963", "AT070TN92", tft.LANDSCAPE)
+#   mytft.drawCircle(100, 100, 50)
+#   mytft.tft_io.save_ppm("screen.ppm")
+#
+# The emulation works on the level of the bus: every command and data byte
+# sent by the bus engine is interpreted like the SSD1963 does it. Supported
+# are the 0x2a/0x2b/0x2c/0x3c address windows and memory writes, 0x2e/0x3e
+# memory reads, 0x33/0x37 scrolling, the 0x36 address mode bits, the 0xb0
+# panel size and the 0x45 scan line, which runs at FRAME_RATE. All other
+# commands are just stored and can be read back with the matching get_xxx
+# command code, which is for most commands cmd + 1.
+#
+# The PIO programs are not run instruction by instruction. Every program of
+# tft_pio.py has a model here, which decodes the FIFO words as the program
+# does: the tags of the bus engine, the 565 pixels and the color indices of
+# the palette lookup. Buffers get addresses in an emulated 32 bit address
+# space, such that the DMA control blocks of the command chain and the
+# addresses pushed by the palette lookup are followed like on the board.
+# Protocol errors, like a word which is no engine tag, a state machine
+# writing to pins which are not connected to it or a DMA access outside
+# of any buffer or register, raise an exception.
+# DMA transfers are run when the CPU accesses a register or a state machine
+# or waits. So an asynchronous transfer takes its data when it is waited for,
+# which shows buffers changed too early as wrong pixels.
+#
+# TFT.startRender() works as well: the _thread module of CPython stands in
+# for core 1, so the command ring can be tested on the PC.
+#
+
+import sys
+import os
+import gc
+import time
+import types
+import array
+import bisect
+import ctypes
+import random
+import builtins
+import binascii
+import itertools
+import threading
+import collections
+
+# define constants
+#
+RESET  = 14  ## Pin 14
+BASEPIN = 2  ## Pin 2
+
+PORTRAIT = 1
+LANDSCAPE = 0
+
+ENGINE_DATA = 0   # entry points of the bus engine
+ENGINE_READ = 5
+ENGINE_FILL = 14
+ENGINE_CMD = 25
+ENGINE_NEXT = 26
+ENGINE_SIDE = 0x1c00  # side set 0b111 of the tag instructions
+ENGINE_SIZE = 27  # instructions of pio_engine, loaded at the end of the memory
+
+FRAME_PIXELS = (1215 * 1024) // 3  # the SSD1963 has 1215 kByte of frame memory
+FRAME_RATE = 60  # frames per second of the emulated panel
+
+RAM_BASE = 0x20000000  # the emulated address space of the buffers
+RAM_END = 0x40000000
+RAM_SWEEP = 4096  # buffers registered before the unused ones are dropped
+
+DMA_BASE = 0x50000000
+DMA_CHANNELS = 12
+CHAN_REGS = 16  # words per channel
+CHAN_ABORT = 0x111  # Address offset / 4
+MULTI_CHAN_TRIGGER = 0x10c  # Address offset / 4
+TREQ_FORCE = 0x3f
+BUSY = 1 << 24
+
+PIO0_BASE = 0x50200000
+PIO1_BASE = 0x50300000
+PIO_FSTAT = 1  # Address offset / 4
+PIO_FDEBUG = 2
+PIO_TXF0 = 4
+PIO_RXF0 = 8
+PIO_SM0_ADDR = 0x35
+PIO_SM_REGS = 6  # words per state machine
+
+IO_BANK0_BASE = 0x40014000
+GPIO_PINS = 30
+FUNC_PIO0 = 6  # GPIO function select values
+FUNC_NULL = 0x1f
+
+# the registers of the four aliases of a channel, the last one of each
+# alias is the trigger
+CHAN_FIELDS = ("read", "write", "count", "ctrl",
+               "ctrl", "read", "write", "count",
+               "ctrl", "count", "read", "write",
+               "ctrl", "write", "count", "read")
+# the value of a word written with 8 or 16 bits to a peripheral, which
+# gets the data replicated into all byte lanes
+REPLICATE = {1: 0x01010101, 2: 0x00010001, 4: 1}
+MASK = {1: 0xff, 2: 0xffff, 4: 0xffffffff}
+ITEM_TYPE = {1: "B", 2: "H", 4: "I"}
+
+#
+# The address of the data of a buffer object in the memory of the host,
+# taken from the buffer protocol
+#
+class _Py_buffer(ctypes.Structure):
+    _fields_ = [("buf", ctypes.c_void_p), ("obj", ctypes.c_void_p),
+                ("len", ctypes.c_ssize_t), ("itemsize", ctypes.c_ssize_t),
+                ("readonly", ctypes.c_int), ("ndim", ctypes.c_int),
+                ("format", ctypes.c_char_p), ("shape", ctypes.c_void_p),
+                ("strides", ctypes.c_void_p), ("suboffsets", ctypes.c_void_p),
+                ("internal", ctypes.c_void_p)]
+
+_get_buffer = ctypes.pythonapi.PyObject_GetBuffer
+_get_buffer.argtypes = (ctypes.py_object, ctypes.POINTER(_Py_buffer), ctypes.c_int)
+_release_buffer = ctypes.pythonapi.PyBuffer_Release
+_release_buffer.argtypes = (ctypes.POINTER(_Py_buffer),)
+
+def _host_address(obj):
+    view = _Py_buffer()
+    _get_buffer(obj, ctypes.byref(view), 0x1c)  # PyBUF_RECORDS_RO
+    try:
+        return view.buf or 0
+    finally:
+        _release_buffer(ctypes.byref(view))
+
+#
+# The RAM of the emulated RP2040. Every buffer gets an address when
+# uctypes.addressof() or uint() is applied to it, or to a memoryview of it,
+# and keeps it as long as it is alive. The buffers are held by the memory,
+# and the ones nobody else refers to any more are dropped from time to time,
+# as their memory would be freed on the board.
+#
+class Memory:
+
+    def __init__(self):
+        self.buffers = {}  # id(buffer): [buffer, address, size]
+        self.starts = []  # start addresses and entries, sorted by address
+        self.regions = []
+        self.next = RAM_BASE
+        self.sweep_at = RAM_SWEEP
+
+    def address(self, obj):
+        offset = 0
+        if isinstance(obj, memoryview):
+            base = obj.obj
+            offset = _host_address(obj) - _host_address(base)
+        else:
+            base = obj
+        size = memoryview(base).nbytes
+        entry = self.buffers.get(id(base))
+        if entry is None or entry[2] != size:
+            if entry is not None:  # resized, so it got new memory
+                self.drop(entry)
+            entry = self.add(base, size)
+        return entry[1] + offset
+
+    def add(self, base, size):
+        if len(self.buffers) >= self.sweep_at:
+            self.sweep()
+        address = (self.next + 15) & ~15
+        if address + size > RAM_END:
+            address = self.gap(size)
+        self.next = address + size
+        entry = [base, address, size]
+        index = bisect.bisect(self.starts, address)
+        self.starts.insert(index, address)
+        self.regions.insert(index, entry)
+        self.buffers[id(base)] = entry
+        return entry
+
+    def drop(self, entry):
+        index = bisect.bisect_left(self.starts, entry[1])
+        while self.regions[index] is not entry:
+            index += 1
+        del self.starts[index]
+        del self.regions[index]
+        del self.buffers[id(entry[0])]
+#
+# Drop the buffers which are only referred to by the memory
+#
+    def sweep(self):
+        for entry in list(self.buffers.values()):
+            if sys.getrefcount(entry[0]) <= 2:
+                self.drop(entry)
+        self.sweep_at = max(RAM_SWEEP, len(self.buffers) * 2)
+#
+# Find the first gap of size bytes between the buffers, when the end of the
+# address space has been reached
+#
+    def gap(self, size):
+        address = RAM_BASE
+        for start, entry in zip(self.starts, self.regions):
+            if address + size <= start:
+                return address
+            address = max(address, (start + entry[2] + 15) & ~15)
+        if address + size <= RAM_END:
+            return address
+        raise MemoryError("emulated RAM exhausted")
+#
+# Return the buffer at address and the offset of the address in it
+#
+    def find(self, address, size=1):
+        index = bisect.bisect_right(self.starts, address) - 1
+        if index >= 0:
+            base, start, length = self.regions[index]
+            if address + size <= start + length:
+                return base, address - start
+        raise ValueError("no buffer at address 0x{:08x}".format(address))
+#
+# Return a byte memoryview of size bytes at address
+#
+    def view(self, address, size):
+        base, offset = self.find(address, size)
+        return memoryview(base).cast("B")[offset:offset + size]
+
+memory = Memory()
+
+#
+# The pointers of viper functions. A pointer to a buffer reads and writes its
+# items directly, values written are truncated to the item size like viper
+# does. A pointer to a peripheral address reads and writes the registers.
+#
+class Ptr:
+
+    def __init__(self, obj, size, address=None):
+        self.obj = obj
+        self.address = address
+        view = memoryview(obj).cast("B")
+        if size > 1:
+            view = view[:len(view) - len(view) % size].cast(ITEM_TYPE[size])
+        self.view = view
+        self.mask = MASK[size]
+
+    def __getitem__(self, index):
+        return self.view[index]
+
+    def __setitem__(self, index, value):
+        self.view[index] = value & self.mask
+
+
+class Registers:
+
+    def __init__(self, address):
+        self.address = address
+
+    def __getitem__(self, index):
+        return hardware.read(self.address + index * 4)
+
+    def __setitem__(self, index, value):
+        hardware.write(self.address + index * 4, value & 0xffffffff)
+
+
+def _pointer(obj, size):
+    if isinstance(obj, (Ptr, Registers)):
+        obj = uint(obj)
+    if isinstance(obj, int):
+        address = obj & 0xffffffff
+        if RAM_BASE <= address < RAM_END:
+            base, offset = memory.find(address)
+            return Ptr(memoryview(base).cast("B")[offset:], size, address)
+        if size != 4:
+            raise ValueError("registers are accessed by ptr32, not at 0x{:08x}".format(address))
+        return Registers(address)
+    return Ptr(obj, size)
+
+def ptr8(obj):
+    return _pointer(obj, 1)
+
+def ptr16(obj):
+    return _pointer(obj, 2)
+
+def ptr32(obj):
+    return _pointer(obj, 4)
+#
+# The address of a pointer or buffer, or an integer as unsigned 32 bit value
+#
+def uint(value):
+    if isinstance(value, Ptr):
+        return value.address if value.address is not None else memory.address(value.obj)
+    if isinstance(value, Registers):
+        return value.address
+    if isinstance(value, int):
+        return value & 0xffffffff
+    return memory.address(value)
+#
+# Emulation of uctypes.addressof()
+#
+def addressof(obj):
+    return memory.address(obj)
+#
+# Emulation of the micropython.viper decorator: the arguments annotated as
+# pointers or uint are converted like viper does it at the call
+#
+def viper(function):
+    code = function.__code__
+    names = code.co_varnames[:code.co_argcount]
+    annotations = getattr(function, "__annotations__", {})
+    convert = [(i, annotations[name]) for i, name in enumerate(names)
+               if annotations.get(name) in (ptr8, ptr16, ptr32, uint)]
+    if not convert:
+        return function
+
+    def call(*args):
+        args = list(args)
+        for i, kind in convert:
+            if i < len(args):
+                args[i] = kind(args[i])
+        return function(*args)
+    call.__name__ = function.__name__
+    return call
+
+
+class SSD1963:
+
+    def __init__(self):
+        self.reset()
+#
+# Hard or soft reset: clear all settings. The frame memory content is undefined
+# after power up, it is set to 0 here.
+#
+    def reset(self):
+        self.regs = {}
+        self.cmd = 0
+        self.params = bytearray()
+        self.pending = bytearray()
+        self.result = None
+        self.result_pos = 0
+        self.leftover = b""
+        self.mode = 0
+        self.display_on = False
+        self.set_size(864, 480)
+        self.scroll_tfa = 0
+        self.scroll_vsa = self.height
+        self.scroll_bfa = 0
+        self.scroll_start = 0
+#
+# Set the size of the panel, which also defines the layout of the frame memory
+#
+    def set_size(self, width, height):
+        self.width = width
+        self.height = height
+        self.columns = width
+        self.pages = FRAME_PIXELS // width
+        self.frame = bytearray(self.columns * self.pages * 3)
+        self.sc, self.ec = 0, width - 1
+        self.sp, self.ep = 0, height - 1
+        self.cur_c, self.cur_p = self.sc, self.sp
+#
+# Accept a command byte. The parameters following it are collected and
+# applied with every data byte.
+#
+    def command(self, cmd):
+        self.cmd = cmd
+        self.params = bytearray()
+        self.pending = bytearray()
+        self.result = None
+        self.result_pos = 0
+        if cmd != 0x3e:  # 0x3e continues a read within the last pixel
+            self.leftover = b""
+        if cmd == 0x01:    # soft reset
+            mode = self.mode
+            self.reset()
+            self.mode = mode
+        elif cmd == 0x28:  # display off
+            self.display_on = False
+        elif cmd == 0x29:  # display on
+            self.display_on = True
+        elif cmd == 0x2c or cmd == 0x2e:  # write/read memory start
+            self.cur_c, self.cur_p = self.sc, self.sp
+
+    def data(self, data):
+        cmd = self.cmd
+        if cmd == 0x2c or cmd == 0x3c:  # memory write
+            if self.pending:
+                data = self.pending + data
+            n = len(data) // 3
+            if n:
+                self.write_pixels(data, n)
+            self.pending = bytearray(data[n * 3:])
+            return
+        params = self.params
+        params += data
+        self.regs[cmd] = bytes(params)
+        if cmd == 0x2a and len(params) >= 4:  # set column address
+            self.sc = (params[0] << 8) | params[1]
+            self.ec = (params[2] << 8) | params[3]
+        elif cmd == 0x2b and len(params) >= 4:  # set page address
+            self.sp = (params[0] << 8) | params[1]
+            self.ep = (params[2] << 8) | params[3]
+        elif cmd == 0x33 and len(params) >= 6:  # set scroll area
+            self.scroll_tfa = (params[0] << 8) | params[1]
+            self.scroll_vsa = (params[2] << 8) | params[3]
+            self.scroll_bfa = (params[4] << 8) | params[5]
+        elif cmd == 0x36 and len(params) >= 1:  # set address mode
+            self.mode = params[0]
+        elif cmd == 0x37 and len(params) >= 2:  # set scroll start
+            self.scroll_start = (params[0] << 8) | params[1]
+        elif cmd == 0xb0 and len(params) >= 6:  # set lcd mode
+            width = ((params[2] << 8) | params[3]) + 1
+            height = ((params[4] << 8) | params[5]) + 1
+            if (width, height) != (self.width, self.height):
+                self.set_size(width, height)
+                self.scroll_vsa = height
+#
+# Read size bytes of the data of the last command. Memory reads keep the
+# rest of a pixel for a following 0x3e. The result of other commands is
+# padded with zeros.
+#
+    def read_data(self, size):
+        cmd = self.cmd
+        if cmd == 0x2e or cmd == 0x3e:  # memory read
+            data = self.leftover
+            if len(data) < size:
+                data = bytes(data) + self.read_pixels((size - len(data) + 2) // 3)
+            self.leftover = data[size:]
+            return bytes(data[:size])
+        if self.result is None:
+            if cmd == 0x0b:  # get address mode
+                self.result = bytes([self.mode])
+            elif cmd == 0x0a:  # get power mode
+                self.result = bytes([0x04 if self.display_on else 0])
+            elif cmd == 0x45:  # get scan line
+                line = self.scanline()
+                self.result = bytes([line >> 8, line & 0xff])
+            else:  # get_xxx of a set_xxx command
+                self.result = self.regs.get(cmd - 1, b"")
+        pos = self.result_pos
+        self.result_pos += size
+        return (self.result[pos:pos + size] + bytes(size))[:size]
+#
+# The scan line from the time, with the vertical total of set_vert_period
+#
+    def scanline(self):
+        params = self.regs.get(0xb6, b"\x01\x20")
+        total = ((params[0] << 8) | params[1]) + 1
+        return int(time.perf_counter() * FRAME_RATE * total) % total
+#
+# Map a logical address to the frame memory, obeying the address mode bits
+# 7 (page order), 6 (column order) and 5 (page/column exchange). Pixel data
+# written in landscape orientation goes along the columns, in portrait
+# orientation along the pages.
+#
+    def walk(self, n):
+        mode = self.mode
+        while n > 0:
+            c, p = self.cur_c, self.cur_p
+            if mode & 0x20:  # pages first
+                count = max(min(n, self.ep - p + 1), 1)
+                self.cur_p += count
+                if self.cur_p > self.ep:
+                    self.cur_p = self.sp
+                    self.cur_c = self.cur_c + 1 if self.cur_c < self.ec else self.sc
+            else:            # columns first
+                count = max(min(n, self.ec - c + 1), 1)
+                self.cur_c += count
+                if self.cur_c > self.ec:
+                    self.cur_c = self.sc
+                    self.cur_p = self.cur_p + 1 if self.cur_p < self.ep else self.sp
+            if mode & 0x40:
+                c = self.width - 1 - c
+            if mode & 0x80:
+                p = self.height - 1 - p
+# get the position of the first pixel, the step to the next one and the part
+# of the run which is inside the frame memory
+            if mode & 0x20:
+                inside = 0 <= c < self.columns
+                start, limit = p, self.pages
+                step = self.columns * 3
+                reverse = mode & 0x80
+            else:
+                inside = 0 <= p < self.pages
+                start, limit = c, self.columns
+                step = 3
+                reverse = mode & 0x40
+            if not inside:
+                k0 = k1 = 0
+            elif reverse:
+                step = -step
+                k0, k1 = max(0, start - limit + 1), min(count, start + 1)
+            else:
+                k0, k1 = max(0, -start), min(count, limit - start)
+            yield (p * self.columns + c) * 3, step, k0, k1, count
+            n -= count
+
+    def write_pixels(self, data, n):
+        frame = self.frame
+        bgr = self.mode & 0x08
+        offset = 0
+        for pos, step, k0, k1, count in self.walk(n):
+            if k1 > k0:
+                src = (offset + k0) * 3
+                start = pos + k0 * step
+                if step == 3 and not bgr:
+                    frame[start:start + (k1 - k0) * 3] = data[src:(offset + k1) * 3]
+                else:
+                    for ch in range(3):
+                        stop = start + ch + (k1 - k0) * step
+                        frame[start + ch:stop if stop >= 0 else None:step] = \
+                            data[src + (2 - ch if bgr else ch):(offset + k1) * 3:3]
+            offset += count
+
+    def fill_pixels(self, color, n):
+        frame = self.frame
+        color = bytes(color[:3])
+        if self.mode & 0x08:
+            color = color[::-1]
+        for pos, step, k0, k1, count in self.walk(n):
+            if k1 > k0:
+                start = pos + k0 * step
+                if step == 3:
+                    frame[start:start + (k1 - k0) * 3] = color * (k1 - k0)
+                else:
+                    for ch in range(3):
+                        stop = start + ch + (k1 - k0) * step
+                        frame[start + ch:stop if stop >= 0 else None:step] = \
+                            bytes(color[ch:ch + 1]) * (k1 - k0)
+
+    def read_pixels(self, n):
+        frame = self.frame
+        bgr = self.mode & 0x08
+        data = bytearray(n * 3)
+        offset = 0
+        for pos, step, k0, k1, count in self.walk(n):
+            if k1 > k0:
+                dst = (offset + k0) * 3
+                start = pos + k0 * step
+                for ch in range(3):
+                    stop = start + ch + (k1 - k0) * step
+                    data[dst + (2 - ch if bgr else ch):(offset + k1) * 3:3] = \
+                        frame[start + ch:stop if stop >= 0 else None:step]
+            offset += count
+        return data
+#
+# Return the image shown on the panel as tuple (width, height, rgb data), taking
+# the scroll settings and the flip bits 0 (vertical) and 1 (horizontal) into account.
+#
+    def panel(self):
+        width, height = self.width, self.height
+        line_size = self.columns * 3
+        frame = self.frame
+        image = bytearray(width * height * 3)
+        tfa, vsa, vsp = self.scroll_tfa, self.scroll_vsa, self.scroll_start
+        for line in range(height):
+            mem = line
+            if tfa <= line < tfa + vsa:
+                mem = vsp + line - tfa
+                if vsp < tfa + vsa and mem >= tfa + vsa:
+                    mem -= vsa
+            dst = (height - 1 - line) if self.mode & 0x01 else line
+            if mem < self.pages:
+                row = frame[mem * line_size:mem * line_size + width * 3]
+                if self.mode & 0x02:
+                    row = row[::-1]
+                    row[0::3], row[2::3] = row[2::3], row[0::3]
+                image[dst * width * 3:(dst + 1) * width * 3] = row
+        return width, height, image
+
+#
+# The models of the PIO programs of tft_pio.py. feed() takes the words
+# written into the TX FIFO, each multiplied by spread, which tells how the
+# data of narrow DMA writes is replicated into the byte lanes.
+#
+class Program:
+
+    def __init__(self, machine):
+        self.machine = machine
+        self.offset = 0
+
+    def exec(self, instr):
+        raise ValueError("instruction {!r} not emulated for {}".format(
+            instr, type(self).__name__))
+#
+# A program stalls on its empty TX FIFO while it is running
+#
+    def stalled(self):
+        return self.machine.running
+#
+# The bus engine: tags with a jmp to the handler in the lower half word and
+# the count - 1 or the command byte in the upper one
+#
+class Engine(Program):
+    NEXT = 0
+    DATA = 1
+    FILL = 2
+    READ = 3
+
+    def __init__(self, machine):
+        super().__init__(machine)
+        self.offset = 32 - ENGINE_SIZE
+        self.state = Engine.NEXT
+        self.count = 0
+
+    def exec(self, instr):
+        if instr != ENGINE_SIDE | (self.offset + ENGINE_NEXT):
+            super().exec(instr)
+        self.state = Engine.NEXT
+
+    def feed(self, values, spread):
+        i, n = 0, len(values)
+        while i < n:
+            if self.state == Engine.DATA:
+                count = min(self.count, n - i)
+                chunk = values[i:i + count]
+                if isinstance(chunk, (bytes, bytearray)):
+                    chunk = bytes(chunk)
+                else:
+                    chunk = bytes([value & 0xff for value in chunk])
+                self.machine.output()
+                self.machine.controller.data(chunk)
+                self.count -= count
+                if self.count == 0:
+                    self.state = Engine.NEXT
+                i += count
+            else:
+                self.word(values[i] * spread)
+                i += 1
+
+    def word(self, word):
+        state = self.state
+        controller = self.machine.controller
+        if state == Engine.NEXT:
+            instr = word & 0xffff
+            entry = (instr & 0x1f) - self.offset
+            count = (word >> 16) + 1
+            if instr & ~0x1f != ENGINE_SIDE:
+                raise ValueError("not an engine tag: 0x{:08x}".format(word))
+            if entry == ENGINE_CMD:
+                self.machine.output()
+                controller.command((word >> 16) & 0xff)
+            elif entry == ENGINE_DATA:
+                self.state, self.count = Engine.DATA, count
+            elif entry == ENGINE_FILL:
+                self.state, self.count = Engine.FILL, count
+            elif entry == ENGINE_READ:
+                self.state, self.count = Engine.READ, count
+            elif entry != ENGINE_NEXT:
+                raise ValueError("not an engine tag: 0x{:08x}".format(word))
+        elif state == Engine.FILL:
+            self.machine.output()
+            controller.fill_pixels(bytes((word & 0xff, (word >> 8) & 0xff,
+                                          (word >> 16) & 0xff)), self.count)
+            self.state = Engine.NEXT
+        elif state == Engine.READ:
+            if word & 0xffff != 0xff00:
+                raise ValueError("wrong pin directions of a read: 0x{:08x}".format(word))
+            self.machine.output()
+            self.machine.rx.extend(controller.read_data(self.count))
+            self.state = Engine.NEXT
+#
+# pio_data_write_565: the lower half word of each word is a 565 pixel
+#
+class Writer565(Program):
+
+    def feed(self, values, spread):
+        data = bytearray(len(values) * 3)
+        i = 0
+        for value in values:
+            pixel = value * spread
+            data[i] = (pixel >> 8) & 0xf8
+            data[i + 1] = (pixel >> 3) & 0xfc
+            data[i + 2] = (pixel << 3) & 0xf8
+            i += 3
+        self.machine.output()
+        self.machine.controller.data(bytes(data))
+#
+# pio_index_N: push the address of the color of every index of bits bits,
+# taken MSB first from the upper byte of each word. y holds the upper 22
+# bits of the address of the colortable.
+#
+class IndexLookup(Program):
+
+    def __init__(self, machine, bits):
+        super().__init__(machine)
+        self.bits = bits
+        self.osr = None
+        self.y = None
+        self.table = None
+        self.table_y = None
+
+    def exec(self, instr):
+        if instr == "pull()":
+            if not self.machine.tx:
+                raise RuntimeError("pull() on the empty FIFO blocks")
+            self.osr = self.machine.tx.popleft()
+        elif instr == "mov(y, osr)":
+            self.y = self.osr
+        elif instr == "out(null, 32)":
+            self.osr = None
+        else:
+            super().exec(instr)
+
+    def feed(self, values, spread):
+        if self.y is None:
+            raise RuntimeError("the colortable address is not set in y")
+        if self.table_y != self.y:  # the addresses of the indices of every byte
+            bits = self.bits
+            mask = (1 << bits) - 1
+            base = (self.y << 10) & 0xffffffff
+            shifts = range(8 - bits, -1, -bits)
+            self.table = [[base | (((byte >> shift) & mask) << 2) for shift in shifts]
+                          for byte in range(256)]
+            self.table_y = self.y
+        if not isinstance(values, bytes) or spread != REPLICATE[1]:
+            values = bytes([((value * spread) >> 24) & 0xff for value in values])
+        self.machine.rx.extend(itertools.chain.from_iterable(map(self.table.__getitem__, values)))
+
+PROGRAMS = {
+    "pio_engine": Engine,
+    "pio_data_write_565": Writer565,
+    "pio_index_1": lambda machine: IndexLookup(machine, 1),
+    "pio_index_2": lambda machine: IndexLookup(machine, 2),
+    "pio_index_4": lambda machine: IndexLookup(machine, 4),
+    "pio_index_8": lambda machine: IndexLookup(machine, 8),
+}
+
+#
+# A state machine: the FIFOs, the pins it drives and the model of its program.
+# Words written while it is stopped are queued in the TX FIFO of 4 words.
+#
+class Machine:
+
+    def __init__(self, id, controller):
+        self.id = id
+        self.controller = controller
+        self.program = None
+        self.running = False
+        self.tx = collections.deque()
+        self.rx = collections.deque()
+        self.pins = ()
+
+    def init(self, program, config):
+        if program.name not in PROGRAMS:
+            raise ValueError("no model of the PIO program {}".format(program.name))
+        self.program = PROGRAMS[program.name](self)
+        self.running = False
+        self.tx.clear()
+        self.rx.clear()
+# like MicroPython, connect the output and side set pins to this PIO
+        pins = []
+        for base, init in (("out_base", "out_init"), ("sideset_base", "sideset_init"),
+                           ("set_base", "set_init")):
+            pin = config.get(base)
+            if pin is not None and program.config.get(init):
+                pins.extend(range(pin.id, pin.id + len(program.config[init])))
+        self.pins = tuple(pins)
+        for pin in pins:
+            hardware.gpio[pin] = FUNC_PIO0 + self.id // 4
+
+    def push(self, values, spread):
+        if self.running:
+            self.program.feed(values, spread)
+        else:
+            self.tx.extend([value * spread for value in values])
+
+    def active(self, value):
+        self.running = bool(value) and self.program is not None
+        if self.running and self.tx:
+            values = list(self.tx)
+            self.tx.clear()
+            self.program.feed(values, 1)
+#
+# Check that the pins are connected to this state machine before it drives them
+#
+    def output(self):
+        function = FUNC_PIO0 + self.id // 4
+        gpio = hardware.gpio
+        for pin in self.pins:
+            if gpio[pin] != function:
+                raise RuntimeError("state machine {} writes to pin {}, which is not "
+                                   "connected to PIO{}".format(self.id, pin, self.id // 4))
+#
+# The number of words DMA may write into the TX FIFO or read from the RX FIFO
+#
+    def tx_space(self):
+        return 1 << 32 if self.running else max(4 - len(self.tx), 0)
+
+
+class Channel:
+
+    def __init__(self, index):
+        self.index = index
+        self.read = 0
+        self.write = 0
+        self.count = 0  # TRANS_COUNT as written, loaded by a trigger
+        self.remaining = 0
+        self.ctrl = 0
+        self.busy = False
+
+#
+# The DMA, the PIOs and the pin function select of the emulated RP2040.
+# The DMA channels are run whenever the CPU accesses the hardware or waits,
+# until they need data which is not there.
+#
+class RP2040:
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.reset(None)
+
+    def reset(self, controller):
+        with self.lock:
+            self.controller = controller
+            self.channels = [Channel(i) for i in range(DMA_CHANNELS)]
+            self.machines = {}
+            self.gpio = [FUNC_NULL] * GPIO_PINS
+
+    def machine(self, id):
+        if id not in self.machines:
+            self.machines[id] = Machine(id, self.controller)
+        return self.machines[id]
+
+    def read(self, address):
+        with self.lock:
+            self.run()
+            return self.register(address, None)
+
+    def write(self, address, value):
+        with self.lock:
+            self.run()
+            self.register(address, value)
+#
+# Read (value is None) or write a register
+#
+    def register(self, address, value):
+        if DMA_BASE <= address < DMA_BASE + 0x1000:
+            offset = (address - DMA_BASE) >> 2
+            if offset < DMA_CHANNELS * CHAN_REGS:
+                return self.channel_register(self.channels[offset // CHAN_REGS],
+                                             offset % CHAN_REGS, value)
+            if offset == MULTI_CHAN_TRIGGER or offset == CHAN_ABORT:
+                for channel in self.channels:
+                    if value is not None and value & (1 << channel.index):
+                        if offset == CHAN_ABORT:
+                            channel.busy = False
+                            channel.remaining = 0
+                        else:
+                            self.trigger(channel)
+                return 0
+        elif PIO0_BASE <= address < PIO0_BASE + 0x1000 or PIO1_BASE <= address < PIO1_BASE + 0x1000:
+            pio = 0 if address < PIO1_BASE else 1
+            result = self.pio_register(pio, (address & 0xfff) >> 2, value)
+            if result is not None:
+                return result
+        elif IO_BANK0_BASE <= address < IO_BANK0_BASE + GPIO_PINS * 8:
+            offset = (address - IO_BANK0_BASE) >> 2
+            if not offset & 1:  # status
+                return 0
+            if value is not None:
+                self.gpio[offset >> 1] = value & 0x1f
+            return self.gpio[offset >> 1]
+        raise ValueError("no emulated register at 0x{:08x}".format(address))
+
+    def channel_register(self, channel, offset, value):
+        field = CHAN_FIELDS[offset]
+        if value is None:
+            if field == "ctrl":
+                return channel.ctrl | (BUSY if channel.busy else 0)
+            if field == "count":
+                return channel.remaining
+            return getattr(channel, field)
+        if field == "ctrl":
+            channel.ctrl = value & ~BUSY
+        elif field == "count":
+            channel.count = value
+        else:
+            setattr(channel, field, value)
+        if offset & 3 == 3 and value:  # a trigger, but not a null trigger
+            self.trigger(channel)
+        return 0
+
+    def pio_register(self, pio, offset, value):
+        machines = [self.machines.get(pio * 4 + sm) for sm in range(4)]
+        if offset == PIO_FSTAT:
+            status = 0
+            for sm, machine in enumerate(machines):
+                if machine is None or not machine.rx:
+                    status |= 1 << (8 + sm)  # RXEMPTY
+                elif len(machine.rx) >= 4:
+                    status |= 1 << sm  # RXFULL
+                if machine is None or not machine.tx:
+                    status |= 1 << (24 + sm)  # TXEMPTY
+                elif len(machine.tx) >= 4:
+                    status |= 1 << (16 + sm)  # TXFULL
+            return status
+        if offset == PIO_FDEBUG:  # the stall flags are not sticky here
+            status = 0
+            for sm, machine in enumerate(machines):
+                if machine is not None and machine.program is not None and machine.program.stalled():
+                    status |= 1 << (24 + sm)  # TXSTALL
+            return status
+        if PIO_TXF0 <= offset < PIO_RXF0 + 4:
+            machine = self.machine(pio * 4 + (offset & 3))
+            if offset < PIO_RXF0:
+                if value is not None:
+                    machine.push([value], 1)
+                return 0
+            if not machine.rx:
+                raise RuntimeError("RX FIFO of state machine {} read while empty".format(machine.id))
+            return machine.rx.popleft()
+        sm, field = divmod(offset - PIO_SM0_ADDR, PIO_SM_REGS)
+        if field == 0 and 0 <= sm < 4:
+            machine = machines[sm]
+            return machine.program.offset if machine and machine.program else 0
+        return None
+#
+# Start a channel, if it is enabled
+#
+    def trigger(self, channel):
+        if channel.ctrl & 1:
+            channel.busy = True
+            channel.remaining = channel.count
+            if channel.remaining == 0:
+                self.complete(channel)
+
+    def complete(self, channel):
+        channel.busy = False
+        chain = (channel.ctrl >> 11) & 0xf
+        if chain != channel.index:
+            self.trigger(self.channels[chain])
+#
+# The number of transfers the data request treq allows
+#
+    def dreq(self, treq):
+        if treq == TREQ_FORCE:
+            return 1 << 32
+        if treq >= 16:
+            raise ValueError("DREQ 0x{:02x} not emulated".format(treq))
+        machine = self.machines.get(((treq >> 3) << 2) | (treq & 3))
+        if machine is None:
+            return 0
+        if treq & 4:
+            return len(machine.rx)
+        return machine.tx_space()
+#
+# Return the state machine and whether it is the RX FIFO, if address is a FIFO
+#
+    def fifo(self, address):
+        for pio, base in ((0, PIO0_BASE), (1, PIO1_BASE)):
+            offset = address - base
+            if PIO_TXF0 * 4 <= offset < (PIO_RXF0 + 4) * 4 and not offset & 3:
+                offset >>= 2
+                return self.machine(pio * 4 + (offset & 3)), offset >= PIO_RXF0
+        return None
+#
+# Run the busy channels as long as any of them makes progress
+#
+    def run(self):
+        with self.lock:
+            progress = True
+            while progress:
+                progress = False
+                for channel in self.channels:
+                    if channel.busy and self.transfer(channel):
+                        progress = True
+
+    def transfer(self, channel):
+        ctrl = channel.ctrl
+        n = min(channel.remaining, self.dreq((ctrl >> 15) & 0x3f))
+        if n <= 0:
+            return False
+        size = 1 << ((ctrl >> 2) & 3)
+        incr_read = ctrl & 0x10
+        incr_write = ctrl & 0x20
+        ring = (ctrl >> 6) & 0xf
+        source = self.fifo(channel.read)
+        target = self.fifo(channel.write)
+        if (source is None and target is not None and not target[1]
+                and incr_read and not incr_write and not ring):
+# a block of memory into a TX FIFO
+            block = memory.view(channel.read, n * size)
+            values = bytes(block) if size == 1 else block.cast(ITEM_TYPE[size]).tolist()
+            target[0].push(values, REPLICATE[size])
+            channel.read += n * size
+        elif (source is not None and source[1] and target is None
+                and incr_write and not incr_read and not ring):
+# an RX FIFO into a block of memory
+            rx = source[0].rx
+            if n == len(rx):
+                words = array.array("I", rx)
+                rx.clear()
+            else:
+                words = array.array("I", [rx.popleft() for i in range(n)])
+# the lower bytes or half words of the words, which are little endian
+            values = memoryview(words).cast(ITEM_TYPE[size])[::4 // size]
+            memory.view(channel.write, n * size)[:] = values.tobytes()
+            channel.write += n * size
+        elif source is not None and source[1] and self.lookup(channel, source[0]):
+            return True
+        else:
+            ring_mask = (1 << ring) - 1 if ring else 0
+            read_mask, write_mask = (0, ring_mask) if ctrl & 0x400 else (ring_mask, 0)
+            for i in range(n):
+                self.store(channel.write, self.load(channel.read, size), size)
+                if incr_read:
+                    channel.read = self.step(channel.read, size, read_mask)
+                if incr_write:
+                    channel.write = self.step(channel.write, size, write_mask)
+        channel.remaining -= n
+        if channel.remaining == 0:
+            self.complete(channel)
+        return True
+
+    @staticmethod
+    def step(address, size, ring_mask):
+        if ring_mask:
+            return (address & ~ring_mask) | ((address + size) & ring_mask)
+        return address + size
+#
+# The palette lookup: channel reads the addresses of the colors from the RX
+# FIFO into the read trigger of a channel, which copies the color to a TX
+# FIFO and chains back. All addresses there are done at once.
+#
+    def lookup(self, channel, machine):
+        offset = channel.write - DMA_BASE
+        if (not 0 <= offset < DMA_CHANNELS * CHAN_REGS * 4 or offset & 0x3f != 0x3c
+                or channel.ctrl & 0x7fc != 0x8 or channel.count != 1
+                or (channel.ctrl >> 11) & 0xf != channel.index):
+            return False
+        color = self.channels[offset >> 6]
+        target = self.fifo(color.write)
+        if (color.busy or not color.ctrl & 1 or color.ctrl & 0x7fc != 0x10
+                or (color.ctrl >> 11) & 0xf != channel.index
+                or target is None or target[1]
+                or self.dreq((color.ctrl >> 15) & 0x3f) < 1 << 32):
+            return False
+        addresses = list(machine.rx)
+        machine.rx.clear()
+        size = color.count
+        colors = {}
+        for address in set(addresses):
+            colors[address] = memory.view(address, size).tobytes()
+        if addresses:
+            target[0].push(b"".join(map(colors.__getitem__, addresses)), REPLICATE[1])
+            color.read = addresses[-1] + size
+        channel.remaining = channel.count
+        return True
+
+    def load(self, address, size):
+        if RAM_BASE <= address < RAM_END:
+            return int.from_bytes(memory.view(address, size), "little")
+        value = self.register(address & ~3, None)
+        return (value >> ((address & 3) * 8)) & MASK[size]
+
+    def store(self, address, value, size):
+        if RAM_BASE <= address < RAM_END:
+            memory.view(address, size)[:] = value.to_bytes(size, "little")
+        else:
+            self.register(address & ~3, value * REPLICATE[size])
+
+hardware = RP2040()
+
+#
+# Stand-ins for the rp2 module: programs are known by the name of their function
+#
+class PIO:
+    OUT_LOW = 0
+    OUT_HIGH = 1
+    IN_LOW = 0
+    IN_HIGH = 1
+    SHIFT_LEFT = 0
+    SHIFT_RIGHT = 1
+
+
+class PIOProgram:
+
+    def __init__(self, name, config):
+        self.name = name
+        self.config = config
+
+
+def asm_pio(**config):
+    def assemble(function):
+        return PIOProgram(function.__name__, config)
+    return assemble
+
+
+class StateMachine:
+
+    def __init__(self, id, program=None, freq=-1, **config):
+        self.id = id
+        if program is not None:
+            self.init(program, freq, **config)
+
+    def machine(self):
+        hardware.run()
+        return hardware.machine(self.id)
+
+    def init(self, program, freq=-1, **config):
+        with hardware.lock:
+            self.machine().init(program, config)
+
+    def active(self, value=None):
+        with hardware.lock:
+            machine = self.machine()
+            if value is None:
+                return machine.running
+            machine.active(value)
+
+    def exec(self, instr):
+        with hardware.lock:
+            self.machine().program.exec(instr)
+
+    def put(self, value, shift=0):
+        with hardware.lock:
+            machine = self.machine()
+            if isinstance(value, int):
+                machine.push([(value << shift) & 0xffffffff], 1)
+                return
+            view = memoryview(value)
+            if view.itemsize == 1 and shift == 0:
+                machine.push(bytes(view), 1)
+            else:
+                machine.push([(item << shift) & 0xffffffff for item in view.tolist()], 1)
+
+    def get(self, buf=None, shift=0):
+        with hardware.lock:
+            machine = self.machine()
+            if not machine.rx:
+                raise RuntimeError("state machine {} blocks on the empty RX FIFO".format(self.id))
+            return machine.rx.popleft() >> shift
+
+    def tx_fifo(self):
+        with hardware.lock:
+            return len(self.machine().tx)
+
+    def rx_fifo(self):
+        with hardware.lock:
+            return len(self.machine().rx)
+
+#
+# The additions to the TFT_IO class of tft_pio.py, which connect it to an
+# emulated SSD1963. Creating a TFT_IO resets the emulated hardware, so only
+# the last one created can be used.
+#
+class EmulatedIO:
+
+    def __init__(self, base_pin=BASEPIN, orientation=LANDSCAPE, reset_pin=RESET):
+        self.controller = SSD1963()
+        hardware.reset(self.controller)
+        super().__init__(base_pin, orientation, reset_pin)
+#
+# Transfers run when the hardware is accessed, so let them run first
+#
+    def busy(self):
+        hardware.run()
+        return super().busy()
+#
+# Return what the panel shows as tuple of (width, height, rgb data)
+#
+    def panel(self):
+        self.wait()
+        return self.controller.panel()
+#
+# Save what the panel shows as binary PPM file
+#
+    def save_ppm(self, name):
+        width, height, image = self.panel()
+        with open(name, "wb") as f:
+            f.write(b"P6\n%d %d\n255\n" % (width, height))
+            f.write(image)
+
+TFT_IO = None  # set by install()
+
+#
+# Stand-ins for the MicroPython specific modules used by the library
+#
+class Pin:
+    IN = 0
+    OUT = 1
+    PULL_UP = 1
+    PULL_DOWN = 2
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self._value = value or 0
+
+    def init(self, *args, **kwargs):
+        pass
+
+    def value(self, value=None):
+        if value is None:
+            return self._value
+        self._value = value
+
+    def on(self):
+        self._value = 1
+
+    def off(self):
+        self._value = 0
+
+
+def _identity(f):
+    return f
+
+def _ticks_ms():
+    return int(time.monotonic() * 1000) & 0x3fffffff
+
+def _ticks_us():
+    return int(time.monotonic() * 1000000) & 0x3fffffff
+
+def _ticks_diff(a, b):
+    return ((a - b + 0x20000000) & 0x3fffffff) - 0x20000000
+
+def _ticks_add(a, b):
+    return (a + b) & 0x3fffffff
+#
+# Waiting lets the DMA run
+#
+def _sleep_ms(t):
+    hardware.run()
+    time.sleep(t / 1000)
+
+def _sleep_us(t):
+    hardware.run()
+    time.sleep(t / 1000000)
+
+def _module(name, **attrs):
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    sys.modules[name] = module
+    return module
+
+#
+# Install the stand-in modules and put the rp2040 port and the fonts on the path.
+# After that, "import tft" gets the RP2040 TFT class running on the emulator.
+#
+def install(port_dir=None):
+    global TFT_IO
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if port_dir is None:
+        port_dir = os.path.join(root, "rp2040")
+    for path in (os.path.join(root, "fonts"), root, port_dir):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+    for name, value in (("const", _identity), ("ptr8", ptr8), ("ptr16", ptr16),
+                        ("ptr32", ptr32), ("uint", uint)):
+        setattr(builtins, name, value)
+    time.sleep_ms = _sleep_ms
+    time.sleep_us = _sleep_us
+    for name, value in (("ticks_ms", _ticks_ms), ("ticks_us", _ticks_us),
+                        ("ticks_cpu", _ticks_us), ("ticks_diff", _ticks_diff),
+                        ("ticks_add", _ticks_add)):
+        if not hasattr(time, name):
+            setattr(time, name, value)
+    if not hasattr(gc, "mem_free"):
+        gc.mem_free = lambda: 200 * 1024 # about the free RAM of a Pico
+
+    builtins.micropython = _module("micropython", const=_identity, native=_identity,
+                                   viper=viper, asm_thumb=_identity,
+                                   mem_info=lambda *args: None)
+    _module("machine", Pin=Pin, freq=lambda *args: 125000000, idle=hardware.run)
+    _module("uctypes", addressof=addressof)
+    _module("rp2", PIO=PIO, StateMachine=StateMachine, asm_pio=asm_pio)
+    _module("pyb", delay=time.sleep_ms, udelay=time.sleep_us, millis=time.ticks_ms,
+            micros=time.ticks_us, elapsed_millis=lambda t: time.ticks_diff(time.ticks_ms(), t),
+            rng=lambda: random.getrandbits(30), Pin=Pin)
+    sys.modules["ubinascii"] = binascii
+    sys.modules["urandom"] = random
+    sys.modules["utime"] = time
+
+    import tft_pio
+    if TFT_IO is None:
+        TFT_IO = type("TFT_IO", (EmulatedIO, tft_pio.TFT_IO), {})
+    tft_pio.TFT_IO = TFT_IO
@@ -38,6 +38,7 @@
 #
 
 import pyb, stm, gc
+import struct
 from uctypes import addressof
 from tft_io import TFT_IO
 
@@ -56,6 +57,10 @@ POWER  = const(1 << 9) ## Y4
 PORTRAIT = const(1)
 LANDSCAPE = const(0)
 
+RLE = const(0x100)  ## mode flag of drawBitmap for PackBits compressed data
+TEXT_CHUNK = const(8192)  ## pixels composed at most by printString for a single window
+FRAME_PIXELS = const(414720)  ## 1215 kByte of frame memory at 3 bytes per pixel
+
 class TFT:
 
     def __init__(self, controller = "SSD1963", lcd_type = "LB04301", orientation = LANDSCAPE,
@@ -84,6 +89,13 @@ class TFT:
         self.setColor((255, 255, 255)) # set FG color to white as can be.
         self.setBGColor((0, 0, 0))     # set BG to black
         self.bg_buf = bytearray()
+        self.text_buf = bytearray()  # the glyphs composed by printString
+        self.damage = None  # no damage tracking
+        self.glyphs = None  # no glyph cache
+        self.page_draw = self.page_shown = 0  # the page drawn to and the one shown
+        self.te_pin = None  # the pin connected to the TE output
+        self.vblank = None  # the displayed scan lines, read at first use
+        self.scan_buf = bytearray(7)
 #
         self.pin_led = None     # deferred init Flag
         self.power_control = power_control
@@ -294,6 +306,11 @@ class TFT:
             print("Wrong Parameter controller: ", controller)
             return
 #
+# The number of screens which fit into the frame memory
+#
+        self.page_lines = self.disp_y_size + 1
+        self.pages = FRAME_PIXELS // ((self.disp_x_size + 1) * self.page_lines)
+#
 # Set character printing defaults
 #
         self.text_font = None
@@ -383,6 +400,28 @@ class TFT:
         self.setXY(x, y, x, y)
         self.tft_io.displaySCR_AS(color, 1)  #
 #
+# Draw pixels at the coordinates x0, y0, x1, y1, ... given in coords with
+# a single color. Same API as in the RP2040 port; here it just saves the
+# per pixel call of the Python function.
+#
+    def drawPixels(self, coords, color = None):
+        colorvect = self.colorvect if color is None else bytearray(color)
+        drawPixel = self.drawPixel
+        for i in range(0, len(coords) - 1, 2):
+            drawPixel(coords[i], coords[i + 1], colorvect)
+#
+# Draw pixels given as x, y, color triples in buffer, where color is 0xRRGGBB
+#
+    def drawPixelsColored(self, buffer):
+        drawPixel = self.drawPixel
+        colorvect = bytearray(3)
+        for i in range(0, len(buffer) - 2, 3):
+            color = buffer[i + 2]
+            colorvect[0] = color >> 16
+            colorvect[1] = (color >> 8) & 0xff
+            colorvect[2] = color & 0xff
+            drawPixel(buffer[i], buffer[i + 1], colorvect)
+#
 # clear screen, set it to BG color.
 #
     def clrSCR(self, color = None):
@@ -390,7 +429,7 @@ class TFT:
         self.clrXY()
         self.tft_io.fillSCR_AS(colorvect, (self.disp_x_size + 1) * (self.disp_y_size + 1))
         self.setScrollArea(0, self.disp_y_size + 1, 0)
-        self.setScrollStart(0)
+        self.setScrollStart(self.page_shown * self.page_lines)
         self.setTextPos(0,0)
 #
 # reset the address range to fullscreen
@@ -401,14 +440,205 @@ class TFT:
         else:
             self.setXY(0, 0, self.disp_y_size, self.disp_x_size)
 #
+# Switch damage tracking on or off. When on, the rectangles touched by the
+# drawing functions are recorded, and close ones are merged if repainting
+# the union costs less than threshold pixels more. Requires tft_damage.py.
+#
+    def track_damage(self, enable=True, threshold=28):
+        if not enable:
+            self.damage = None
+        elif self.damage is None:
+            from tft_damage import Damage
+            self.damage = Damage(threshold)
+        self.set_draw_io()
+#
+# Return the list of damaged rectangles as (x1, y1, x2, y2) tuples
+#
+    def get_damage(self):
+        return [] if self.damage is None else self.damage.get()
+#
+# Forget the damage recorded so far
+#
+    def clear_damage(self):
+        if self.damage is not None:
+            self.damage.clear()
+#
+# Switch the glyph cache on or off. When on, the encoded data of opaque glyphs
+# is kept up to budget bytes, such that printing a glyph again in the same
+# font and colors just sends the data. Requires tft_glyphs.py.
+#
+    def cache_glyphs(self, enable=True, budget=8192):
+        if not enable:
+            self.glyphs = None
+        elif self.glyphs is None:
+            from tft_glyphs import GlyphCache
+            self.glyphs = GlyphCache(budget)
+        else:
+            self.glyphs.budget = budget
+#
+# Return the hits, misses, number of glyphs and bytes of the glyph cache
+#
+    def get_glyph_stats(self):
+        return (0, 0, 0, 0) if self.glyphs is None else self.glyphs.stats()
+#
+# Off-screen pages. The frame memory holds self.pages screens of page_lines
+# lines each. draw_to() selects the page written by all drawing functions,
+# with coordinates relative to that page, and show() the page displayed,
+# by setting the scroll start. So a screen can be composed on a hidden page
+# and presented at once. Scrolling is meant for a single page.
+#
+    def draw_to(self, page):
+        if not 0 <= page < self.pages:
+            raise ValueError("No such page: {}".format(page))
+        self.page_draw = page
+        self.set_draw_io()
+
+    def show(self, page, vsync=False):
+        if not 0 <= page < self.pages:
+            raise ValueError("No such page: {}".format(page))
+        if vsync:
+            self.wait_vblank()
+        self.page_shown = page
+        self.setScrollStart(page * self.page_lines)
+#
+# Copy page src to page dst, by reading back and writing lines frame lines
+# at a time
+#
+    def copy_page(self, src, dst, lines=8):
+        page = self.page_draw
+        width = self.disp_x_size + 1
+        buffer = bytearray(width * lines * 3)
+        for line in range(0, self.page_lines, lines):
+            last = min(line + lines, self.page_lines) - 1
+            size = width * (last - line + 1)
+            if self.orientation == LANDSCAPE:
+                x1, y1, x2, y2 = 0, line, width - 1, last
+            else:
+                x1, y1, x2, y2 = line, 0, last, width - 1
+            self.draw_to(src)
+            self.read_rect(x1, y1, x2, y2, buffer, size * 3)
+            self.draw_to(dst)
+            self.setXY(x1, y1, x2, y2)
+            self.tft_io.displaySCR_AS(buffer, size)
+        self.draw_to(page)
+#
+# Copy the rectangle src = (x1, y1, x2, y2[, page]) to dst = (x, y[, page]),
+# by default within the page drawn to. The rectangle is read back and
+# written in bands of up to 1024 pixels. If dst overlaps src below,
+# the bands are copied from the bottom up, such that no source line is
+# overwritten before it is read.
+#
+    def copyRect(self, src, dst):
+        page = self.page_draw
+        x1, y1, x2, y2 = src[0:4]
+        if x1 > x2:
+            x1, x2 = x2, x1
+        if y1 > y2:
+            y1, y2 = y2, y1
+        src_page = src[4] if len(src) > 4 else page
+        x, y = dst[0:2]
+        dst_page = dst[2] if len(dst) > 2 else page
+        width = x2 - x1 + 1
+        lines = min(max(1024 // width, 1), y2 - y1 + 1)
+        buffer = bytearray(width * lines * 3)
+        bands = range(y1, y2 + 1, lines)
+        if src_page == dst_page and y > y1:
+            bands = reversed(bands)
+        for line in bands:
+            last = min(line + lines - 1, y2)
+            size = width * (last - line + 1)
+            self.draw_to(src_page)
+            self.read_rect(x1, line, x2, last, buffer, size * 3)
+            self.draw_to(dst_page)
+            self.setXY(x, y + line - y1, x + width - 1, y + last - y1)
+            self.tft_io.displaySCR_AS(buffer, size)
+        self.draw_to(page)
+#
+# Set the setXY and drawPixel functions used for drawing, with damage
+# tracking and the offset of the page drawn to
+#
+    def set_draw_io(self):
+        if self.orientation == PORTRAIT:
+            setXY, drawPixel = self.tft_io.setXY_P, self.tft_io.drawPixel_P
+        else:
+            setXY, drawPixel = self.tft_io.setXY_L, self.tft_io.drawPixel_L
+        if self.damage is not None:
+            setXY = self.damage.wrap_setXY(setXY)
+            drawPixel = self.damage.wrap_drawPixel(drawPixel)
+        offset = self.page_draw * self.page_lines
+        if offset == 0:
+            self.setXY, self.drawPixel = setXY, drawPixel
+        elif self.orientation == LANDSCAPE:
+            self.setXY = lambda x1, y1, x2, y2: setXY(x1, y1 + offset, x2, y2 + offset)
+            self.drawPixel = lambda x, y, color: drawPixel(x, y + offset, color)
+        else:
+            self.setXY = lambda x1, y1, x2, y2: setXY(x1 + offset, y1, x2 + offset, y2)
+            self.drawPixel = lambda x, y, color: drawPixel(x + offset, y, color)
+#
+# Tearing effect. The SSD1963 tells the line it is scanning out by
+# get_scanline (0x45), and signals the vertical blank at its TE output
+# after set_tear_on (0x35). wait_vblank() waits for the start of the next
+# vertical blank, using the TE output if it is connected to te_pin, and
+# reading the scan line otherwise.
+#
+    def tearing(self, enable=True, te_pin=None):
+        if enable:
+            self.tft_io.tft_cmd_data_AS(0x35, bytearray(b'\x00'), 1) # TE signals the V-blank only
+            self.te_pin = te_pin
+        else:
+            self.tft_io.tft_cmd(0x34)
+            self.te_pin = None
+#
+# Return the scan line, counted from the start of the vertical sync
+#
+    def get_scanline(self):
+        self.tft_io.tft_read_cmd_data_AS(0x45, self.scan_buf, 2)
+        return (self.scan_buf[0] << 8) | self.scan_buf[1]
+#
+# Tell whether the panel is in the vertical blank. The displayed lines
+# start at the VPS setting of set_vert_period (0xb6), read back by 0xb7
+#
+    def in_vblank(self):
+        if self.te_pin is not None:
+            return self.te_pin.value() == 1
+        if self.vblank is None:
+            self.tft_io.tft_read_cmd_data_AS(0xb7, self.scan_buf, 7)
+            start = (self.scan_buf[2] << 8) | self.scan_buf[3]
+            self.vblank = (start, start + self.page_lines)
+        line = self.get_scanline()
+        return not self.vblank[0] <= line < self.vblank[1]
+#
+# Wait for the start of the next vertical blank. Drawing started then and
+# taking less than a frame does not tear.
+#
+    def wait_vblank(self):
+        while self.in_vblank():
+            pass
+        while not self.in_vblank():
+            pass
+#
+# The same with asyncio, e.g. await mytft.wait_vblank_async()
+#
+    async def wait_vblank_async(self):
+        try:
+            import asyncio
+        except ImportError:
+            import uasyncio as asyncio
+        while self.in_vblank():
+            await asyncio.sleep(0)
+        while not self.in_vblank():
+            await asyncio.sleep(0)
+#
 # Draw a line from x1, y1 to x2, y2 with the color set by setColor()
-# Straight port from the UTFT Library at Rinky-Dink Electronics
+# Bresenham stepping as in the UTFT Library at Rinky-Dink Electronics, but
+# consecutive pixels in the same row (flat lines) or column (steep lines)
+# are sent as one run with a single window. Single pixel runs use drawPixel.
 #
     def drawLine(self, x1, y1, x2, y2, color = None):
         if y1 == y2:
-            self.drawHLine(x1, y1, x2 - x1 + 1, color)
+            self.drawHLine(min(x1, x2), y1, abs(x2 - x1) + 1, color)
         elif x1 == x2:
-            self.drawVLine(x1, y1, y2 - y1 + 1, color)
+            self.drawVLine(x1, min(y1, y2), abs(y2 - y1) + 1, color)
         else:
             colorvect = self.colorvect if color is None else bytearray(color)
             dx, xstep  = (x2 - x1, 1) if x2 > x1 else (x1 - x2, -1)
@@ -416,10 +646,18 @@ class TFT:
             col, row = x1, y1
             if dx < dy:
                 t = - (dy >> 1)
+                start = row
                 while True:
-                    self.drawPixel(col, row, colorvect)
-                    if row == y2:
-                        return
+                    if row == y2 or t + dx >= 0:  # end of the run in this column
+                        if start == row:
+                            self.drawPixel(col, row, colorvect)
+                        else:
+                            ya, yb = (start, row) if start < row else (row, start)
+                            self.setXY(col, ya, col, yb)
+                            self.tft_io.fillSCR_AS(colorvect, yb - ya + 1)
+                        if row == y2:
+                            return
+                        start = row + ystep
                     row += ystep
                     t += dx
                     if t >= 0:
@@ -427,10 +665,18 @@ class TFT:
                         t -= dy
             else:
                 t = - (dx >> 1)
+                start = col
                 while True:
-                    self.drawPixel(col, row, colorvect)
-                    if col == x2:
-                        return
+                    if col == x2 or t + dy >= 0:  # end of the run in this row
+                        if start == col:
+                            self.drawPixel(col, row, colorvect)
+                        else:
+                            xa, xb = (start, col) if start < col else (col, start)
+                            self.setXY(xa, row, xb, row)
+                            self.tft_io.fillSCR_AS(colorvect, xb - xa + 1)
+                        if col == x2:
+                            return
+                        start = col + xstep
                     col += xstep
                     t += dy
                     if t >= 0:
@@ -569,21 +815,47 @@ class TFT:
             self.drawPixel(x - y1, y - x1, colorvect)
 #
 # fill a circle at x, y with radius
-# Straight port from the UTFT Library at Rinky-Dink Electronics
-# Instead of calculating x = sqrt(r*r - y*y), it searches the x
-# for r*r = x*x + x*x
+# The rows match the outline drawn by drawCircle(). The half width of each row
+# is taken from the same midpoint steps, each row is filled once, and adjacent
+# rows of the same width are filled as one rectangle. Rows and columns outside
+# the screen are clipped.
 #
     def fillCircle(self, x, y, radius, color = None):
-        r_square = radius * radius * 4
-        for y1 in range (-(radius * 2), 1):
-            y_square = y1 * y1
-            for x1 in range (-(radius * 2), 1):
-                if x1*x1+y_square <= r_square:
-                    x1i = x1 // 2
-                    y1i = y1 // 2
-                    self.drawHLine(x + x1i, y + y1i, 2 * (-x1i), color)
-                    self.drawHLine(x + x1i, y - y1i, 2 * (-x1i), color)
-                    break;
+        if radius < 0:
+            return
+        colorvect = self.colorvect if color is None else bytearray(color)
+        width = [0] * (radius + 1)  # half width of the rows at distance 0..radius
+        width[0] = radius
+        f = 1 - radius
+        ddF_x = 1
+        ddF_y = -2 * radius
+        x1 = 0
+        y1 = radius
+        while x1 < y1:
+            if f >= 0:
+                y1 -= 1
+                ddF_y += 2
+                f += ddF_y
+            x1 += 1
+            ddF_x += 2
+            f += ddF_x
+            if width[y1] < x1:
+                width[y1] = x1
+            if width[x1] < y1:
+                width[x1] = y1
+        xmax, ymax = self.getScreensize()
+        first = max(y - radius, 0)
+        last = min(y + radius, ymax - 1)
+        start = first
+        for row in range(first, last + 1):
+            w = width[abs(row - y)]
+            if row == last or w != width[abs(row + 1 - y)]:  # end of a run
+                x1 = max(x - w, 0)
+                x2 = min(x + w, xmax - 1)
+                if x1 <= x2:
+                    self.setXY(x1, start, x2, row)
+                    self.tft_io.fillSCR_AS(colorvect, (x2 - x1 + 1) * (row - start + 1))
+                start = row + 1
 #
 # Draw a bitmap at x,y with size sx, sy
 # mode determines the type of expected data
@@ -596,8 +868,13 @@ class TFT:
 #           a colortable with 256 entries must be provided
 # mode = 16: The data must contain 2 packed bytes/pixel red/green/blue in 565 format
 # mode = 24: The data must contain 3 bytes/pixel red/green/blue
+# mode = RLE | 8, RLE | 16 or RLE | 24: The data is PackBits compressed, see
+#           drawRLE()
 #
     def drawBitmap(self, x, y, sx, sy, data, mode = 24, colortable = None):
+        if mode & RLE:
+            self.drawRLE(x, y, sx, sy, data, mode & ~RLE, colortable)
+            return
         self.setXY(x, y, x + sx - 1, y + sy - 1)
         if mode == 24:
             self.tft_io.displaySCR_AS(data, sx * sy)
@@ -619,8 +896,127 @@ class TFT:
             if colortable is None:
                 return
             self.tft_io.displaySCR_bmp(data, sx*sy, 8, colortable)
+#
+# Draw a PackBits compressed bitmap with 8, 16 or 24 bits per pixel, coded
+# like mode 8, 16 or 24 of drawBitmap(). The data is a sequence of packets,
+# each starting with a control byte n:
+# n = 0 to 127: n + 1 literal pixels follow
+# n = 129 to 255: the following pixel is repeated 257 - n times
+# n = 128: no operation
+# Packets may span rows. All packets are sent to a single window, the runs
+# with fillSCR_AS() and the literal pixels straight from data.
+#
+    def drawRLE(self, x, y, sx, sy, data, bits, colortable = None):
+        if bits not in (8, 16, 24) or (bits == 8 and colortable is None):
+            return
+        self.setXY(x, y, x + sx - 1, y + sy - 1)
+        size = bits >> 3
+        data = memoryview(data)
+        pixels = sx * sy
+        pos = 0
+        while pixels > 0:
+            n = data[pos]
+            pos += 1
+            if n > 128: # a run
+                count = min(257 - n, pixels)
+                if bits == 24:
+                    color = data[pos:pos + 3]
+                elif bits == 16:
+                    value = data[pos] | (data[pos + 1] << 8)
+                    color = bytearray((value >> 8 & 0xf8, value >> 3 & 0xfc, value << 3 & 0xf8))
+                else:
+                    index = data[pos] << 2
+                    color = bytearray((colortable[index + 2], colortable[index + 1], colortable[index]))
+                self.tft_io.fillSCR_AS(color, count)
+                pos += size
+                pixels -= count
+            elif n < 128: # literal pixels
+                count = min(n + 1, pixels)
+                if bits == 24:
+                    self.tft_io.displaySCR_AS(data[pos:], count)
+                elif bits == 16:
+                    self.tft_io.displaySCR565_AS(data[pos:], count)
+                else:
+                    self.tft_io.displaySCR_bmp(data[pos:], count, 8, colortable)
+                pos += (n + 1) * size
+                pixels -= count
 
 #
+# Read size bytes of the window x1, y1, x2, y2 of the page drawn to into buf.
+# Reading changes nothing, so the window is not recorded as damage.
+#
+    def read_rect(self, x1, y1, x2, y2, buf, size):
+        damage = self.damage
+        if damage is not None:
+            damage.paused = True
+        self.setXY(x1, y1, x2, y2)
+        if damage is not None:
+            damage.paused = False
+        self.tft_io.tft_read_cmd_data_AS(0x2e, buf, size)
+#
+# Read the region x1, y1, x2, y2 from the frame memory into buf, with fmt = 24
+# as 3 bytes red, green, blue per pixel, or with fmt = 16 as 565 type data
+# like drawBitmap() takes. The 24 bit data is read with a single window, the
+# 565 type data in chunks of about 1024 pixels, which are packed into buf.
+#
+    def readRegion(self, x1, y1, x2, y2, buf, fmt = 24):
+        if x1 > x2:
+            x1, x2 = x2, x1
+        if y1 > y2:
+            y1, y2 = y2, y1
+        width = x2 - x1 + 1
+        if fmt == 24:
+            self.read_rect(x1, y1, x2, y2, buf, width * (y2 - y1 + 1) * 3)
+        elif fmt == 16:
+            lines = max(1024 // width, 1)
+            buffer = bytearray(width * lines * 3)
+            dst = 0
+            for y in range(y1, y2 + 1, lines):
+                last = min(y + lines - 1, y2)
+                pixels = width * (last - y + 1)
+                self.read_rect(x1, y, x2, last, buffer, pixels * 3)
+                TFT_IO.pack565(buffer, pixels, memoryview(buf)[dst:])
+                dst += pixels * 2
+        else:
+            raise ValueError("Unsupported format: {}".format(fmt))
+#
+# Write a page, by default the one shown, to stream, which may be a file
+# or a socket. With mode = 24 as 24 bit BMP file, with mode = 16 as 565 type
+# data like the *.raw files. The page is read in chunks of lines lines.
+#
+    def capture(self, stream, mode = 24, page = None, lines = 8):
+        width, height = self.getScreensize()
+        page_draw = self.page_draw
+        self.draw_to(self.page_shown if page is None else page)
+        try:
+            if mode == 24:
+                row = width * 3
+                pad = bytes(-row & 3)
+                size = (row + len(pad)) * height
+                stream.write(struct.pack("<2sIIIIiiHHIIiiII", b"BM", 54 + size, 0, 54,
+                    40, width, height, 1, 24, 0, size, 2835, 2835, 0, 0))
+                buffer = bytearray(row * lines)
+                y = height
+                while y > 0: # BMP files start with the bottom line
+                    count = min(lines, y)
+                    y -= count
+                    self.readRegion(0, y, width - 1, y + count - 1, buffer, 24)
+                    self.swapcolors(buffer, row * count)
+                    for i in range(count - 1, -1, -1):
+                        stream.write(memoryview(buffer)[i * row:(i + 1) * row])
+                        if pad:
+                            stream.write(pad)
+            elif mode == 16:
+                buffer = bytearray(width * 2 * lines)
+                for y in range(0, height, lines):
+                    count = min(lines, height - y)
+                    self.readRegion(0, y, width - 1, y + count - 1, buffer, 16)
+                    stream.write(memoryview(buffer)[:width * 2 * count])
+            else:
+                raise ValueError("Unsupported mode: {}".format(mode))
+        finally:
+            self.draw_to(page_draw)
+#
 # set scroll area to the region between the first and last line
 #
     def setScrollArea(self, tfa, vsa, bfa):
@@ -702,6 +1098,7 @@ class TFT:
         self.text_color = (bytearray(self.text_bgcolor)
                            + bytearray(self.text_fgcolor)
                            + bytearray([self.transparency]))
+        self.text_key = bytes(self.text_color)  # the colors for the glyph cache
 #
 # Get Text Style: return (color, bgcolor, font, transpareny, gap)
 #
@@ -756,19 +1153,99 @@ class TFT:
 # Print string s, returning the length of the printed string in pixels
 #
     def printString(self, s, bg_buf=None):
-        len = 0
-        for c in s:
-            cols = self.printChar(c, bg_buf)
-            if cols == 0: # could not print (any more)
+        length = 0
+        start = 0
+        while start < len(s):
+            count, cols = self.printRun(s, start)
+            if count == 0: # a single char, or one which does not fit
+                cols = self.printChar(s[start], bg_buf)
+                if cols == 0: # could not print (any more)
+                    break
+                count = 1
+            length += cols
+            start += count
+        return length
+#
+# Print the glyphs of s from start on, which fit into the line, composed into
+# one buffer of up to TEXT_CHUNK pixels, with a single window, which ends at
+# the last glyph. Like printChar() leaves them, the gaps between the glyphs
+# must keep their pixels, so runs with gaps are printed only with the
+# background read back from the frame memory. Return the number of chars and
+# the length in pixels, or 0, 0 for less than two chars.
+#
+    def printRun(self, s, start):
+        font = self.text_font
+        rows = self.text_rows
+        if font is None or rows > 255:
+            return 0, 0
+        gap = self.text_gap
+        if gap and not self.transparency:
+            return 0, 0
+        glyphs = None if self.transparency else self.glyphs
+        key = self.text_key
+        room = self.text_width - self.text_x
+        limit = TEXT_CHUNK // rows
+        run = []
+        width = 0
+        for i in range(start, len(s)):
+            c = s[i]
+            data = None if glyphs is None else glyphs.get((font, c, key))
+            if data is not None:
+                fontptr, cols = None, len(data) // (rows * 3)
+            else:
+                fontptr, rows, cols = font.get_ch(ord(c))
+                if glyphs is not None: # cache miss
+                    data = bytearray(cols * rows * 3)
+                    self.tft_io.encode_charbitmap(fontptr, cols * rows, self.text_color, data)
+                    glyphs.put((font, c, key), data)
+            if width + cols > room or width + cols > limit or cols > 255:
                 break
-            len += cols
-        return len
+            run.append((data, fontptr, cols))
+            width += cols + gap
+        if len(run) < 2:
+            return 0, 0
+        length = width
+        width -= gap # the window ends at the last glyph
+        size = width * rows * 3
+        stride = width * 3
+        if len(self.text_buf) < size:
+            del(self.text_buf)
+            gc.collect()
+            self.text_buf = bytearray(size) # Make it larger
+        buffer = self.text_buf
+        x1, y1 = self.text_x, self.text_y
+        x2, y2 = x1 + width - 1, y1 + rows - 1
+        if self.transparency: # the frame buffer content is needed
+            self.setXY(x1, y1, x2, y2)
+            self.tft_io.tft_read_cmd_data_AS(0x2e, buffer, size)
+# compose the glyphs, either copied from the cache or encoded in place
+        pos = 0
+        for data, fontptr, cols in run:
+            if data is not None:
+                self.tft_io.copy_rows(data, memoryview(buffer)[pos:], rows, (stride << 16) | (cols * 3))
+            else:
+                self.tft_io.encode_charbitmap_at(fontptr, (stride << 16) | (cols << 8) | rows,
+                                                 self.text_color, memoryview(buffer)[pos:])
+            pos += (cols + gap) * 3
+        self.setXY(x1, y1, x2, y2)
+        self.tft_io.displaySCR_AS(buffer, width * rows)
+        self.text_x += length
+        return len(run), length
 #
 # Print string c using the given char bitmap at location x, y, returning the width of the printed char in pixels
 #
     def printChar(self, c, bg_buf=None):
+# look up the glyph cache, which holds opaque glyphs only
+        cached = self.glyphs is not None and not self.transparency
+        data = None
+        if cached:
+            key = (self.text_font, c, self.text_key)
+            data = self.glyphs.get(key)
+        if data is not None:
+            rows = self.text_rows
+            cols = len(data) // (rows * 3)
 # get the charactes pixel bitmap and dimensions
-        if self.text_font:
+        elif self.text_font:
             fontptr, rows, cols = self.text_font.get_ch(ord(c))
         else:
             raise AttributeError('No font selected')
@@ -780,6 +1257,16 @@ class TFT:
                 self.printNewline(True) # NL: advance to the next line
             else:
                 return 0
+# send a cached glyph, or encode it into a new buffer for the cache
+        if cached:
+            if data is None:
+                data = bytearray(pix_count * 3)
+                self.tft_io.encode_charbitmap(fontptr, pix_count, self.text_color, data)
+                self.glyphs.put(key, data)
+            self.setXY(self.text_x, self.text_y, self.text_x + cols - 1, self.text_y + rows - 1) # set area
+            self.tft_io.displaySCR_AS(data, pix_count)
+            self.text_x += (cols + self.text_gap)
+            return cols + self.text_gap
 # Retrieve Background data if transparency is required
         if self.transparency: # in case of transpareny, the frame buffer content is needed
             if bg_buf is None:    # buffer allocation needed?
@@ -147,6 +147,109 @@ class TFT_IO:
             size -= 1
             bg_ptr += 3
 
+    #
+    # encode an opaque font bitmap into buffer, for the glyph cache
+    #
+    @staticmethod
+    @micropython.viper
+    def encode_charbitmap(bits: ptr8, size: int, control: ptr8, buffer: ptr8):
+        bm_ptr = 0
+        ptr = 0
+        mask = 0x80
+        while size:
+            if bits[bm_ptr] & mask:
+                buffer[ptr] = control[3]
+                buffer[ptr + 1] = control[4]
+                buffer[ptr + 2] = control[5]
+            else:
+                buffer[ptr] = control[0]
+                buffer[ptr + 1] = control[1]
+                buffer[ptr + 2] = control[2]
+            mask >>= 1
+            if mask == 0: # mask reset & data ptr advance on byte exhaust
+                mask = 0x80
+                bm_ptr += 1
+            size -= 1
+            ptr += 3
+
+    #
+    # encode font bitmap for text into a part of a wider buffer, which holds
+    # the background data for transparency. shape is
+    # stride << 16 | cols << 8 | rows, with stride the bytes per buffer row
+    #
+    @staticmethod
+    @micropython.viper
+    def encode_charbitmap_at(bits: ptr8, shape: int, control: ptr8, buffer: ptr8):
+        stride = shape >> 16
+        cols = (shape >> 8) & 0xff
+        rows = shape & 0xff
+        transparency = int(control[6])
+        bm_ptr = 0
+        mask = 0x80
+        for row in range(rows):
+            ptr = row * stride
+            for col in range(cols):
+                if bits[bm_ptr] & mask:
+                    if transparency & 8: # Invert bg color as foreground
+                        buffer[ptr] = 255 - buffer[ptr]
+                        buffer[ptr + 1] = 255 - buffer[ptr + 1]
+                        buffer[ptr + 2] = 255 - buffer[ptr + 2]
+                    else: # not invert
+                        buffer[ptr] = control[3]
+                        buffer[ptr + 1] = control[4]
+                        buffer[ptr + 2] = control[5]
+                elif transparency & 1: # Dim background
+                    buffer[ptr] = buffer[ptr] >> 1
+                    buffer[ptr + 1] = buffer[ptr + 1] >> 1
+                    buffer[ptr + 2] = buffer[ptr + 2] >> 1
+                elif transparency & 2: # keep Background
+                    pass
+                elif transparency & 4: # invert Background
+                    buffer[ptr] = 255 - buffer[ptr]
+                    buffer[ptr + 1] = 255 - buffer[ptr + 1]
+                    buffer[ptr + 2] = 255 - buffer[ptr + 2]
+                else: # not transparent
+                    buffer[ptr] = control[0]
+                    buffer[ptr + 1] = control[1]
+                    buffer[ptr + 2] = control[2]
+                mask >>= 1
+                if mask == 0: # mask reset & data ptr advance on byte exhaust
+                    mask = 0x80
+                    bm_ptr += 1
+                ptr += 3
+    #
+    # copy rows of size bytes from src into a part of a wider buffer, with
+    # shape = stride << 16 | size and stride the bytes per row of dst
+    #
+    @staticmethod
+    @micropython.viper
+    def copy_rows(src: ptr8, dst: ptr8, rows: int, shape: int):
+        stride = shape >> 16
+        size = shape & 0xffff
+        s = 0
+        d = 0
+        for row in range(rows):
+            for i in range(size):
+                dst[d + i] = src[s + i]
+            s += size
+            d += stride
+
+    #
+    # pack 24 bit data into 565 type data, as used by displaySCR565_AS.
+    # src and dst may be the same buffer.
+    #
+    @staticmethod
+    @micropython.viper
+    def pack565(src: ptr8, pixels: int, dst: ptr8):
+        to = 0
+        for i in range(0, pixels * 3, 3):
+            red = src[i]
+            green = src[i + 1]
+            blue = src[i + 2]
+            dst[to] = ((green << 3) & 0xe0) | (blue >> 3)
+            dst[to + 1] = (red & 0xf8) | (green >> 5)
+            to += 2
+
     # display Windows BMP data, optionally with colortables
     #
     @staticmethod
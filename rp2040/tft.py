@@ -39,6 +39,8 @@
 
 import time
 import gc
+import array
+import struct
 from machine import Pin
 from uctypes import addressof
 from tft_pio import TFT_IO
@@ -57,6 +59,11 @@ BASEPIN= const(2)   ## Pin 2 Data bus
 PORTRAIT = const(1)
 LANDSCAPE = const(0)
 
+RLE = const(0x100)  ## mode flag of drawBitmap for PackBits compressed data
+BITMAP_CHUNK = const(1024)  ## pixels encoded per chunk by drawBitmap, a multiple of 8
+TEXT_CHUNK = const(8192)  ## pixels composed at most by printString for a single window
+FRAME_PIXELS = const(414720)  ## 1215 kByte of frame memory at 3 bytes per pixel
+
 class TFT:
 
     def __init__(self, controller = "SSD1963", lcd_type = "LB04301", orientation = LANDSCAPE,
@@ -87,7 +94,12 @@ class TFT:
         self.setBGColor((0, 0, 0))     # set BG to black
 
         self.bg_buf = bytearray()
-        self.bmp_buffer = bytearray()
+        self.bg_buf_next = bytearray()  # second buffer for the asynchronous mode
+        self.text_buf = bytearray()  # the glyphs composed by printString
+        self.text_buf_next = bytearray()
+        self.bmp_buffers = (bytearray(BITMAP_CHUNK * 3), bytearray(BITMAP_CHUNK * 3))
+        self.bmp_index = 0  # the bitmap chunk buffer used next
+        self.async_mode = False
 #
         self.led_pin = led_pin     # deferred init Flag
 
@@ -103,12 +115,23 @@ class TFT:
         self.fillSCR = self.tft_io.fillSCR
         self.tft_data = self.tft_io.tft_data
         self.tft_data_DMA = self.tft_io.tft_data_DMA
+        self.tft_data565_DMA = self.tft_io.tft_data565_DMA
+        self.tft_data_indexed = self.tft_io.tft_data_indexed
         self.tft_read_cmd_data = self.tft_io.tft_read_cmd_data
         self.encode_charbitmap = TFT_IO.encode_charbitmap
         self.encodeBMP = TFT_IO.encodeBMP
         self.encodeBMP8 = TFT_IO.encodeBMP8
         self.encode565 = TFT_IO.encode565
         self.drawPixel = self.tft_io.drawPixel
+        self.dlist = None  # no display list
+        self.ring = None  # no rendering on core 1
+        self.damage = None  # no damage tracking
+        self.glyphs = None  # no glyph cache
+        self.shadow = None  # no shadow store of the text background
+        self.page_draw = self.page_shown = 0  # the page drawn to and the one shown
+        self.te_pin = None  # the pin connected to the TE output
+        self.vblank = None  # the displayed scan lines, read at first use
+        self.scan_buf = bytearray(7)
 
 #  ----------
 #
@@ -289,6 +312,11 @@ class TFT:
             print("Wrong Parameter controller: ", controller)
             return
 #
+# The number of screens which fit into the frame memory
+#
+        self.page_lines = self.disp_y_size + 1
+        self.pages = FRAME_PIXELS // ((self.disp_x_size + 1) * self.page_lines)
+#
 # Set character printing defaults
 #
         self.text_font = None
@@ -368,14 +396,56 @@ class TFT:
         self.setXY(x, y, x, y)
         self.tft_data(color)  #
 #
+# Draw pixels at the coordinates x0, y0, x1, y1, ... given in coords with
+# a single color. coords should be an array of type "h" or "H"; other
+# sequences are converted. The pixels are sent in batches by DMA, taking much less
+# time per pixel than drawPixel().
+#
+    def drawPixels(self, coords, color = None):
+        colorvect = self.colorvect if color is None else bytearray(color)
+        if self.dlist is not None or self.damage is not None:
+            for i in range(0, len(coords) - 1, 2):
+                self.drawPixel(coords[i], coords[i + 1], colorvect)
+            return
+        if self.page_draw:  # a copy with the page offset added
+            coords = array.array("h", coords)
+            offset = self.page_draw * self.page_lines
+            for i in range(0 if self.orientation == PORTRAIT else 1, len(coords), 2):
+                coords[i] += offset
+        elif not isinstance(coords, array.array):
+            coords = array.array("h", coords)
+        self.tft_io.drawPixels(coords, len(coords) // 2, colorvect)
+#
+# Draw pixels given as x, y, color triples in buffer, where color is
+# 0xRRGGBB. buffer should be an array of type "I"; other sequences are
+# converted.
+#
+    def drawPixelsColored(self, buffer):
+        if self.dlist is not None or self.damage is not None:
+            for i in range(0, len(buffer) - 2, 3):
+                color = buffer[i + 2]
+                self.drawPixel(buffer[i], buffer[i + 1],
+                    bytearray((color >> 16, (color >> 8) & 0xff, color & 0xff)))
+            return
+        if self.page_draw:  # a copy with the page offset added
+            buffer = array.array("I", buffer)
+            offset = self.page_draw * self.page_lines
+            for i in range(0 if self.orientation == PORTRAIT else 1, len(buffer), 3):
+                buffer[i] += offset
+        elif not isinstance(buffer, array.array):
+            buffer = array.array("I", buffer)
+        self.tft_io.drawPixelsColored(buffer, len(buffer) // 3)
+#
 # clear screen, set it to BG color.
 #
     def clrSCR(self, color = None):
         colorvect = self.BGcolorvect if color is None else bytearray(color)
         self.clrXY()
         self.fillSCR(colorvect, (self.disp_x_size + 1) * (self.disp_y_size + 1))
+        if self.shadow is not None:
+            self.shadow.fill(0, 0, 0xffff, 0xffff, self.page_draw, colorvect)
         self.setScrollArea(0, self.disp_y_size + 1, 0)
-        self.setScrollStart(0)
+        self.setScrollStart(self.page_shown * self.page_lines)
         self.setTextPos(0,0)
 #
 # reset the address range to fullscreen
@@ -386,14 +456,375 @@ class TFT:
         else:
             self.setXY(0, 0, self.disp_y_size, self.disp_x_size)
 #
+# Start recording the drawing commands into a display list. They are sent
+# at flush(), after dropping overdrawn commands and merging adjacent ones.
+# The list is flushed as well if it has max_cmds commands or max_bytes of
+# pixel data, and before reading back from the frame memory.
+#
+    def startList(self, max_cmds=64, max_bytes=8192):
+        if self.dlist is not None:
+            self.flush()
+            return
+        self.stopRender()
+        from tft_dlist import DisplayList
+        self.dlist = DisplayList(self.tft_io, max_cmds, max_bytes)
+        self.dlist.damage = self.damage
+        self.fillSCR = self.dlist.fillSCR
+        self.tft_data = self.dlist.tft_data
+        self.tft_data_DMA = self.dlist.tft_data_DMA
+        self.tft_read_cmd_data = self.dlist.tft_read_cmd_data
+        self.tft_io.tft_cmd_data = self.dlist.tft_cmd_data
+        self.tft_io.tft_cmd = self.dlist.tft_cmd
+        self.set_draw_io()
+#
+# Send the recorded drawing commands
+#
+    def flush(self):
+        if self.dlist is not None:
+            self.dlist.flush()
+#
+# Send the recorded commands and draw directly again
+#
+    def stopList(self):
+        if self.dlist is None:
+            return
+        self.dlist.flush()
+        self.dlist = None
+        for name in ("tft_cmd_data", "tft_cmd"):
+            if name in self.tft_io.__dict__:
+                delattr(self.tft_io, name)
+        self.fillSCR = self.tft_io.fillSCR
+        self.tft_data = self.tft_io.tft_data
+        self.tft_data_DMA = self.tft_io.tft_data_DMA
+        self.tft_read_cmd_data = self.tft_io.tft_read_cmd_data
+        self.set_draw_io()
+#
+# Start rendering on core 1. The drawing calls store their bus transfers as
+# commands in a ring of slots entries and return at once. A thread on core 1
+# sends them, including the encoding of text and bitmaps. The data given to
+# drawBitmap() must not be changed until sync(). Reading back from the frame
+# memory waits for the ring to be empty. Requires tft_ring.py and _thread.
+#
+    RING_IO = ("setXY", "fillSCR", "tft_data", "tft_data_DMA", "tft_read_cmd_data",
+               "drawPixel", "tft_data565_DMA", "tft_data_indexed", "encode_charbitmap",
+               "encode565", "encodeBMP", "encodeBMP8")
+    RING_TFT_IO = ("tft_cmd_data", "tft_cmd", "drawPixels", "drawPixelsColored")
+
+    def startRender(self, slots=128):
+        if self.ring is not None:
+            return
+        self.stopList()
+        self.setAsync(False)
+        from tft_ring import Ring
+        self.ring = Ring(self.tft_io, slots)
+        for name in TFT.RING_IO:
+            setattr(self, name, getattr(self.ring, name))
+        for name in TFT.RING_TFT_IO:
+            setattr(self.tft_io, name, getattr(self.ring, name))
+        self.set_draw_io()
+        self.ring.start()
+#
+# Send the commands of the ring, stop the thread and draw directly again
+#
+    def stopRender(self):
+        if self.ring is None:
+            return
+        self.ring.stop()
+        self.ring = None
+        for name in TFT.RING_TFT_IO:
+            if name in self.tft_io.__dict__:
+                delattr(self.tft_io, name)
+        for name in TFT.RING_IO:
+            setattr(self, name, getattr(self.tft_io, name))
+        self.set_draw_io()
+#
+# Switch the asynchronous mode on or off. In this mode the DMA transfers
+# of fillSCR(), drawBitmap() and printChar() run in the background, and
+# the next drawing call waits for them only when it accesses the bus.
+# drawBitmap() and printChar() use two buffers in turn then. The data of
+# drawBitmap() with mode = 24 is sent directly, so it must not be changed
+# until the transfer is done, as told by busy(), sync() or wait().
+#
+    def setAsync(self, mode=True):
+        if self.ring is not None:  # core 1 owns the bus, and the ring is asynchronous anyhow
+            return
+        self.tft_io.set_async(mode)
+        self.async_mode = mode
+#
+# Tell whether a transfer is still running
+#
+    def busy(self):
+        if self.ring is not None:
+            return self.ring.busy()
+        return self.tft_io.busy()
+#
+# Wait for the end of the running transfer, or until the ring is sent
+#
+    def sync(self):
+        if self.ring is not None:
+            self.ring.sync()
+        else:
+            self.tft_io.wait()
+#
+# Raise the exception of a command, which failed on core 1, in the calling
+# thread without waiting. sync() raises it as well.
+#
+    def check(self):
+        if self.ring is not None:
+            self.ring.check()
+#
+# Wait for the end of the running transfer with asyncio, e.g.
+# await mytft.wait()
+#
+    async def wait(self):
+        try:
+            import asyncio
+        except ImportError:
+            import uasyncio as asyncio
+        while self.busy():
+            await asyncio.sleep(0)
+        self.sync()
+#
+# Switch damage tracking on or off. When on, the rectangles touched by the
+# drawing functions are recorded, and close ones are merged if repainting
+# the union costs less than threshold pixels more. Requires tft_damage.py.
+#
+    def track_damage(self, enable=True, threshold=800):
+        if enable and self.damage is None:
+            from tft_damage import Damage
+            self.damage = Damage(threshold)
+            self.tft_io.setXY = self.damage.wrap_setXY(self.tft_io.setXY)
+            self.tft_io.drawPixel = self.damage.wrap_drawPixel(self.tft_io.drawPixel)
+        elif not enable and self.damage is not None:
+            self.damage = None
+            for name in ("setXY", "drawPixel"):
+                if name in self.tft_io.__dict__:
+                    delattr(self.tft_io, name)
+        if self.dlist is not None:
+            self.dlist.io_setXY = self.tft_io.setXY # damage is recorded at flush
+            self.dlist.damage = self.damage
+        elif self.ring is not None:
+            self.ring.sync()
+            self.ring.io_setXY = self.tft_io.setXY # damage is recorded on core 1
+            self.ring.io_drawPixel = self.tft_io.drawPixel
+        else:
+            self.set_draw_io()
+#
+# Return the list of damaged rectangles as (x1, y1, x2, y2) tuples
+#
+    def get_damage(self):
+        return [] if self.damage is None else self.damage.get()
+#
+# Forget the damage recorded so far
+#
+    def clear_damage(self):
+        if self.damage is not None:
+            self.damage.clear()
+#
+# Switch the glyph cache on or off. When on, the encoded data of opaque glyphs
+# is kept up to budget bytes, such that printing a glyph again in the same
+# font and colors just sends the data. Requires tft_glyphs.py.
+#
+    def cache_glyphs(self, enable=True, budget=8192):
+        if not enable:
+            self.glyphs = None
+        elif self.glyphs is None:
+            from tft_glyphs import GlyphCache
+            self.glyphs = GlyphCache(budget)
+        else:
+            self.glyphs.budget = budget
+#
+# Return the hits, misses, number of glyphs and bytes of the glyph cache
+#
+    def get_glyph_stats(self):
+        return (0, 0, 0, 0) if self.glyphs is None else self.glyphs.stats()
+#
+# Add a region to the shadow store of the text background. Its background is
+# read once from the frame memory, and later kept up to date by the fills of
+# fillRectangle() and clrSCR() and by drawBitmap(). Transparent text inside
+# a region takes the background from there instead of reading it back.
+# Requires tft_shadow.py.
+#
+    def add_shadow(self, x1, y1, x2, y2):
+        if self.shadow is None:
+            from tft_shadow import Shadow
+            self.shadow = Shadow()
+        data = self.shadow.add(x1, y1, x2, y2, self.page_draw)
+        self.read_rect(min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2), data, len(data))
+#
+# Drop all regions of the shadow store
+#
+    def clear_shadow(self):
+        self.shadow = None
+#
+# Off-screen pages. The frame memory holds self.pages screens of page_lines
+# lines each. draw_to() selects the page written by all drawing functions,
+# with coordinates relative to that page, and show() the page displayed,
+# by setting the scroll start. So a screen can be composed on a hidden page
+# and presented at once. Scrolling is meant for a single page.
+#
+    def draw_to(self, page):
+        if not 0 <= page < self.pages:
+            raise ValueError("No such page: {}".format(page))
+        self.page_draw = page
+        self.set_draw_io()
+
+    def show(self, page, vsync=False):
+        if not 0 <= page < self.pages:
+            raise ValueError("No such page: {}".format(page))
+        if vsync:
+            self.wait_vblank()
+        self.page_shown = page
+        self.setScrollStart(page * self.page_lines)
+#
+# Copy page src to page dst, by reading back and writing lines frame lines
+# at a time
+#
+    def copy_page(self, src, dst, lines=8):
+        page = self.page_draw
+        width = self.disp_x_size + 1
+        buffer = bytearray(width * lines * 3)
+        for line in range(0, self.page_lines, lines):
+            last = min(line + lines, self.page_lines) - 1
+            size = width * (last - line + 1) * 3
+            if self.orientation == LANDSCAPE:
+                x1, y1, x2, y2 = 0, line, width - 1, last
+            else:
+                x1, y1, x2, y2 = line, 0, last, width - 1
+            self.draw_to(src)
+            self.read_rect(x1, y1, x2, y2, buffer, size)
+            self.draw_to(dst)
+            self.setXY(x1, y1, x2, y2)
+            self.tft_data_DMA(buffer, size)
+        self.draw_to(page)
+#
+# Copy the rectangle src = (x1, y1, x2, y2[, page]) to dst = (x, y[, page]),
+# by default within the page drawn to. The rectangle is read back and
+# written in bands of up to BITMAP_CHUNK pixels. If dst overlaps src below,
+# the bands are copied from the bottom up, such that no source line is
+# overwritten before it is read.
+#
+    def copyRect(self, src, dst):
+        page = self.page_draw
+        x1, y1, x2, y2 = src[0:4]
+        if x1 > x2:
+            x1, x2 = x2, x1
+        if y1 > y2:
+            y1, y2 = y2, y1
+        src_page = src[4] if len(src) > 4 else page
+        x, y = dst[0:2]
+        dst_page = dst[2] if len(dst) > 2 else page
+        width = x2 - x1 + 1
+        lines = max(BITMAP_CHUNK // width, 1)
+        if self.dlist is None and self.ring is None:
+            buffer = self.bmp_buffers[self.bmp_index]
+            self.bmp_index ^= 1  # the other buffer may still be sent
+            if lines * width > BITMAP_CHUNK:
+                buffer = bytearray(width * 3)
+        else: # the list and the ring keep the buffer until it is sent
+            buffer = bytearray(min(lines, y2 - y1 + 1) * width * 3)
+        bands = range(y1, y2 + 1, lines)
+        if src_page == dst_page and y > y1:
+            bands = reversed(bands)
+        for line in bands:
+            last = min(line + lines - 1, y2)
+            count = last - line + 1
+            size = width * count * 3
+            self.draw_to(src_page)
+            self.read_rect(x1, line, x2, last, buffer, size)
+            self.draw_to(dst_page)
+            self.setXY(x, y + line - y1, x + width - 1, y + last - y1)
+            self.tft_data_DMA(buffer, size)
+            if self.shadow is not None:
+                self.shadow.bitmap(x, y + line - y1, width, count, dst_page,
+                    lambda row: memoryview(buffer)[row * width * 3:(row + 1) * width * 3])
+        self.draw_to(page)
+#
+# Set the setXY and drawPixel functions used for drawing, which add the
+# offset of the page drawn to, for direct drawing, the display list or the ring
+#
+    def set_draw_io(self):
+        if self.dlist is not None:
+            io = self.dlist
+        elif self.ring is not None:
+            io = self.ring
+        else:
+            io = self.tft_io
+        setXY, drawPixel = io.setXY, io.drawPixel
+        offset = self.page_draw * self.page_lines
+        if offset == 0:
+            self.setXY, self.drawPixel = setXY, drawPixel
+        elif self.orientation == LANDSCAPE:
+            self.setXY = lambda x1, y1, x2, y2: setXY(x1, y1 + offset, x2, y2 + offset)
+            self.drawPixel = lambda x, y, color: drawPixel(x, y + offset, color)
+        else:
+            self.setXY = lambda x1, y1, x2, y2: setXY(x1 + offset, y1, x2 + offset, y2)
+            self.drawPixel = lambda x, y, color: drawPixel(x + offset, y, color)
+#
+# Tearing effect. The SSD1963 tells the line it is scanning out by
+# get_scanline (0x45), and signals the vertical blank at its TE output
+# after set_tear_on (0x35). wait_vblank() waits for the start of the next
+# vertical blank, using the TE output if it is connected to te_pin, and
+# reading the scan line otherwise.
+#
+    def tearing(self, enable=True, te_pin=None):
+        if enable:
+            self.tft_io.tft_cmd_data(0x35, bytearray(b'\x00'), 1) # TE signals the V-blank only
+            self.te_pin = te_pin
+        else:
+            self.tft_io.tft_cmd(0x34)
+            self.te_pin = None
+#
+# Return the scan line, counted from the start of the vertical sync
+#
+    def get_scanline(self):
+        self.tft_read_cmd_data(0x45, self.scan_buf, 2)
+        return (self.scan_buf[0] << 8) | self.scan_buf[1]
+#
+# Tell whether the panel is in the vertical blank. The displayed lines
+# start at the VPS setting of set_vert_period (0xb6), read back by 0xb7
+#
+    def in_vblank(self):
+        if self.te_pin is not None:
+            return self.te_pin.value() == 1
+        if self.vblank is None:
+            self.tft_read_cmd_data(0xb7, self.scan_buf, 7)
+            start = (self.scan_buf[2] << 8) | self.scan_buf[3]
+            self.vblank = (start, start + self.page_lines)
+        line = self.get_scanline()
+        return not self.vblank[0] <= line < self.vblank[1]
+#
+# Wait for the start of the next vertical blank. Drawing started then and
+# taking less than a frame does not tear.
+#
+    def wait_vblank(self):
+        while self.in_vblank():
+            pass
+        while not self.in_vblank():
+            pass
+#
+# The same with asyncio, e.g. await mytft.wait_vblank_async()
+#
+    async def wait_vblank_async(self):
+        try:
+            import asyncio
+        except ImportError:
+            import uasyncio as asyncio
+        while self.in_vblank():
+            await asyncio.sleep(0)
+        while not self.in_vblank():
+            await asyncio.sleep(0)
+#
 # Draw a line from x1, y1 to x2, y2 with the color set by setColor()
-# Straight port from the UTFT Library at Rinky-Dink Electronics
+# Bresenham stepping as in the UTFT Library at Rinky-Dink Electronics, but
+# consecutive pixels in the same row (flat lines) or column (steep lines)
+# are sent as one run with a single window. Single pixel runs use drawPixel.
 #
     def drawLine(self, x1, y1, x2, y2, color = None):
         if y1 == y2:
-            self.drawHLine(x1, y1, x2 - x1 + 1, color)
+            self.drawHLine(min(x1, x2), y1, abs(x2 - x1) + 1, color)
         elif x1 == x2:
-            self.drawVLine(x1, y1, y2 - y1 + 1, color)
+            self.drawVLine(x1, min(y1, y2), abs(y2 - y1) + 1, color)
         else:
             colorvect = self.colorvect if color is None else bytearray(color)
             dx, xstep  = (x2 - x1, 1) if x2 > x1 else (x1 - x2, -1)
@@ -401,10 +832,18 @@ class TFT:
             col, row = x1, y1
             if dx < dy:
                 t = - (dy >> 1)
+                start = row
                 while True:
-                    self.drawPixel(col, row, colorvect)
-                    if row == y2:
-                        return
+                    if row == y2 or t + dx >= 0:  # end of the run in this column
+                        if start == row:
+                            self.drawPixel(col, row, colorvect)
+                        else:
+                            ya, yb = (start, row) if start < row else (row, start)
+                            self.setXY(col, ya, col, yb)
+                            self.fillSCR(colorvect, yb - ya + 1)
+                        if row == y2:
+                            return
+                        start = row + ystep
                     row += ystep
                     t += dx
                     if t >= 0:
@@ -412,10 +851,18 @@ class TFT:
                         t -= dy
             else:
                 t = - (dx >> 1)
+                start = col
                 while True:
-                    self.drawPixel(col, row, colorvect)
-                    if col == x2:
-                        return
+                    if col == x2 or t + dy >= 0:  # end of the run in this row
+                        if start == col:
+                            self.drawPixel(col, row, colorvect)
+                        else:
+                            xa, xb = (start, col) if start < col else (col, start)
+                            self.setXY(xa, row, xb, row)
+                            self.fillSCR(colorvect, xb - xa + 1)
+                        if col == x2:
+                            return
+                        start = col + xstep
                     col += xstep
                     t += dy
                     if t >= 0:
@@ -466,10 +913,10 @@ class TFT:
         if y1 > y2:
             y1, y2 = y2, y1
         self.setXY(x1, y1, x2, y2) # set display window
-        if color:
-            self.fillSCR(bytearray(color), (x2 - x1 + 1) * (y2 - y1 + 1))
-        else:
-            self.fillSCR(self.colorvect, (x2 - x1 + 1) * (y2 - y1 + 1))
+        colorvect = bytearray(color) if color else self.colorvect
+        self.fillSCR(colorvect, (x2 - x1 + 1) * (y2 - y1 + 1))
+        if self.shadow is not None:
+            self.shadow.fill(x1, y1, x2, y2, self.page_draw, colorvect)
 
 #
 # Draw smooth rectangle from x1, y1, to x2, y2
@@ -519,22 +966,18 @@ class TFT:
                     self.drawHLine(x1, y2 - i, x2 - x1 + 1, color)
 #
 # draw a circle at x, y with radius
-# Straight port from the UTFT Library at Rinky-Dink Electronics
+# Straight port from the UTFT Library at Rinky-Dink Electronics. The pixels
+# are collected and sent at once by drawPixels()
 #
     def drawCircle(self, x, y, radius, color = None):
 
-        colorvect = self.colorvect if color is None else bytearray(color)
-
         f = 1 - radius
         ddF_x = 1
         ddF_y = -2 * radius
         x1 = 0
         y1 = radius
 
-        self.drawPixel(x, y + radius, colorvect)
-        self.drawPixel(x, y - radius, colorvect)
-        self.drawPixel(x + radius, y, colorvect)
-        self.drawPixel(x - radius, y, colorvect)
+        coords = array.array("h", (x, y + radius, x, y - radius, x + radius, y, x - radius, y))
 
         while x1 < y1:
             if f >= 0:
@@ -544,31 +987,52 @@ class TFT:
             x1 += 1
             ddF_x += 2
             f += ddF_x
-            self.drawPixel(x + x1, y + y1, colorvect)
-            self.drawPixel(x - x1, y + y1, colorvect)
-            self.drawPixel(x + x1, y - y1, colorvect)
-            self.drawPixel(x - x1, y - y1, colorvect)
-            self.drawPixel(x + y1, y + x1, colorvect)
-            self.drawPixel(x - y1, y + x1, colorvect)
-            self.drawPixel(x + y1, y - x1, colorvect)
-            self.drawPixel(x - y1, y - x1, colorvect)
+            coords.extend((x + x1, y + y1, x - x1, y + y1, x + x1, y - y1, x - x1, y - y1,
+                           x + y1, y + x1, x - y1, y + x1, x + y1, y - x1, x - y1, y - x1))
+        self.drawPixels(coords, color)
 #
 # fill a circle at x, y with radius
-# Straight port from the UTFT Library at Rinky-Dink Electronics
-# Instead of calculating x = sqrt(r*r - y*y), it searches the x
-# for r*r = x*x + x*x
+# The rows match the outline drawn by drawCircle(). The half width of each row
+# is taken from the same midpoint steps, each row is filled once, and adjacent
+# rows of the same width are filled as one rectangle. Rows and columns outside
+# the screen are clipped.
 #
     def fillCircle(self, x, y, radius, color = None):
-        r_square = radius * radius * 4
-        for y1 in range (-(radius * 2), 1):
-            y_square = y1 * y1
-            for x1 in range (-(radius * 2), 1):
-                if x1*x1+y_square <= r_square:
-                    x1i = x1 // 2
-                    y1i = y1 // 2
-                    self.drawHLine(x + x1i, y + y1i, 2 * (-x1i), color)
-                    self.drawHLine(x + x1i, y - y1i, 2 * (-x1i), color)
-                    break;
+        if radius < 0:
+            return
+        colorvect = self.colorvect if color is None else bytearray(color)
+        width = [0] * (radius + 1)  # half width of the rows at distance 0..radius
+        width[0] = radius
+        f = 1 - radius
+        ddF_x = 1
+        ddF_y = -2 * radius
+        x1 = 0
+        y1 = radius
+        while x1 < y1:
+            if f >= 0:
+                y1 -= 1
+                ddF_y += 2
+                f += ddF_y
+            x1 += 1
+            ddF_x += 2
+            f += ddF_x
+            if width[y1] < x1:
+                width[y1] = x1
+            if width[x1] < y1:
+                width[x1] = y1
+        xmax, ymax = self.getScreensize()
+        first = max(y - radius, 0)
+        last = min(y + radius, ymax - 1)
+        start = first
+        for row in range(first, last + 1):
+            w = width[abs(row - y)]
+            if row == last or w != width[abs(row + 1 - y)]:  # end of a run
+                x1 = max(x - w, 0)
+                x2 = min(x + w, xmax - 1)
+                if x1 <= x2:
+                    self.setXY(x1, start, x2, row)
+                    self.fillSCR(colorvect, (x2 - x1 + 1) * (row - start + 1))
+                start = row + 1
 #
 # Draw a bitmap at x,y with size sx, sy
 # mode determines the type of expected data
@@ -581,32 +1045,267 @@ class TFT:
 #           a colortable with 256 entries must be provided
 # mode = 16: The data must contain 2 packed bytes/pixel red/green/blue in 565 format
 # mode = 24: The data must contain 3 bytes/pixel red/green/blue
+# mode = RLE | 8, RLE | 16 or RLE | 24: The data is PackBits compressed, see
+#           drawRLE()
+#
+# Mode 16 data is sent directly by DMA and expanded by the PIO, and the
+# colors of modes 1 to 8 are looked up by the PIO and DMA. Data at an odd
+# address and data for a display list are encoded by the CPU in chunks of
+# BITMAP_CHUNK pixels into two buffers in turn. Each chunk is sent by DMA
+# while the next one is encoded, so the scratch RAM is 2 * 3 * BITMAP_CHUNK
+# bytes for any bitmap size.
 #
     def drawBitmap(self, x, y, sx, sy, data, mode = 24, colortable = None):
-        self.setXY(x, y, x + sx - 1, y + sy - 1)
-        size = sx * sy * 3
+        if mode & RLE:
+            self.drawRLE(x, y, sx, sy, data, mode & ~RLE, colortable)
+            return
+        pixels = sx * sy
+        if (self.shadow is not None and mode in (1, 2, 4, 8, 16, 24)
+                and (mode != 8 or colortable is not None)):
+            table = self.BMPcolortable if colortable is None else colortable
+            self.shadow.bitmap(x, y, sx, sy, self.page_draw,
+                lambda row: self.bitmap_row(data, sx, row, mode, table))
         if mode == 24:
-            self.tft_data_DMA(self.bmp_buffer, size)
-        else:
-            if len(self.bmp_buffer) != size:
-                del self.bmp_buffer
-                gc.collect()
-                self.bmp_buffer = bytearray(size)
+            self.setXY(x, y, x + sx - 1, y + sy - 1)
+            self.tft_data_DMA(data, pixels * 3)
+            return
+        if mode == 16 and self.dlist is None and not (addressof(data) & 1):
+            self.setXY(x, y, x + sx - 1, y + sy - 1)
+            self.tft_data565_DMA(data, pixels)
+            return
+        if mode == 8:
+            if colortable is None:
+                return
+        elif mode in (1,2,4):
+            if colortable is None:
+                colortable = self.BMPcolortable # create colortable
+        elif mode != 16:
+            return
+        if mode != 16 and self.dlist is None:
+            self.setXY(x, y, x + sx - 1, y + sy - 1)
+            self.tft_data_indexed(data, pixels, mode, colortable)
+            return
+        data = memoryview(data)
+        pipeline = pixels > BITMAP_CHUNK and not self.async_mode and self.ring is None
+        if pipeline:
+            self.tft_io.set_async(True) # let the transfer run during encoding
+        self.setXY(x, y, x + sx - 1, y + sy - 1)
+        for start in range(0, pixels, BITMAP_CHUNK):
+            count = min(pixels - start, BITMAP_CHUNK)
+            buffer = self.bmp_buffers[self.bmp_index]
+            self.bmp_index ^= 1  # the other buffer may still be sent
+            src = data[(start * mode) >> 3:]
             if mode == 16:
-                self.encode565(data, sx * sy, self.bmp_buffer)
-                self.tft_data_DMA(self.bmp_buffer, size)
+                self.encode565(src, count, buffer)
             elif mode == 8:
-                if colortable is None:
-                    return
-                self.encodeBMP8(data, sx * sy, colortable, self.bmp_buffer)
-                self.tft_data_DMA(self.bmp_buffer, size)
-            elif mode in (1,2,4):
-                if colortable is None:
-                    colortable = self.BMPcolortable # create colortable
-                self.encodeBMP(data, ((sx * sy) << 8) + mode, colortable, self.bmp_buffer)
-                self.tft_data_DMA(self.bmp_buffer, size)
+                self.encodeBMP8(src, count, colortable, buffer)
+            else:
+                self.encodeBMP(src, (count << 8) + mode, colortable, buffer)
+            self.tft_data_DMA(buffer, count * 3)
+        if pipeline:
+            self.tft_io.set_async(False) # waits for the last chunk
 
 #
+# Draw a PackBits compressed bitmap with 8, 16 or 24 bits per pixel, coded
+# like mode 8, 16 or 24 of drawBitmap(). The data is a sequence of packets,
+# each starting with a control byte n:
+# n = 0 to 127: n + 1 literal pixels follow
+# n = 129 to 255: the following pixel is repeated 257 - n times
+# n = 128: no operation
+# Packets may span rows. All packets are sent to a single window, the runs
+# as fills and the literal pixels like drawBitmap() data.
+#
+    def drawRLE(self, x, y, sx, sy, data, bits, colortable = None):
+        if bits not in (8, 16, 24) or (bits == 8 and colortable is None):
+            return
+        if self.shadow is not None:
+            current = [sy, None, None] # index and data of the row, the row generator
+            def row(n): # the rows are asked for in order, starting again for every region
+                if n < current[0]:
+                    current[0], current[2] = -1, self.rle_rows(data, sx, sy, bits, colortable)
+                while current[0] < n:
+                    current[1] = next(current[2])
+                    current[0] += 1
+                return current[1]
+            self.shadow.bitmap(x, y, sx, sy, self.page_draw, row)
+        self.setXY(x, y, x + sx - 1, y + sy - 1)
+        fresh = self.ring is not None # the ring sends from the buffers later
+        for count, rgb, run in self.rle_packets(data, sx * sy, bits, colortable, fresh):
+            if run:
+                self.fillSCR(rgb, count)
+            else:
+                self.tft_data_DMA(rgb, count * 3)
+#
+# Yield the packets of PackBits data of pixels pixels as (count, rgb, run).
+# A run is count pixels of the color rgb, literal pixels are given as RGB
+# data in chunks of at most BITMAP_CHUNK pixels. 24 bit data is taken from
+# data, the others are encoded into the two bitmap buffers in turn, or into
+# new buffers if fresh is True.
+#
+    def rle_packets(self, data, pixels, bits, colortable, fresh):
+        size = bits >> 3
+        data = memoryview(data)
+        pos = 0
+        while pixels > 0:
+            n = data[pos]
+            pos += 1
+            if n > 128: # a run
+                count = min(257 - n, pixels)
+                if bits == 24:
+                    color = data[pos:pos + 3]
+                elif bits == 16:
+                    value = data[pos] | (data[pos + 1] << 8)
+                    color = bytearray((value >> 8 & 0xf8, value >> 3 & 0xfc, value << 3 & 0xf8))
+                else:
+                    index = data[pos] << 2
+                    color = bytearray((colortable[index + 2], colortable[index + 1], colortable[index]))
+                yield count, color, True
+                pos += size
+                pixels -= count
+            elif n < 128: # literal pixels
+                count = min(n + 1, pixels)
+                for start in range(0, count, BITMAP_CHUNK):
+                    chunk = min(count - start, BITMAP_CHUNK)
+                    src = data[pos + start * size:pos + (start + chunk) * size]
+                    if bits == 24:
+                        yield chunk, src, False
+                        continue
+                    if fresh:
+                        buffer = bytearray(chunk * 3)
+                    else:
+                        buffer = self.bmp_buffers[self.bmp_index]
+                        self.bmp_index ^= 1  # the other buffer may still be sent
+                    if bits == 16:
+                        TFT_IO.encode565(src, chunk, buffer)
+                    else:
+                        TFT_IO.encodeBMP8(src, chunk, colortable, buffer)
+                    yield chunk, buffer, False
+                pos += (n + 1) * size
+                pixels -= count
+#
+# Yield the rows of a PackBits compressed bitmap as RGB data, for the
+# shadow store
+#
+    def rle_rows(self, data, sx, sy, bits, colortable):
+        row = bytearray(sx * 3)
+        fill = 0
+        for count, rgb, run in self.rle_packets(data, sx * sy, bits, colortable, True):
+            rgb = memoryview(rgb)
+            while count:
+                n = min(count, sx - fill)
+                if run:
+                    row[fill * 3:(fill + n) * 3] = bytes(rgb[0:3]) * n
+                else:
+                    row[fill * 3:(fill + n) * 3] = rgb[0:n * 3]
+                    rgb = rgb[n * 3:]
+                fill += n
+                count -= n
+                if fill == sx:
+                    yield row
+                    row = bytearray(sx * 3)
+                    fill = 0
+#
+# Return the RGB data of a row of a bitmap, for the shadow store. Rows of
+# less than 8 bits per pixel are encoded from the last byte boundary.
+#
+    def bitmap_row(self, data, sx, row, mode, colortable):
+        start = row * sx
+        if mode == 24:
+            return memoryview(data)[start * 3:(start + sx) * 3]
+        first = start & ~7
+        count = start - first + sx
+        buffer = bytearray(count * 3)
+        src = memoryview(data)[(first * mode) >> 3:]
+        if mode == 16:
+            TFT_IO.encode565(src, count, buffer)
+        elif mode == 8:
+            TFT_IO.encodeBMP8(src, count, colortable, buffer)
+        else:
+            TFT_IO.encodeBMP(src, (count << 8) + mode, colortable, buffer)
+        return memoryview(buffer)[(start - first) * 3:]
+#
+# Read size bytes of the window x1, y1, x2, y2 of the page drawn to into buf.
+# Reading changes nothing, so the window is not recorded as damage. The
+# commands before are sent first, since their damage is recorded when sent.
+#
+    def read_rect(self, x1, y1, x2, y2, buf, size):
+        damage = self.damage
+        if damage is not None:
+            if self.dlist is not None:
+                self.dlist.flush()
+            elif self.ring is not None:
+                self.ring.sync()
+            damage.paused = True
+        try:
+            self.setXY(x1, y1, x2, y2)
+            self.tft_read_cmd_data(0x2e, buf, size)
+        finally:
+            if damage is not None:
+                damage.paused = False
+#
+# Read the region x1, y1, x2, y2 from the frame memory into buf, with fmt = 24
+# as 3 bytes red, green, blue per pixel, or with fmt = 16 as 565 type data
+# like drawBitmap() takes. The 24 bit data is read with a single window, the
+# 565 type data in chunks of BITMAP_CHUNK pixels, which are packed into buf.
+#
+    def readRegion(self, x1, y1, x2, y2, buf, fmt = 24):
+        if x1 > x2:
+            x1, x2 = x2, x1
+        if y1 > y2:
+            y1, y2 = y2, y1
+        width = x2 - x1 + 1
+        if fmt == 24:
+            self.read_rect(x1, y1, x2, y2, buf, width * (y2 - y1 + 1) * 3)
+        elif fmt == 16:
+            lines = max(BITMAP_CHUNK // width, 1)
+            buffer = self.bmp_buffers[0]
+            dst = 0
+            for y in range(y1, y2 + 1, lines):
+                last = min(y + lines - 1, y2)
+                pixels = width * (last - y + 1)
+                self.read_rect(x1, y, x2, last, buffer, pixels * 3)
+                TFT_IO.pack565(buffer, pixels, memoryview(buf)[dst:])
+                dst += pixels * 2
+        else:
+            raise ValueError("Unsupported format: {}".format(fmt))
+#
+# Write a page, by default the one shown, to stream, which may be a file
+# or a socket. With mode = 24 as 24 bit BMP file, with mode = 16 as 565 type
+# data like the *.raw files. The page is read in chunks of lines lines.
+#
+    def capture(self, stream, mode = 24, page = None, lines = 8):
+        width, height = self.getScreensize()
+        page_draw = self.page_draw
+        self.draw_to(self.page_shown if page is None else page)
+        try:
+            if mode == 24:
+                row = width * 3
+                pad = bytes(-row & 3)
+                size = (row + len(pad)) * height
+                stream.write(struct.pack("<2sIIIIiiHHIIiiII", b"BM", 54 + size, 0, 54,
+                    40, width, height, 1, 24, 0, size, 2835, 2835, 0, 0))
+                buffer = bytearray(row * lines)
+                y = height
+                while y > 0: # BMP files start with the bottom line
+                    count = min(lines, y)
+                    y -= count
+                    self.readRegion(0, y, width - 1, y + count - 1, buffer, 24)
+                    self.swapcolors(buffer, row * count)
+                    for i in range(count - 1, -1, -1):
+                        stream.write(memoryview(buffer)[i * row:(i + 1) * row])
+                        if pad:
+                            stream.write(pad)
+            elif mode == 16:
+                buffer = bytearray(width * 2 * lines)
+                for y in range(0, height, lines):
+                    count = min(lines, height - y)
+                    self.readRegion(0, y, width - 1, y + count - 1, buffer, 16)
+                    stream.write(memoryview(buffer)[:width * 2 * count])
+            else:
+                raise ValueError("Unsupported mode: {}".format(mode))
+        finally:
+            self.draw_to(page_draw)
+#
 # set scroll area to the region between the first and last line
 #
     def setScrollArea(self, tfa, vsa, bfa):
@@ -690,6 +1389,7 @@ class TFT:
         self.text_color = (bytearray(self.text_bgcolor)
                            + bytearray(self.text_fgcolor)
                            + bytearray([self.transparency]))
+        self.text_key = bytes(self.text_color)  # the colors for the glyph cache
 #
 # Get Text Style: return (color, bgcolor, font, transpareny, gap)
 #
@@ -744,24 +1444,116 @@ class TFT:
 # Print string s, returning the length of the printed string in pixels
 #
     def printString(self, s):
-        len = 0
-        for c in s:
-            cols = self.printChar(c)
-            if cols == 0: # could not print (any more)
+        length = 0
+        start = 0
+        while start < len(s):
+            count, cols = self.printRun(s, start)
+            if count == 0: # a single char, or one which does not fit
+                cols = self.printChar(s[start])
+                if cols == 0: # could not print (any more)
+                    break
+                count = 1
+            length += cols
+            start += count
+        return length
+#
+# Print the glyphs of s from start on, which fit into the line, composed into
+# one buffer of up to TEXT_CHUNK pixels, with a single window, which ends at
+# the last glyph. Like printChar() leaves them, the gaps between the glyphs
+# must keep their pixels, so runs with gaps are printed only with the
+# background read back from the frame memory. Return the number of chars and
+# the length in pixels, or 0, 0 for less than two chars.
+#
+    def printRun(self, s, start):
+        font = self.text_font
+        rows = self.text_rows
+        if font is None or rows > 255:
+            return 0, 0
+        gap = self.text_gap
+        if gap and (not self.transparency or self.shadow is not None):
+            return 0, 0
+        glyphs = None if self.transparency else self.glyphs
+        key = self.text_key
+        room = self.text_width - self.text_x
+        limit = TEXT_CHUNK // rows
+        run = []
+        width = 0
+        for i in range(start, len(s)):
+            c = s[i]
+            data = None if glyphs is None else glyphs.get((font, c, key))
+            if data is not None:
+                fontptr, cols = None, len(data) // (rows * 3)
+            else:
+                fontptr, rows, cols = font.get_ch(ord(c))
+                if glyphs is not None: # cache miss
+                    data = bytearray(cols * rows * 3)
+                    TFT_IO.encode_charbitmap(fontptr, cols * rows, self.text_color, data)
+                    glyphs.put((font, c, key), data)
+            if width + cols > room or width + cols > limit or cols > 255:
                 break
-            len += cols
-        return len
+            run.append((data, fontptr, cols))
+            width += cols + gap
+        if len(run) < 2:
+            return 0, 0
+        length = width
+        width -= gap # the window ends at the last glyph
+        size = width * rows * 3
+        stride = width * 3
+
+# get the buffer. In asynchronous mode the other buffer may still be sent,
+# and the ring sends it later
+        if self.ring is not None:
+            buffer = bytearray(size)
+        else:
+            if self.async_mode:
+                self.text_buf, self.text_buf_next = self.text_buf_next, self.text_buf
+            if len(self.text_buf) < size:
+                del(self.text_buf)
+                gc.collect()
+                self.text_buf = bytearray(size) # Make it larger
+            buffer = self.text_buf
+        x1, y1 = self.text_x, self.text_y
+        x2, y2 = x1 + width - 1, y1 + rows - 1
+        if self.transparency: # the background from the shadow store or the frame buffer
+            if self.shadow is None:
+                self.setXY(x1, y1, x2, y2)
+                self.tft_read_cmd_data(0x2e, buffer, size)
+            elif not self.shadow.get(x1, y1, x2, y2, self.page_draw, buffer):
+                return 0, 0 # printChar() takes the background of every glyph on its own
+
+# compose the glyphs, either copied from the cache or encoded in place
+        pos = 0
+        for data, fontptr, cols in run:
+            if data is not None:
+                TFT_IO.copy_rows(data, memoryview(buffer)[pos:], rows, (stride << 16) | (cols * 3))
+            else:
+                TFT_IO.encode_charbitmap_at(fontptr, (stride << 16) | (cols << 8) | rows,
+                                            self.text_color, memoryview(buffer)[pos:])
+            pos += (cols + gap) * 3
+        self.setXY(x1, y1, x2, y2)
+        self.tft_data_DMA(buffer, size)
+        self.text_x += length
+        return len(run), length
 #
 # Print string c using the given char bitmap at location x, y, returning the width of the printed char in pixels
 #
     def printChar(self, c):
 
+# look up the glyph cache, which holds opaque glyphs only
+        cached = self.glyphs is not None and not self.transparency
+        data = None
+        if cached:
+            key = (self.text_font, c, self.text_key)
+            data = self.glyphs.get(key)
+        if data is not None:
+            rows = self.text_rows
+            cols = len(data) // (rows * 3)
 # get the charactes pixel bitmap and dimensions
-        if self.text_font:
+        elif self.text_font:
             fontptr, rows, cols = self.text_font.get_ch(ord(c))
-            pix_count = cols * rows   # number of bits in the char
         else:
             raise AttributeError('No font selected')
+        pix_count = cols * rows   # number of bits in the char
 
 # test char fit
         if self.text_x + cols > self.text_width:  # does the char fit on the screen?
@@ -771,20 +1563,39 @@ class TFT:
             else:
                 return 0
 
-# test size of buffer
+# send a cached glyph, or encode it into a new buffer for the cache
+        if cached:
+            if data is None:
+                data = bytearray(pix_count * 3) # encoded at once, since printRun copies it
+                TFT_IO.encode_charbitmap(fontptr, pix_count, self.text_color, data)
+                self.glyphs.put(key, data)
+            self.setXY(self.text_x, self.text_y, self.text_x + cols - 1, self.text_y + rows - 1) # set area
+            self.tft_data_DMA(data, pix_count * 3)
+            self.text_x += (cols + self.text_gap)
+            return cols + self.text_gap
+
+# test size of buffer. In asynchronous mode the other buffer may still be sent
+        if self.async_mode:
+            self.bg_buf, self.bg_buf_next = self.bg_buf_next, self.bg_buf
         if len(self.bg_buf) < (pix_count * 3):
             del(self.bg_buf)
             gc.collect()
             self.bg_buf = bytearray(pix_count * 3) # Make it larger
 
-# Retrieve Background data if transparency is required
-        if self.transparency: # in case of transpareny, the frame buffer content is needed
-            self.setXY(self.text_x, self.text_y, self.text_x + cols - 1, self.text_y + rows - 1) # set area
-            self.tft_read_cmd_data(0x2e, self.bg_buf, pix_count * 3) # read background data
+# Retrieve Background data if transparency is required, from the shadow store
+# or else from the frame buffer. The ring may still encode into bg_buf.
+        if self.transparency:
+            x2, y2 = self.text_x + cols - 1, self.text_y + rows - 1
+            if self.shadow is not None and self.ring is not None:
+                self.bg_buf = bytearray(pix_count * 3)
+            if (self.shadow is None or
+                    not self.shadow.get(self.text_x, self.text_y, x2, y2, self.page_draw, self.bg_buf)):
+                self.setXY(self.text_x, self.text_y, x2, y2) # set area
+                self.tft_read_cmd_data(0x2e, self.bg_buf, pix_count * 3) # read background data
 
 # Set XY range & print char
-        self.setXY(self.text_x, self.text_y, self.text_x + cols - 1, self.text_y + rows - 1) # set area
         self.encode_charbitmap(fontptr, pix_count, self.text_color, self.bg_buf) # display char!
+        self.setXY(self.text_x, self.text_y, self.text_x + cols - 1, self.text_y + rows - 1) # set area
         self.tft_data_DMA(self.bg_buf, pix_count * 3)
 
 #advance pointer
@@ -0,0 +1,290 @@
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 Robert Hammelrath
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Retained display list for the TFT class
+#
+# The display list takes the place of the TFT_IO methods cached by the TFT
+# class. Instead of sending the windows and pixel data to the bus, it records
+# them as commands and sends them at flush(). Before that, commands which are
+# completely covered by a later one are dropped, and fills of the same color
+# or blits, which together form a rectangle, are merged, saving a setXY
+# call for each merge. If TFT_IO has tft_chain(), all commands of a flush
+# are sent as one chain of DMA transfers.
+#
+# A command is a list [kind, x1, y1, x2, y2, payload]:
+# FILL: a window filled with a single color, payload is the color
+# BLIT: a window completely written with data, payload is a list of byte
+#       chunks, which together are the data for the window in row order
+# RAW:  everything else, e.g. partial writes. Payload is a list of
+#       (FILL, color, pixels) or (BLIT, data, size) tuples. A window of None
+#       means, that the data is sent to the window set before.
+#
+FILL = const(0)
+BLIT = const(1)
+RAW  = const(2)
+WINDOW = const(3)  # the window operation of TFT_IO.tft_chain
+
+KIND = const(0)
+X1   = const(1)
+Y1   = const(2)
+X2   = const(3)
+Y2   = const(4)
+PAYLOAD = const(5)
+
+LOOKBACK = const(8)  # number of commands searched back for merging at flush
+
+class DisplayList:
+
+    def __init__(self, tft_io, max_cmds=64, max_bytes=8192):
+        self.tft_io = tft_io
+        self.max_cmds = max_cmds
+        self.max_bytes = max_bytes
+# the methods used for sending
+        self.io_setXY = tft_io.setXY
+        self.io_fillSCR = tft_io.fillSCR
+        self.io_tft_data_DMA = tft_io.tft_data_DMA
+        self.io_tft_read_cmd_data = tft_io.tft_read_cmd_data
+        self.io_tft_cmd_data = tft_io.tft_cmd_data
+        self.io_tft_cmd = tft_io.tft_cmd
+        self.io_tft_chain = getattr(tft_io, "tft_chain", None)
+        self.damage = None  # damage tracking for the chained commands
+        self.cmds = []
+        self.nbytes = 0
+        self.window = None  # the window set by the last setXY
+        self.open = None    # the command receiving data for the window
+        self.sent_window = None  # a window which has to be sent at flush
+#
+# Record the address range
+#
+    def setXY(self, x1, y1, x2, y2):
+        self.close()
+        self.window = (x1, y1, x2, y2)
+        self.sent_window = self.window
+#
+# Record a single pixel, which is a window with a one pixel fill
+#
+    def drawPixel(self, x, y, color):
+        self.close()
+        self.window = (x, y, x, y)
+        self.sent_window = None
+        self.open = [FILL, x, y, x, y, bytearray(color[0:3])]
+#
+# Record a fill with a single color
+#
+    def fillSCR(self, data, pixels):
+        self.write(FILL, bytearray(data[0:3]), pixels)
+#
+# Record data. The data is copied, since the caller re-uses the buffers
+#
+    def tft_data(self, data):
+        self.write(BLIT, bytes(data), len(data))
+
+    def tft_data_DMA(self, data, size):
+        self.write(BLIT, bytes(memoryview(data)[0:size]), size)
+#
+# Read back from the frame memory. Everything recorded before has to be
+# sent, and then the window set again, since the read needs it
+#
+    def tft_read_cmd_data(self, cmd, data, size):
+        window = self.window
+        self.sent_window = None
+        self.flush()
+        if window is not None:
+            self.io_setXY(*window)
+        self.io_tft_read_cmd_data(cmd, data, size)
+#
+# Commands sent through tft_io, like scroll settings, are sent in order
+#
+    def tft_cmd_data(self, cmd, data, size):
+        self.flush()
+        self.io_tft_cmd_data(cmd, data, size)
+
+    def tft_cmd(self, cmd):
+        self.flush()
+        self.io_tft_cmd(cmd)
+#
+# Add a write to the open command, or start a new command with it
+#
+    def write(self, kind, data, count):
+        self.sent_window = None
+        cmd = self.open
+        if cmd is None:
+            window = self.window
+            if window is None:
+                self.open = [RAW, 0, 0, -1, -1, [(kind, data, count)]]
+                self.close()  # not a candidate for merging
+                return
+            x1, y1, x2, y2 = window
+            area = (x2 - x1 + 1) * (y2 - y1 + 1)
+            if kind == FILL and count >= area:  # wrapping writes the same color again
+                cmd = [FILL, x1, y1, x2, y2, data]
+            elif kind == BLIT and count == area * 3:
+                cmd = [BLIT, x1, y1, x2, y2, [data]]
+            else:
+                cmd = [RAW, x1, y1, x2, y2, [(kind, data, count)]]
+            self.open = cmd
+        else:
+            if cmd[KIND] == FILL:
+                x1, y1, x2, y2 = cmd[X1:PAYLOAD]
+                cmd[PAYLOAD] = [(FILL, cmd[PAYLOAD], (x2 - x1 + 1) * (y2 - y1 + 1))]
+            elif cmd[KIND] == BLIT:
+                cmd[PAYLOAD] = [(BLIT, chunk, len(chunk)) for chunk in cmd[PAYLOAD]]
+            cmd[KIND] = RAW
+            cmd[PAYLOAD].append((kind, data, count))
+        if kind == BLIT:
+            self.nbytes += count
+#
+# Close the open command. Try to merge it into the previous command, which
+# is always possible, since there is nothing in between.
+#
+    def close(self):
+        cmd = self.open
+        if cmd is None:
+            return
+        self.open = None
+        cmds = self.cmds
+        if not (cmds and DisplayList.merge(cmds[-1], cmd)):
+            cmds.append(cmd)
+        if len(cmds) >= self.max_cmds or self.nbytes >= self.max_bytes:
+            window = self.window
+            self.flush()
+            self.window = window
+#
+# Merge cmd into prev, if both are fills of the same color or both are blits,
+# and together form a rectangle. Returns True if merged
+#
+    @staticmethod
+    def merge(prev, cmd):
+        kind = cmd[KIND]
+        if kind == RAW or prev[KIND] != kind:
+            return False
+        if kind == FILL and prev[PAYLOAD] != cmd[PAYLOAD]:
+            return False
+        if prev[X1] == cmd[X1] and prev[X2] == cmd[X2]:  # same columns
+            if prev[Y2] + 1 == cmd[Y1]:  # cmd below prev
+                prev[Y2] = cmd[Y2]
+                if kind == BLIT:
+                    prev[PAYLOAD].extend(cmd[PAYLOAD])
+                return True
+            elif cmd[Y2] + 1 == prev[Y1]:  # cmd above prev
+                prev[Y1] = cmd[Y1]
+                if kind == BLIT:
+                    prev[PAYLOAD] = cmd[PAYLOAD] + prev[PAYLOAD]
+                return True
+        if kind == FILL and prev[Y1] == cmd[Y1] and prev[Y2] == cmd[Y2]:  # same rows
+            if prev[X2] + 1 == cmd[X1]:  # right of prev
+                prev[X2] = cmd[X2]
+                return True
+            elif cmd[X2] + 1 == prev[X1]:  # left of prev
+                prev[X1] = cmd[X1]
+                return True
+        return False
+
+    @staticmethod
+    def overlaps(a, b):
+        if a[X2] < a[X1] or b[X2] < b[X1]:  # unknown window
+            return True
+        return not (a[X2] < b[X1] or b[X2] < a[X1] or a[Y2] < b[Y1] or b[Y2] < a[Y1])
+
+    @staticmethod
+    def covers(a, b):
+        return (a[KIND] != RAW and b[X2] >= b[X1] and a[X1] <= b[X1] and a[Y1] <= b[Y1]
+                and a[X2] >= b[X2] and a[Y2] >= b[Y2])
+#
+# Drop the commands which are completely overdrawn by a later one, and
+# merge commands, which are not next to each other, if the commands in
+# between do not overlap the later one. Then send the rest.
+#
+    def flush(self):
+        self.close()
+        cmds = self.cmds
+        keep = []
+        for i in range(len(cmds) - 1, -1, -1):
+            cmd = cmds[i]
+            for later in keep:
+                if DisplayList.covers(later, cmd):
+                    break
+            else:
+                keep.append(cmd)
+        keep.reverse()
+        cmds = []
+        for cmd in keep:
+            for i in range(len(cmds) - 1, max(len(cmds) - LOOKBACK, 0) - 1, -1):
+                if DisplayList.merge(cmds[i], cmd):
+                    break
+                if DisplayList.overlaps(cmds[i], cmd):
+                    cmds.append(cmd)
+                    break
+            else:
+                cmds.append(cmd)
+        if self.io_tft_chain is not None:
+            if cmds:
+                self.send_chain(cmds)
+        else:
+            for cmd in cmds:
+                self.send(cmd)
+        if self.sent_window is not None:
+            self.io_setXY(*self.sent_window)
+            self.sent_window = None
+        self.cmds = []
+        self.nbytes = 0
+        self.window = None
+
+    def send(self, cmd):
+        kind = cmd[KIND]
+        x1, y1, x2, y2 = cmd[X1:PAYLOAD]
+        if x2 >= x1:
+            self.io_setXY(x1, y1, x2, y2)
+        if kind == FILL:
+            self.io_fillSCR(cmd[PAYLOAD], (x2 - x1 + 1) * (y2 - y1 + 1))
+        elif kind == BLIT:
+            for chunk in cmd[PAYLOAD]:
+                self.io_tft_data_DMA(chunk, len(chunk))
+        else:
+            for kind, data, count in cmd[PAYLOAD]:
+                if kind == FILL:
+                    self.io_fillSCR(data, count)
+                else:
+                    self.io_tft_data_DMA(data, count)
+#
+# Send the commands as one chain of DMA transfers. The FILL and BLIT kinds
+# are the fill and data operations of tft_chain.
+#
+    def send_chain(self, cmds):
+        ops = []
+        damage = self.damage
+        for cmd in cmds:
+            x1, y1, x2, y2 = cmd[X1:PAYLOAD]
+            if x2 >= x1:
+                ops.append((WINDOW, x1, y1, x2, y2))
+                if damage is not None:
+                    damage.add(x1, y1, x2, y2)
+            kind = cmd[KIND]
+            if kind == FILL:
+                ops.append((FILL, cmd[PAYLOAD], (x2 - x1 + 1) * (y2 - y1 + 1)))
+            elif kind == BLIT:
+                for chunk in cmd[PAYLOAD]:
+                    ops.append((BLIT, chunk, len(chunk)))
+            else:
+                ops.extend(cmd[PAYLOAD])
+        self.io_tft_chain(ops)
@@ -36,6 +36,7 @@ import rp2
 from machine import Pin, freq, idle
 import array
 import time
+from uctypes import addressof
 
 # define constants
 #
@@ -50,6 +51,20 @@ BASEPIN = const(2)  ## Pin 2
 PORTRAIT = const(1)
 LANDSCAPE = const(0)
 
+PIXEL_BATCH = const(32)  # pixels encoded at once by drawPixels
+
+CHAIN_FILL = const(0)    # operations of tft_chain
+CHAIN_DATA = const(1)
+CHAIN_WINDOW = const(3)
+
+ENGINE_DATA = const(0)   # entry points of the bus engine, see pio_engine
+ENGINE_READ = const(5)
+ENGINE_FILL = const(14)
+ENGINE_CMD = const(25)
+ENGINE_NEXT = const(26)
+ENGINE_SIDE = const(0x1c00)  # side set 0b111 of the tag instructions
+ENGINE_MAX = const(65536)  # maximal count of a single tag
+
 DMA_BASE = const(0x50000000)
 READ_ADDR = const(0)
 WRITE_ADDR = const(1)
@@ -58,6 +73,10 @@ CTRL_TRIG = const(3)
 CTRL_ALIAS = const(4)
 TRANS_COUNT_ALIAS = const(9)
 CHAN_ABORT = const(0x111)  # Address offset / 4
+MULTI_CHAN_TRIGGER = const(0x10c)  # Address offset / 4
+CHAN_REGS = const(16)  # words per channel
+AL3_READ_ADDR_TRIG = const(0x3c)  # Address offset
+TREQ_FORCE = const(0x3f)
 BUSY = const(1 << 24)
 
 PIO0_BASE = const(0x50200000)
@@ -70,54 +89,104 @@ PIO0_BASE_RXF1 = const(PIO0_BASE+0x24)
 PIO0_BASE_RXF2 = const(PIO0_BASE+0x28)
 PIO0_BASE_RXF3 = const(PIO0_BASE+0x2c)
 PIO0_INSTR_MEM = const(PIO0_BASE+0x48)
+PIO0_SM0_ADDR = const(0x35)  # Address offset / 4
+PIO1_BASE = const(0x50300000)
+PIO1_BASE_TXF0 = const(PIO1_BASE+0x10)
+PIO1_BASE_TXF1 = const(PIO1_BASE+0x14)
+PIO1_BASE_RXF1 = const(PIO1_BASE+0x24)
+PIO_FSTAT = const(1)  # Address offset / 4
+PIO_FDEBUG = const(2)
+RXEMPTY_SM1 = const(1 << 9)
+TXEMPTY_SM0 = const(1 << 24)
+TXSTALL_SM0 = const(1 << 24)
+TXSTALL_SM1 = const(1 << 25)
+
+IO_BANK0_BASE = const(0x40014000)
+FUNC_PIO0 = const(6)  # GPIO function select values
+FUNC_PIO1 = const(7)
 
     # create the required PIO object
 class TFT_IO:
     def __init__(self, base_pin=BASEPIN, orientation=LANDSCAPE, reset_pin=RESET):
 
         self.pin_reset = Pin(reset_pin, Pin.OUT, value=1)
+        self.base_pin = base_pin
 # Reset the device
         time.sleep_ms(10)
         self.pin_reset.value(0)  ## Low
         time.sleep_ms(20)
         self.pin_reset.value(1)  ## set high again
         time.sleep_ms(20)
-# create the array for the Cursor settings and pre-set the commands
-        self.ar_setxy = array.array("H", bytearray(22))
-        if orientation == LANDSCAPE:
-            self.ar_setxy[0] = 0x2a
-            self.ar_setxy[5] = 0x2b
-        else:
-            self.ar_setxy[0] = 0x2b
-            self.ar_setxy[5] = 0x2a
-        self.ar_setxy[10] = 0x2c
-
-# create the array for the drawPixel and pre-set the commands
-        self.ar_drawPixel = array.array("H", bytearray(28))
-        self.ar_drawPixel[0:11] = self.ar_setxy
-
 # set frequencies and mwait time factors
         self.tx_freq = 25_000_000
         self.rx_freq = 25_000_000
         self.tx_limit = max((20_000 * 480 * 800 * 3) // self.rx_freq, 1)
         self.rx_limit = max((30_000 * 100 * 100 * 3) // self.rx_freq, 1)
-        TFT_IO.DMA_chan_abort(0)  # cancel any actions
+        for chan in range(3):
+            TFT_IO.DMA_chan_abort(chan)  # cancel any actions
 
-# create the state machines
+# state of the asynchronous mode: the state machine of the running transfer
+# and a reference to its source buffer, which must stay alive until the end
+        self.async_mode = False
+        self.pending = None
+        self.pending_data = None
 
-        self.sm_data_write_triple = rp2.StateMachine(0, TFT_IO.pio_data_write_triple, freq=self.tx_freq,
-                            sideset_base=Pin(base_pin + 8), out_base=Pin(base_pin))
+# create the bus engine, which does all transfers of PIO0. It is started at
+# the entry ENGINE_NEXT and stays active. The tags are jmp instructions to
+# the absolute address of the handlers, so the program offset is needed.
+        self.engine = rp2.StateMachine(0, TFT_IO.pio_engine, freq=self.tx_freq,
+                            sideset_base=Pin(base_pin + 8), out_base=Pin(base_pin),
+                            in_base=Pin(base_pin))
+        offset = TFT_IO.pio0_sm0_addr()
+        self.tag_data = ENGINE_SIDE | (offset + ENGINE_DATA)
+        self.tag_read = ENGINE_SIDE | (offset + ENGINE_READ)
+        self.tag_fill = ENGINE_SIDE | (offset + ENGINE_FILL)
+        self.tag_cmd = ENGINE_SIDE | (offset + ENGINE_CMD)
+        self.engine.exec(ENGINE_SIDE | (offset + ENGINE_NEXT))
+        self.engine.active(1)
 
-        self.sm_data_write_byte = rp2.StateMachine(1, TFT_IO.pio_data_write_byte, freq=self.tx_freq,
+# create the array of tags for the Cursor settings and pre-set the commands
+        self.ar_setxy = array.array("I", bytearray(13 * 4))
+        if orientation == LANDSCAPE:
+            self.set_window_tags(self.ar_setxy, 0x2a, 0x2b)
+        else:
+            self.set_window_tags(self.ar_setxy, 0x2b, 0x2a)
+
+# create the array for the drawPixel and pre-set the commands
+        self.ar_drawPixel = array.array("I", bytearray(17 * 4))
+        self.ar_drawPixel[0:13] = self.ar_setxy
+        self.ar_drawPixel[13] = self.tag_data | (2 << 16)
+        self.ar_fill = array.array("I", [0, 0])
+
+# create two arrays of PIXEL_BATCH drawPixel sequences for drawPixels
+        self.ar_pixels = []
+        for i in range(2):
+            buffer = array.array("I", bytearray(PIXEL_BATCH * 17 * 4))
+            for dst in range(0, PIXEL_BATCH * 17, 17):
+                buffer[dst:dst + 17] = self.ar_drawPixel
+            self.ar_pixels.append(buffer)
+
+# The 565 writer runs on PIO1. The pins are switched to PIO1 only while it is
+# sending, after the engine has become idle.
+        self.sm_data_write_565 = rp2.StateMachine(4, TFT_IO.pio_data_write_565, freq=self.tx_freq,
                             sideset_base=Pin(base_pin + 8), out_base=Pin(base_pin))
+        TFT_IO.set_pin_function(base_pin, FUNC_PIO0)
 
-        self.sm_cmd_write = rp2.StateMachine(2, TFT_IO.pio_cmd_write, freq=self.tx_freq,
-                            sideset_base=Pin(base_pin + 9), out_base=Pin(base_pin))
+# The palette lookup translates color indices into addresses of a colortable,
+# which must be aligned to 1024 bytes. It is re-initialized for every bit size.
+        self.sm_index = rp2.StateMachine(5)
+        self.index_programs = {1: TFT_IO.pio_index_1, 2: TFT_IO.pio_index_2,
+                               4: TFT_IO.pio_index_4, 8: TFT_IO.pio_index_8}
+        self.index_bits = 0  # not initialized yet
+        self.ct_buffer = bytearray(2048)
+        offset = -addressof(self.ct_buffer) & 1023
+        self.ct_table = memoryview(self.ct_buffer)[offset:offset + 1024]
+        self.index_tail = bytearray(24)  # the pixels of a partial last byte
 
-        self.sm_cmd_data_read = rp2.StateMachine(3, TFT_IO.pio_cmd_data_read,
-                            freq=self.rx_freq,
-                            sideset_base=Pin(base_pin + 8), out_base=Pin(base_pin),
-                            in_base=Pin(base_pin))
+# the end flag of the DMA command chain. It is set to the value of
+# chain_words[0] by the last transfer of the chain.
+        self.chain_words = array.array("I", [1])
+        self.chain_done = array.array("I", [0])
 
 # Set up the DMA control patterns
         IRQ_QUIET = const(0x1) # do not generate an interrupt
@@ -129,13 +198,13 @@ class TFT_IO:
 
         TREQ_SEL = (0x00) # wait for PIO0_TX0
         INCR_WRITE = (0) # for write to array
-        INCR_READ = (0) # for read from array
+        INCR_READ = (1) # for read from array
         DATA_SIZE = (2) # 32-bit word transfer
-        self.DMA_fill_control = ((IRQ_QUIET << 21) | (TREQ_SEL << 15) | (CHAIN_TO << 11) | (RING_SEL << 10) |
+        self.DMA_tag_write_control = ((IRQ_QUIET << 21) | (TREQ_SEL << 15) | (CHAIN_TO << 11) | (RING_SEL << 10) |
                             (RING_SIZE << 6) | (INCR_WRITE << 5) | (INCR_READ << 4) | (DATA_SIZE << 2) |
                             (HIGH_PRIORITY << 1) | (EN << 0))
 
-        TREQ_SEL = (0x01) # wait for PIO0_TX1
+        TREQ_SEL = (0x00) # wait for PIO0_TX0
         INCR_WRITE = (0) # for write to array
         INCR_READ = (1) # for read from array
         DATA_SIZE = (0) # 8-bit word transfer
@@ -143,7 +212,59 @@ class TFT_IO:
                             (RING_SIZE << 6) | (INCR_WRITE << 5) | (INCR_READ << 4) | (DATA_SIZE << 2) |
                             (HIGH_PRIORITY << 1) | (EN << 0))
 
-        TREQ_SEL = (0x07) # wait for PIO0_RX3
+        TREQ_SEL = (0x08) # wait for PIO1_TX0
+        INCR_WRITE = (0) # for write to array
+        INCR_READ = (1) # for read from array
+        DATA_SIZE = (1) # 16-bit word transfer
+        self.DMA_565_write_control = ((IRQ_QUIET << 21) | (TREQ_SEL << 15) | (CHAIN_TO << 11) | (RING_SEL << 10) |
+                            (RING_SIZE << 6) | (INCR_WRITE << 5) | (INCR_READ << 4) | (DATA_SIZE << 2) |
+                            (HIGH_PRIORITY << 1) | (EN << 0))
+
+# The palette lookup uses three channels: 0 feeds the indices into the
+# translator, 1 writes the translated address to the read trigger of 2, and
+# 2 copies the three color bytes to the engine and re-arms 1 by chaining.
+        TREQ_SEL = (0x09) # wait for PIO1_TX1
+        INCR_WRITE = (0) # for write to array
+        INCR_READ = (1) # for read from array
+        DATA_SIZE = (0) # 8-bit word transfer
+        self.DMA_index_write_control = ((IRQ_QUIET << 21) | (TREQ_SEL << 15) | (CHAIN_TO << 11) | (RING_SEL << 10) |
+                            (RING_SIZE << 6) | (INCR_WRITE << 5) | (INCR_READ << 4) | (DATA_SIZE << 2) |
+                            (HIGH_PRIORITY << 1) | (EN << 0))
+
+        TREQ_SEL = (0x0d) # wait for PIO1_RX1
+        INCR_WRITE = (0)
+        INCR_READ = (0)
+        DATA_SIZE = (2) # 32-bit word transfer
+        self.DMA_index_addr_control = ((IRQ_QUIET << 21) | (TREQ_SEL << 15) | (1 << 11) | (RING_SEL << 10) |
+                            (RING_SIZE << 6) | (INCR_WRITE << 5) | (INCR_READ << 4) | (DATA_SIZE << 2) |
+                            (HIGH_PRIORITY << 1) | (EN << 0))
+
+        TREQ_SEL = (0x00) # wait for PIO0_TX0
+        INCR_WRITE = (0)
+        INCR_READ = (1)
+        DATA_SIZE = (0) # 8-bit word transfer
+        self.DMA_index_color_control = ((IRQ_QUIET << 21) | (TREQ_SEL << 15) | (1 << 11) | (RING_SEL << 10) |
+                            (RING_SIZE << 6) | (INCR_WRITE << 5) | (INCR_READ << 4) | (DATA_SIZE << 2) |
+                            (HIGH_PRIORITY << 1) | (EN << 0))
+
+# The command chain: channel 1 loads the four registers READ_ADDR to
+# CTRL_TRIG of channel 0 from a list of blocks, using a write ring of 16 bytes.
+# Each transfer of channel 0 chains back to channel 1 for the next block.
+        TREQ_SEL = (TREQ_FORCE) # unpaced
+        INCR_WRITE = (1)
+        INCR_READ = (1)
+        DATA_SIZE = (2) # 32-bit word transfer
+        self.DMA_chain_control = ((IRQ_QUIET << 21) | (TREQ_SEL << 15) | (1 << 11) | (1 << 10) |
+                            (4 << 6) | (INCR_WRITE << 5) | (INCR_READ << 4) | (DATA_SIZE << 2) |
+                            (HIGH_PRIORITY << 1) | (EN << 0))
+
+        INCR_WRITE = (0) # single words, e.g. the end flag
+        INCR_READ = (0)
+        self.DMA_word_control = ((IRQ_QUIET << 21) | (TREQ_SEL << 15) | (1 << 11) | (RING_SEL << 10) |
+                            (RING_SIZE << 6) | (INCR_WRITE << 5) | (INCR_READ << 4) | (DATA_SIZE << 2) |
+                            (HIGH_PRIORITY << 1) | (EN << 0))
+
+        TREQ_SEL = (0x04) # wait for PIO0_RX0
         INCR_WRITE = (1) # for write to array
         INCR_READ = (0) # for read from array
         DATA_SIZE = (0) # 8-bit word transfer
@@ -153,74 +274,150 @@ class TFT_IO:
 
 
 # define the PIO codes
-# writing command or data. D/C# is coded in the 9th bit
+#
+# The bus engine: a single state machine for all transfers of PIO0. It takes
+# tagged words from the FIFO. The lower half word of a tag is a jmp
+# instruction to one of the handlers, which is executed by out(exec). The
+# upper half word is the count - 1 or the command byte. The tags are:
+# ENGINE_CMD: write the command byte
+# ENGINE_DATA: write count bytes, taken from the lower byte of the next words
+# ENGINE_FILL: write count pixels of the color red, green, blue of the next word
+# ENGINE_READ: read count bytes. The next word holds the pin directions 0x00
+#              for reading and 0xff for switching back.
+# So any sequence of commands, fills, data and reads can be queued into
+# the FIFO, by the CPU or by DMA, without switching state machines. The
+# command handler is placed before ENGINE_NEXT, and D/C is low there, which
+# does not matter as long as WR is high.
 #
 # fmt: off
     @staticmethod
     @rp2.asm_pio(
-        sideset_init=(rp2.PIO.OUT_HIGH,) * 2,
-        out_init=(rp2.PIO.OUT_HIGH,) * 9,
+        sideset_init=(rp2.PIO.OUT_HIGH,) * 3,
+        out_init=(rp2.PIO.OUT_HIGH,) * 8,
         out_shiftdir=rp2.PIO.SHIFT_RIGHT,
-        autopull=True,
-        pull_thresh=16)
-    def pio_cmd_write():
-        out(pins, 9)            .side(0b10)  # WR low, output 9 bit
-        out(null, 7)            .side(0b11)  # WR high, discard 7 bit
+        autopull=False,
+        autopush=True,
+        push_thresh=8)
+    def pio_engine():
+        out(x, 16)          .side(0b111)  # ENGINE_DATA: get the count
+        label("data")
+        pull()              .side(0b111)  # get the byte
+        out(pins, 8)        .side(0b101)  # WR low, output data
+        jmp(x_dec, "data")  .side(0b111)  # WR high
+        jmp("next")         .side(0b111)
 
-# just write byte data bytes. Used with and w/o DMA
-#
+        out(x, 16)          .side(0b111)  # ENGINE_READ: get the count
+        pull()              .side(0b111)  # get the pin directions
+        out(pindirs, 8)     .side(0b011) [3] # switch to input mode, RD Low
+        nop()               .side(0b011) [3] # First read needs a delay, RD low
+        label("read")
+        nop()               .side(0b111)  # RD high
+        in_(pins, 8)        .side(0b111)  # Get data
+        jmp(x_dec, "read")  .side(0b011)  # Loop, RD low
+        out(pindirs, 8)     .side(0b111)  # and switch back to output mode
+        jmp("next")         .side(0b111)
+
+        out(x, 16)          .side(0b111)  # ENGINE_FILL: get the count
+        pull()              .side(0b111)  # get the color
+        mov(y, osr)         .side(0b111)
+        label("fill")
+        mov(osr, y)         .side(0b111)
+        out(pins, 8)        .side(0b101)  # WR low, red
+        nop()               .side(0b111)  # WR high
+        out(pins, 8)        .side(0b101)  # WR low, green
+        nop()               .side(0b111)  # WR high
+        out(pins, 8)        .side(0b101)  # WR low, blue
+        jmp(x_dec, "fill")  .side(0b111)  # WR high
+        jmp("next")         .side(0b111)
+
+        out(pins, 8)        .side(0b100)  # ENGINE_CMD: WR low, output the command
+        label("next")
+        pull()              .side(0b110)  # ENGINE_NEXT: WR high, get the tag
+        out(exec, 16)       .side(0b110)  # and jump to the handler
+
+# write 16 bit 565 pixels as three bytes red, green, blue
+# Each color field is moved to the upper bits of the ISR and output from there.
+# The upper half word is skipped, which holds the pixel again when a half
+# word is written to the FIFO by DMA.
     @staticmethod
     @rp2.asm_pio(
         sideset_init=(rp2.PIO.OUT_HIGH,) * 3,
         out_init=(rp2.PIO.OUT_HIGH,) * 8,
-        out_shiftdir=rp2.PIO.SHIFT_RIGHT,
+        out_shiftdir=rp2.PIO.SHIFT_LEFT,
+        in_shiftdir=rp2.PIO.SHIFT_LEFT,
         autopull=True,
-        pull_thresh=8)
-    def pio_data_write_byte():
-        out(pins, 8)            .side(0b101)  # WR low, output data
-        nop()                   .side(0b111)  # WR high
+        pull_thresh=32)
+    def pio_data_write_565():
+        out(null, 16)           .side(0b111) # WR high, skip the upper half word
+        out(isr, 5)             .side(0b111) # get red
+        in_(null, 3)            .side(0b111) # shift it to the upper bits
+        mov(pins, isr)          .side(0b101) # WR low, output red
+        out(isr, 6)             .side(0b111) # WR high, get green
+        in_(null, 2)            .side(0b111)
+        mov(pins, isr)          .side(0b101) # WR low, output green
+        out(isr, 5)             .side(0b111) # WR high, get blue
+        in_(null, 3)            .side(0b111)
+        mov(pins, isr)          .side(0b101) # WR low, output blue
 
-# just write data byte triples
-# used for fill commands with DMA
+# translate color indices of 1, 2, 4 or 8 bits into the address of the color
+# in a colortable aligned to 1024 bytes. Y holds the upper 22 address bits.
+# The indices are taken MSB first from the bytes written by DMA, which are
+# replicated into all byte lanes of the FIFO.
     @staticmethod
     @rp2.asm_pio(
-        sideset_init=(rp2.PIO.OUT_HIGH,) * 3,
-        out_init=(rp2.PIO.OUT_HIGH,) * 8,
-        out_shiftdir=rp2.PIO.SHIFT_RIGHT,
+        out_shiftdir=rp2.PIO.SHIFT_LEFT,
+        in_shiftdir=rp2.PIO.SHIFT_LEFT,
         autopull=True,
-        pull_thresh=24)
-    def pio_data_write_triple():
-        out(pins, 8)            .side(0b101) # WR low, output data
-        nop()                   .side(0b111) # WR high
+        pull_thresh=8,
+        autopush=True,
+        push_thresh=10)
+    def pio_index_1():
+        mov(isr, y)             # the colortable address
+        out(x, 1)               # get the index
+        in_(x, 8)               # add it as word offset
+        in_(null, 2)            # and push the address
 
-# Write a command and read back data
-# Switching the bus direction as needed
-#
     @staticmethod
     @rp2.asm_pio(
-        sideset_init=(rp2.PIO.OUT_HIGH,) * 3,
-        out_init=(rp2.PIO.OUT_HIGH,) * 8,
-        out_shiftdir=rp2.PIO.SHIFT_RIGHT,
-        autopull=False,
+        out_shiftdir=rp2.PIO.SHIFT_LEFT,
+        in_shiftdir=rp2.PIO.SHIFT_LEFT,
+        autopull=True,
+        pull_thresh=8,
         autopush=True,
-        pull_thresh=16,
-        push_thresh=8)
-    def pio_cmd_data_read():
-        pull()              .side(0b111)  # get number of bytes to read
-        mov(x, osr)         .side(0b111)  # save it to the counter
-        pull()              .side(0b100)  # WR low
-        out(pins, 8)        .side(0b100)  # send the command
-        nop()               .side(0b110)  # WR high
-        out(pindirs, 8)     .side(0b011) [3] # and switch to input mode, RD Low
-        nop()               .side(0b011) [3] # First read needs a delay, RD low
+        push_thresh=10)
+    def pio_index_2():
+        mov(isr, y)
+        out(x, 2)
+        in_(x, 8)
+        in_(null, 2)
 
-        label("again")
-        nop()               .side(0b111)  # RD high
-        in_(pins, 8)        .side(0b111)  # Get data
-        jmp(x_dec, "again") .side(0b011)  # Loop, RD low
+    @staticmethod
+    @rp2.asm_pio(
+        out_shiftdir=rp2.PIO.SHIFT_LEFT,
+        in_shiftdir=rp2.PIO.SHIFT_LEFT,
+        autopull=True,
+        pull_thresh=8,
+        autopush=True,
+        push_thresh=10)
+    def pio_index_4():
+        mov(isr, y)
+        out(x, 4)
+        in_(x, 8)
+        in_(null, 2)
 
-        pull()              .side(0b111)  # get the new pindir value
-        out(pindirs, 8)     .side(0b111)  # and switch back to output mode
+    @staticmethod
+    @rp2.asm_pio(
+        out_shiftdir=rp2.PIO.SHIFT_LEFT,
+        in_shiftdir=rp2.PIO.SHIFT_LEFT,
+        autopull=True,
+        pull_thresh=8,
+        autopush=True,
+        push_thresh=10)
+    def pio_index_8():
+        mov(isr, y)
+        out(x, 8)
+        in_(x, 8)
+        in_(null, 2)
 
 # fmt: on
 #
@@ -236,6 +433,81 @@ class TFT_IO:
         dma[TRANS_COUNT] = nword
         dma[CTRL_TRIG] = control
 #
+# Return the program counter of state machine 0 of PIO0
+#
+    @staticmethod
+    @micropython.viper
+    def pio0_sm0_addr() -> int:
+        pio = ptr32(uint(PIO0_BASE))
+        return pio[PIO0_SM0_ADDR]
+#
+# Wait until the bus engine is idle: it stalls on the empty FIFO
+#
+    @staticmethod
+    @micropython.viper
+    def engine_wait():
+        pio = ptr32(uint(PIO0_BASE))
+        while True:
+            pio[PIO_FDEBUG] = TXSTALL_SM0  # clear the sticky stall flag
+            time.sleep_us(1)
+            if (pio[PIO_FDEBUG] & TXSTALL_SM0) and (pio[PIO_FSTAT] & TXEMPTY_SM0):
+                break
+#
+# Set the GPIO function of the data and control pins, connecting them
+# either to PIO0 or to PIO1
+#
+    @staticmethod
+    @micropython.viper
+    def set_pin_function(base_pin:int, function:int):
+        ctrl = ptr32(uint(IO_BANK0_BASE))
+        for pin in range(base_pin, base_pin + 11):
+            ctrl[pin * 2 + 1] = (ctrl[pin * 2 + 1] & ~0x1f) | function
+#
+# set up a DMA channel without starting it
+#
+    @staticmethod
+    @micropython.viper
+    def DMA_chan_setup(chan:uint, src:uint, dst:uint, nword:uint, control:uint):
+        dma=ptr32(uint(DMA_BASE) + chan * CHAN_REGS * 4)
+        dma[READ_ADDR] = src
+        dma[WRITE_ADDR] = dst
+        dma[TRANS_COUNT] = nword
+        dma[CTRL_ALIAS] = control
+#
+# start a DMA channel
+#
+    @staticmethod
+    @micropython.viper
+    def DMA_chan_trigger(chan:uint):
+        dma=ptr32(uint(DMA_BASE))
+        dma[MULTI_CHAN_TRIGGER] = 1 << chan
+#
+# Wait until the end flag of the command chain is set
+#
+    @staticmethod
+    @micropython.viper
+    def chain_wait(flag:ptr32, limit:int):
+        wait = 5
+        while (flag[0] == 0) and (limit > 0):
+            time.sleep_us(wait)
+            limit -= 1
+            wait += 1
+#
+# Wait until the palette lookup is idle: the translator stalls on the empty
+# FIFO, no address is left and channel 2 is done
+#
+    @staticmethod
+    @micropython.viper
+    def index_wait():
+        pio = ptr32(uint(PIO1_BASE))
+        dma = ptr32(uint(DMA_BASE) + 2 * CHAN_REGS * 4)
+        while True:
+            pio[PIO_FDEBUG] = TXSTALL_SM1  # clear the sticky stall flag
+            time.sleep_us(1)
+            if ((pio[PIO_FDEBUG] & TXSTALL_SM1) and (pio[PIO_FSTAT] & RXEMPTY_SM1) and
+                not (dma[CTRL_TRIG] & BUSY)):
+                break
+#
 # Abort an transfer
 #
     @staticmethod
@@ -295,6 +567,55 @@ class TFT_IO:
             size -= 1
             bg_ptr += 3
 #
+# encode font bitmap for text into a part of a wider buffer. shape is
+# stride << 16 | cols << 8 | rows, with stride the bytes per buffer row
+#
+    @staticmethod
+    @micropython.viper
+    def encode_charbitmap_at(bits:ptr8, shape:int, control:ptr8, buffer:ptr8):
+        stride = shape >> 16
+        cols = (shape >> 8) & 0xff
+        rows = shape & 0xff
+        transparency = int(control[6])
+        bm_ptr = 0
+        mask = 0x80
+        for row in range(rows):
+            ptr = row * stride
+            for col in range(cols):
+                if bits[bm_ptr] & mask:
+                    buffer[ptr] = control[3]
+                    buffer[ptr + 1] = control[4]
+                    buffer[ptr + 2] = control[5]
+                elif transparency & 1: # Dim background
+                    buffer[ptr] >>= 1
+                    buffer[ptr + 1] >>= 1
+                    buffer[ptr + 2] >>= 1
+                elif not transparency & 2: # not keep Background
+                    buffer[ptr] = control[0]
+                    buffer[ptr + 1] = control[1]
+                    buffer[ptr + 2] = control[2]
+                mask >>= 1
+                if mask == 0: # mask reset & data ptr advance on byte exhaust
+                    mask = 0x80
+                    bm_ptr += 1
+                ptr += 3
+#
+# copy rows of size bytes from src into a part of a wider buffer, with
+# shape = stride << 16 | size and stride the bytes per row of dst
+#
+    @staticmethod
+    @micropython.viper
+    def copy_rows(src:ptr8, dst:ptr8, rows:int, shape:int):
+        stride = shape >> 16
+        size = shape & 0xffff
+        s = 0
+        d = 0
+        for row in range(rows):
+            for i in range(size):
+                dst[d + i] = src[s + i]
+            s += size
+            d += stride
+#
 # encode 565 type data
 #
     @staticmethod
@@ -307,6 +628,31 @@ class TFT_IO:
             buffer[to + 2] = data[i] << 3
             to += 3
 #
+# pack 24 bit data into 565 type data, the reverse of encode565.
+# src and dst may be the same buffer.
+#
+    @staticmethod
+    @micropython.viper
+    def pack565(src:ptr8, pixels:int, dst:ptr8):
+        to = 0
+        for i in range(0, pixels * 3, 3):
+            red = src[i]
+            green = src[i + 1]
+            blue = src[i + 2]
+            dst[to] = ((green << 3) & 0xe0) | (blue >> 3)
+            dst[to + 1] = (red & 0xf8) | (green >> 5)
+            to += 2
+#
+# copy n entries blue, green, red, 0 of a colortable as red, green, blue, 0
+#
+    @staticmethod
+    @micropython.viper
+    def load_colortable(colortable:ptr8, n:int, table:ptr8):
+        for i in range(0, n * 4, 4):
+            table[i] = colortable[i + 2]
+            table[i + 1] = colortable[i + 1]
+            table[i + 2] = colortable[i]
+#
 # encode Windows BMP data with colortables
 #
     @staticmethod
@@ -344,6 +690,66 @@ class TFT_IO:
             buffer[dst+2] = colortable[offset]
             dst += 3
 #
+# Pre-set the command tags and the data tags of a window sequence of 13
+# words: x command, 4 bytes, y command, 4 bytes, memory write command
+#
+    def set_window_tags(self, buffer, cmd_x, cmd_y):
+        buffer[0] = self.tag_cmd | (cmd_x << 16)
+        buffer[1] = self.tag_data | (3 << 16)
+        buffer[6] = self.tag_cmd | (cmd_y << 16)
+        buffer[7] = self.tag_data | (3 << 16)
+        buffer[12] = self.tag_cmd | (0x2c << 16)
+#
+# encode n pixels with the coordinates x0, y0, x1, y1, ... of coords and a
+# single color into the drawPixel sequences of buffer. The tags of the
+# sequences are set in advance. The engine uses the lower byte of the words.
+#
+    @staticmethod
+    @micropython.viper
+    def encode_pixels(coords:ptr16, n:int, color:ptr8, buffer:ptr32):
+        r = int(color[0])
+        g = int(color[1])
+        b = int(color[2])
+        dst = 0
+        for i in range(0, n * 2, 2):
+            x = int(coords[i])
+            y = int(coords[i + 1])
+            buffer[dst + 2] = x >> 8
+            buffer[dst + 3] = x
+            buffer[dst + 4] = x >> 8
+            buffer[dst + 5] = x
+            buffer[dst + 8] = y >> 8
+            buffer[dst + 9] = y
+            buffer[dst + 10] = y >> 8
+            buffer[dst + 11] = y
+            buffer[dst + 14] = r
+            buffer[dst + 15] = g
+            buffer[dst + 16] = b
+            dst += 17
+#
+# the same for n pixels given as x, y, 0xRRGGBB triples in data
+#
+    @staticmethod
+    @micropython.viper
+    def encode_pixels_colored(data:ptr32, n:int, buffer:ptr32):
+        dst = 0
+        for i in range(0, n * 3, 3):
+            x = data[i]
+            y = data[i + 1]
+            color = data[i + 2]
+            buffer[dst + 2] = x >> 8
+            buffer[dst + 3] = x
+            buffer[dst + 4] = x >> 8
+            buffer[dst + 5] = x
+            buffer[dst + 8] = y >> 8
+            buffer[dst + 9] = y
+            buffer[dst + 10] = y >> 8
+            buffer[dst + 11] = y
+            buffer[dst + 14] = color >> 16
+            buffer[dst + 15] = color >> 8
+            buffer[dst + 16] = color
+            dst += 17
+#
 # Set the address range for various draw commands and set the TFT for expecting data
 #
 # PIO version of
@@ -351,19 +757,19 @@ class TFT_IO:
 #
     @micropython.viper
     def setXY(self, x1: int, y1: int, x2: int, y2: int): ## set the adress range
-        ar_setxy = self.ar_setxy
-        ar_setxy[1] = (x1 >> 8) | 0x100
-        ar_setxy[2] = x1 | 0x100
-        ar_setxy[3] = (x2 >> 8) | 0x100
-        ar_setxy[4] = x2 | 0x100
-        ar_setxy[6] = (y1 >> 8) | 0x100
-        ar_setxy[7] = y1 | 0x100
-        ar_setxy[8] = (y2 >> 8) | 0x100
-        ar_setxy[9] = y2 | 0x100
-
-        self.sm_cmd_write.active(1)
-        self.sm_cmd_write.put(ar_setxy, 0)
-        self.sm_cmd_write.active(0)
+        if self.pending:
+            self.wait()
+        ar_setxy = ptr32(self.ar_setxy)
+        ar_setxy[2] = x1 >> 8
+        ar_setxy[3] = x1
+        ar_setxy[4] = x2 >> 8
+        ar_setxy[5] = x2
+        ar_setxy[8] = y1 >> 8
+        ar_setxy[9] = y1
+        ar_setxy[10] = y2 >> 8
+        ar_setxy[11] = y2
+
+        self.engine.put(self.ar_setxy, 0)
 #
 # Set the address range for various draw commands and set the TFT for expecting data
 #
@@ -372,59 +778,253 @@ class TFT_IO:
 #
     @micropython.viper
     def drawPixel(self, x: int, y: int, color:ptr8): ## set the adress range
-        ar_drawPixel = self.ar_drawPixel
-        ar_drawPixel[1] = (x >> 8) | 0x100
-        ar_drawPixel[2] = x | 0x100
-        ar_drawPixel[3] = ar_drawPixel[1]
-        ar_drawPixel[4] = ar_drawPixel[2]
-        ar_drawPixel[6] = (y >> 8) | 0x100
-        ar_drawPixel[7] = y | 0x100
-        ar_drawPixel[8] = ar_drawPixel[6]
-        ar_drawPixel[9] = ar_drawPixel[7]
-
-        ar_drawPixel[11] = color[0] | 0x100
-        ar_drawPixel[12] = color[1] | 0x100
-        ar_drawPixel[13] = color[2] | 0x100
-
-        self.sm_cmd_write.active(1)
-        self.sm_cmd_write.put(ar_drawPixel, 0)
-        self.sm_cmd_write.active(0)
+        if self.pending:
+            self.wait()
+        ar_drawPixel = ptr32(self.ar_drawPixel)
+        ar_drawPixel[2] = x >> 8
+        ar_drawPixel[3] = x
+        ar_drawPixel[4] = x >> 8
+        ar_drawPixel[5] = x
+        ar_drawPixel[8] = y >> 8
+        ar_drawPixel[9] = y
+        ar_drawPixel[10] = y >> 8
+        ar_drawPixel[11] = y
+
+        ar_drawPixel[14] = color[0]
+        ar_drawPixel[15] = color[1]
+        ar_drawPixel[16] = color[2]
+
+        self.engine.put(self.ar_drawPixel, 0)
+#
+# Draw n pixels of a single color at the coordinates x0, y0, x1, y1, ...
+# given in coords, which must be an array of type "h" or "H". The pixels are
+# encoded in batches into the drawPixel format. Each batch is sent by a
+# single DMA transfer, while the next batch is encoded.
+#
+    def drawPixels(self, coords, n, color):
+        if self.pending:
+            self.wait()
+        coords = memoryview(coords)
+        for start in range(0, n, PIXEL_BATCH):
+            count = min(n - start, PIXEL_BATCH)
+            buffer = self.ar_pixels[(start // PIXEL_BATCH) & 1]
+            TFT_IO.encode_pixels(coords[start * 2:], count, color, buffer)
+            TFT_IO.DMA0_wait(self.tx_limit)  # Wait for the previous batch
+            TFT_IO.DMA0_setup(buffer, PIO0_BASE_TXF0, count * 17, self.DMA_tag_write_control)
+        TFT_IO.DMA0_wait(self.tx_limit)
+#
+# Draw n pixels given as x, y, 0xRRGGBB triples in data, which must be an
+# array of type "I"
+#
+    def drawPixelsColored(self, data, n):
+        if self.pending:
+            self.wait()
+        data = memoryview(data)
+        for start in range(0, n, PIXEL_BATCH):
+            count = min(n - start, PIXEL_BATCH)
+            buffer = self.ar_pixels[(start // PIXEL_BATCH) & 1]
+            TFT_IO.encode_pixels_colored(data[start * 3:], count, buffer)
+            TFT_IO.DMA0_wait(self.tx_limit)  # Wait for the previous batch
+            TFT_IO.DMA0_setup(buffer, PIO0_BASE_TXF0, count * 17, self.DMA_tag_write_control)
+        TFT_IO.DMA0_wait(self.tx_limit)
+#
+# Queue size words of the array data into the bus engine by DMA. The words
+# are tags and their data words as described at pio_engine, built from the
+# values tag_cmd, tag_data, tag_fill and tag_read. So a whole sequence of
+# commands, data and fills is sent by a single transfer.
+#
+    @micropython.viper
+    def tft_queue(self, data, size:int):
+        if self.pending:
+            self.wait()
+        TFT_IO.DMA0_setup(data, PIO0_BASE_TXF0, size, self.DMA_tag_write_control)
+        if self.async_mode:  # let it run, wait() finishes it
+            self.pending = self.engine
+            self.pending_data = data
+        else:
+            TFT_IO.DMA0_wait(self.tx_limit)  # Wait for the transfer to finish
 #
 # PIO version of
 # Fill screen by writing size pixels with the color given in data
 # data must be 3 bytes of red, green, blue
 # The area to be filled has to be set in advance by setXY
+# The fill is queued into the engine as tag and color and runs on its own,
+# so there is nothing to wait for, even if not in asynchronous mode.
 # The speed is 60 ns/pixel at 100MHz pio clock. Pretty fast
 #
     @micropython.viper
-    def fillSCR(self, data, pixels:int):
-        self.sm_data_write_triple.active(1)
-        TFT_IO.DMA0_setup(data, PIO0_BASE_TXF0, pixels, self.DMA_fill_control)
-        TFT_IO.DMA0_wait(self.tx_limit)  # Wait for the transfer to finish
-        self.sm_data_write_triple.active(0)
+    def fillSCR(self, data:ptr8, pixels:int):
+        if self.pending:
+            self.wait()
+        ar_fill = ptr32(self.ar_fill)
+        ar_fill[1] = data[0] | (data[1] << 8) | (data[2] << 16)
+        while pixels > 0:
+            count = pixels if pixels < ENGINE_MAX else ENGINE_MAX
+            ar_fill[0] = int(self.tag_fill) | ((count - 1) << 16)
+            self.engine.put(self.ar_fill, 0)
+            pixels -= count
 #
 # Send data to the tft controller
 #
-    @micropython.viper
+    @micropython.native
     def tft_data(self, data):
-        self.sm_data_write_byte.active(1)
-        self.sm_data_write_byte.put(data, 0)
-        self.sm_data_write_byte.active(0)
-
-    @micropython.viper
-    def tft_data_DMA(self, data, size:int):
-        self.sm_data_write_byte.active(1)
-        TFT_IO.DMA0_setup(data, PIO0_BASE_TXF1, size, self.DMA_data_write_control)
-        TFT_IO.DMA0_wait(self.tx_limit)  # Wait for the transfer to finish
-        self.sm_data_write_byte.active(0)
+        if self.pending:
+            self.wait()
+        if len(data):
+            self.engine.put(self.tag_data | ((len(data) - 1) << 16))
+            self.engine.put(data, 0)
+#
+# Send data by DMA, in parts of at most ENGINE_MAX bytes
+#
+    def tft_data_DMA(self, data, size):
+        if self.pending:
+            self.wait()
+        start = 0
+        while start < size:
+            if start:
+                TFT_IO.DMA0_wait(self.tx_limit)  # Wait for the previous part
+            count = min(size - start, ENGINE_MAX)
+            self.engine.put(self.tag_data | ((count - 1) << 16))
+            TFT_IO.DMA0_setup(memoryview(data)[start:] if start else data,
+                              PIO0_BASE_TXF0, count, self.DMA_data_write_control)
+            start += count
+        if self.async_mode:  # let it run, wait() finishes it
+            self.pending = self.engine
+            self.pending_data = data
+        else:
+            TFT_IO.DMA0_wait(self.tx_limit)  # Wait for the transfer to finish
+#
+# Send pixels in 16 bit 565 format by DMA, little endian as in BMP files.
+# The conversion to the three bytes red, green, blue is done by the
+# pio_data_write_565 state machine. data must be aligned to 2 bytes.
+# The pins are switched to PIO1 when the engine has sent all queued data.
+# The speed is 400 ns/pixel at 25 MHz PIO clock, without any CPU load.
+#
+    def tft_data565_DMA(self, data, pixels):
+        if self.pending:
+            self.wait()
+        TFT_IO.engine_wait()
+        TFT_IO.set_pin_function(self.base_pin, FUNC_PIO1)
+        self.sm_data_write_565.active(1)
+        TFT_IO.DMA0_setup(data, PIO1_BASE_TXF0, pixels, self.DMA_565_write_control)
+        self.pending = self.sm_data_write_565
+        self.pending_data = data
+        if not self.async_mode:
+            self.wait()
+#
+# Send a list of operations as one chain of DMA transfers, without CPU
+# involvement between them. The operations are tuples:
+# (CHAIN_WINDOW, x1, y1, x2, y2): set the window like setXY
+# (CHAIN_FILL, color, pixels): fill like fillSCR
+# (CHAIN_DATA, data, size): send data like tft_data_DMA
+# Windows, fills and the tags of data are collected in an array of tags,
+# such that successive windows and fills are sent by a single transfer.
+# Only the data are sent by transfers of their own. The last blocks set
+# the end flag and stop the chain with a null trigger.
+#
+    def tft_chain(self, ops):
+        if self.pending:
+            self.wait()
+        tags = array.array("I")
+        ar_setxy = self.ar_setxy
+        tag_data = self.tag_data
+        tag_fill = self.tag_fill
+        tag_control = self.DMA_tag_write_control | (1 << 11)
+        data_control = self.DMA_data_write_control | (1 << 11)
+        blocks = array.array("I")
+        for op in ops:
+            kind = op[0]
+            start = len(tags)
+            if kind == CHAIN_WINDOW:
+                x1, y1, x2, y2 = op[1], op[2], op[3], op[4]
+                tags.extend((ar_setxy[0], ar_setxy[1], x1 >> 8, x1 & 0xff, x2 >> 8, x2 & 0xff,
+                             ar_setxy[6], ar_setxy[7], y1 >> 8, y1 & 0xff, y2 >> 8, y2 & 0xff,
+                             ar_setxy[12]))
+            elif kind == CHAIN_FILL:
+                color = op[1][0] | (op[1][1] << 8) | (op[1][2] << 16)
+                for part in range(0, op[2], ENGINE_MAX):
+                    tags.extend((tag_fill | ((min(op[2] - part, ENGINE_MAX) - 1) << 16), color))
+            else:
+                data = addressof(op[1])
+                for part in range(0, op[2], ENGINE_MAX):
+                    count = min(op[2] - part, ENGINE_MAX)
+                    tags.append(tag_data | ((count - 1) << 16))
+                    blocks.extend((len(tags) - 1, PIO0_BASE_TXF0, 1, tag_control))
+                    blocks.extend((data + part, PIO0_BASE_TXF0, count, data_control))
+                continue
+            if len(tags) > start:
+                if blocks and blocks[-1] == tag_control:  # extend the previous tag block
+                    blocks[-2] += len(tags) - start
+                else:
+                    blocks.extend((start, PIO0_BASE_TXF0, len(tags) - start, tag_control))
+        words = addressof(self.chain_words)
+        blocks.extend((words, addressof(self.chain_done), 1, self.DMA_word_control))
+        blocks.extend((0, 0, 0, 0))
+# the tags are at their final address now
+        base = addressof(tags)
+        for i in range(0, len(blocks), 4):
+            if blocks[i + 3] == tag_control:
+                blocks[i] = base + blocks[i] * 4
+        self.chain_done[0] = 0
+        TFT_IO.DMA_chan_setup(1, addressof(blocks), DMA_BASE, 4, self.DMA_chain_control)
+        TFT_IO.DMA_chan_trigger(1)
+        self.pending = self.chain_done
+        self.pending_data = (blocks, tags, ops)
+        if not self.async_mode:
+            self.wait()
+#
+# Send pixels given as color indices of 1, 2, 4 or 8 bits by DMA, looking up
+# the colors in the colortable with entries blue, green, red, 0.
+# The colortable is copied to the aligned table in red, green, blue order.
+# Each index is translated by the sm_index state machine into the address
+# of its color, which DMA channel 1 writes into the read address trigger of
+# channel 2. Channel 2 copies the three color bytes to the engine and
+# re-arms channel 1. The pixels are sent in parts of at most ENGINE_MAX bytes,
+# each announced by a data tag. The pixels of a partial last byte are
+# encoded by the CPU.
+# The speed is limited by the bus with 360 ns/pixel, without any CPU load.
+#
+    def tft_data_indexed(self, data, pixels, bits, colortable):
+        if self.pending:
+            self.wait()
+        nbytes = (pixels * bits) >> 3
+        TFT_IO.load_colortable(colortable, min(len(colortable) >> 2, 1 << bits), self.ct_table)
+        sm_index = self.sm_index
+        if bits != self.index_bits:
+            sm_index.init(self.index_programs[bits])
+            sm_index.put(addressof(self.ct_table) >> 10)
+            sm_index.exec("pull()")
+            sm_index.exec("mov(y, osr)")
+            sm_index.exec("out(null, 32)")
+            self.index_bits = bits
+        sm_index.active(1)
+        part = (ENGINE_MAX // 24) * bits  # index bytes of a part of a multiple of 8 pixels
+        for start in range(0, nbytes, part):
+            count = min(nbytes - start, part)
+            TFT_IO.DMA_chan_setup(2, 0, PIO0_BASE_TXF0, 3, self.DMA_index_color_control)
+            TFT_IO.DMA_chan_setup(1, PIO1_BASE_RXF1, DMA_BASE + 2 * CHAN_REGS * 4 + AL3_READ_ADDR_TRIG,
+                                  1, self.DMA_index_addr_control)
+            TFT_IO.DMA_chan_trigger(1)
+            self.engine.put(self.tag_data | ((((count << 3) // bits) * 3 - 1) << 16))
+            TFT_IO.DMA0_setup(memoryview(data)[start:], PIO1_BASE_TXF1, count, self.DMA_index_write_control)
+            TFT_IO.DMA0_wait(self.tx_limit)
+            TFT_IO.index_wait()
+            TFT_IO.DMA_chan_abort(1)
+            TFT_IO.index_wait()  # a color still in transit re-arms channel 1
+            TFT_IO.DMA_chan_abort(1)
+        sm_index.active(0)
+        rest = pixels - ((nbytes << 3) // bits)
+        if rest:
+            TFT_IO.encodeBMP(memoryview(data)[nbytes:], (rest << 8) + bits, colortable, self.index_tail)
+            self.tft_data_DMA(self.index_tail, rest * 3)
 #
 # Send a command to the TFT controller
 #
     @micropython.native
     def tft_cmd(self, cmd):
-        self.sm_cmd_write.active(1)
-        self.sm_cmd_write.put(cmd, 0)
-        self.sm_cmd_write.active(0)
+        if self.pending:
+            self.wait()
+        self.engine.put(self.tag_cmd | (cmd << 16))
 #
 # Send a command and data to the TFT controller
 # cmd is the command byte, data must be a bytearray object with the command payload,
@@ -438,18 +1038,26 @@ class TFT_IO:
 #
 # PIO version of send a command byte and read data from the TFT controller by DMA
 # data must be a bytearray object, int is the size of the data.
+# The command and the read tag are queued like all other transfers. Reads
+# larger than ENGINE_MAX bytes are continued with 0x3e after 0x2e.
 # The speed is about 120 ns/byte. PIO speed 25 MHz. No luck
 # at faster rates
 #
-    @micropython.viper
-    def tft_read_cmd_data(self, cmd:int, data, size:int):
-        self.sm_cmd_data_read.active(1)
-        self.sm_cmd_data_read.put(size - 1)  # send the size
-        self.sm_cmd_data_read.put(cmd, 0)  # send the command
-        TFT_IO.DMA0_setup(PIO0_BASE_RXF3, data, size, self.DMA_data_read_control)
-        TFT_IO.DMA0_wait(self.rx_limit)  # Wait for the transfer to finish
-        self.sm_cmd_data_read.put(0xff, 0)  # reset direction
-        self.sm_cmd_data_read.active(0)
+    def tft_read_cmd_data(self, cmd, data, size):
+        if self.pending:
+            self.wait()
+        start = 0
+        while start < size:
+            count = min(size - start, ENGINE_MAX)
+            self.engine.put(self.tag_cmd | (cmd << 16))  # send the command
+            self.engine.put(self.tag_read | ((count - 1) << 16))  # and the size
+            TFT_IO.DMA0_setup(PIO0_BASE_RXF0, memoryview(data)[start:] if start else data,
+                              count, self.DMA_data_read_control)
+            self.engine.put(0xff00)  # the pin directions
+            TFT_IO.DMA0_wait(self.rx_limit)  # Wait for the transfer to finish
+            if cmd == 0x2e:
+                cmd = 0x3e
+            start += count
 #
 # PIO version of send a command byte and read data from the TFT controller py polling
 # data must be a bytearray object, int is the size of the data.
@@ -457,14 +1065,55 @@ class TFT_IO:
 #
     @micropython.viper
     def tft_read_cmd_data_poll(self, cmd:int, data, size:int):
-        self.sm_cmd_data_read.active(1)
-        self.sm_cmd_data_read.put(size - 1)  # send the size
-        self.sm_cmd_data_read.put(cmd, 0)  # send the command
+        if self.pending:
+            self.wait()
+        self.engine.put(int(self.tag_cmd) | (cmd << 16))  # send the command
+        self.engine.put(int(self.tag_read) | ((size - 1) << 16))  # and the size
+        self.engine.put(0xff00)  # the pin directions
         for i in range(size):     # get the data
-            data[i] = int(self.sm_cmd_data_read.get())
-        self.sm_cmd_data_read.put(0xff, 0)  # reset direction
-        self.sm_cmd_data_read.active(0)
-        pass
+            data[i] = int(self.engine.get())
+#
+# Asynchronous mode: tft_data_DMA() and tft_queue() start the DMA transfer and
+# return at once, such that the CPU can prepare the next data while the
+# transfer runs. The buffer given to these calls must not be changed until
+# the transfer has finished. Every other bus access waits for it first.
+# fillSCR() returns at once anyhow.
+#
+    def set_async(self, mode=True):
+        if not mode:
+            self.wait()
+        self.async_mode = mode
+#
+# Tell whether a DMA transfer is still running
+#
+    def busy(self):
+        if self.pending is self.chain_done:
+            return not self.chain_done[0]
+        return TFT_IO.DMA0_busy()
+
+    @staticmethod
+    @micropython.viper
+    def DMA0_busy() -> bool:
+        dma = ptr32(uint(DMA_BASE))
+        return dma[TRANS_COUNT] > 0
+#
+# Wait for the end of a pending transfer. The 565 writer is stopped and the
+# pins are given back to the engine.
+#
+    def wait(self):
+        pending = self.pending
+        if pending is self.chain_done:
+            TFT_IO.chain_wait(pending, self.tx_limit)
+        elif pending:
+            TFT_IO.DMA0_wait(self.tx_limit)
+            if pending is self.sm_data_write_565:
+                while pending.tx_fifo():  # the last pixels are still sent
+                    pass
+                time.sleep_us(1)
+                pending.active(0)
+                TFT_IO.set_pin_function(self.base_pin, FUNC_PIO0)
+        self.pending = None
+        self.pending_data = None
 #
 # swap byte pairs in a buffer
 # sometimes needed for picture data
@@ -0,0 +1,240 @@
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2016 Robert Hammelrath
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Render ring for the TFT class: rendering on the second core of the RP2040
+#
+# The ring takes the place of the TFT_IO methods cached by the TFT class,
+# like the display list does. Every call is stored as a compact command in a
+# ring of slots and returns at once. A thread on core 1 takes the commands
+# from the ring and runs them with TFT_IO, including the viper encoders for
+# text and bitmaps. Only the caller moves head and only the thread moves tail,
+# so the ring needs no lock. The caller waits only for a read back from the
+# frame memory and when the ring is full.
+#
+# A slot has the kind and four ints in words, and an object in objs:
+# WINDOW: x1, y1, x2, y2
+# FILL:   color 0xRRGGBB, pixels
+# PIXEL:  x, y, color 0xRRGGBB
+# DATA:   size, the object is the data
+# CMD:    cmd, the object is the data of tft_cmd_data or None
+# READ:   cmd, size, the object is the buffer for the data
+# CALL:   the object is a tuple (function, args), e.g. an encoder
+# STOP:   end the thread
+#
+import _thread
+import array
+import time
+
+WINDOW = const(0)
+FILL   = const(1)
+PIXEL  = const(2)
+DATA   = const(3)
+CMD    = const(4)
+READ   = const(5)
+CALL   = const(6)
+STOP   = const(7)
+
+WORDS = const(5)  # words per slot
+
+class Ring:
+
+    def __init__(self, tft_io, slots=128):
+        self.slots = slots
+        self.words = array.array("i", [0]) * (slots * WORDS)
+        self.objs = [None] * slots
+        self.head = 0  # the next slot written by the caller
+        self.tail = 0  # the next slot run by the thread
+        self.running = False
+        self.error = None
+        self.color = bytearray(3)  # the color of fills and pixels on core 1
+# the methods used for sending and encoding, all called on core 1
+        self.io_setXY = tft_io.setXY
+        self.io_fillSCR = tft_io.fillSCR
+        self.io_drawPixel = tft_io.drawPixel
+        self.io_tft_data_DMA = tft_io.tft_data_DMA
+        self.io_tft_read_cmd_data = tft_io.tft_read_cmd_data
+        self.io_tft_cmd = tft_io.tft_cmd
+        self.io_tft_data = tft_io.tft_data
+        self.io_tft_data565_DMA = tft_io.tft_data565_DMA
+        self.io_tft_data_indexed = tft_io.tft_data_indexed
+        self.io_drawPixels = tft_io.drawPixels
+        self.io_drawPixelsColored = tft_io.drawPixelsColored
+        self.io_encode_charbitmap = tft_io.encode_charbitmap
+        self.io_encode565 = tft_io.encode565
+        self.io_encodeBMP = tft_io.encodeBMP
+        self.io_encodeBMP8 = tft_io.encodeBMP8
+#
+# Start and stop the thread on core 1. stop() waits until all commands are sent.
+#
+    def start(self):
+        self.running = True
+        _thread.start_new_thread(self.run, ())
+
+    def stop(self):
+        if self.running:
+            self.push(STOP)
+            self.sync()
+        while self.running:
+            time.sleep_us(10)
+#
+# Add a command to the ring. If the ring is full, wait for the thread.
+#
+    def push(self, kind, a=0, b=0, c=0, d=0, obj=None):
+        head = self.head
+        new_head = head + 1
+        if new_head == self.slots:
+            new_head = 0
+        while new_head == self.tail:
+            self.check()
+            time.sleep_us(10)
+        words = self.words
+        i = head * WORDS
+        words[i] = kind
+        words[i + 1] = a
+        words[i + 2] = b
+        words[i + 3] = c
+        words[i + 4] = d
+        self.objs[head] = obj
+        self.head = new_head  # publish the slot
+#
+# Tell whether commands are not sent yet, and wait until all are sent
+#
+    def busy(self):
+        return self.tail != self.head
+
+    def sync(self):
+        while self.tail != self.head:
+            self.check()
+            time.sleep_us(10)
+        self.check()
+#
+# Raise the exception of a failed command in the caller's thread
+#
+    def check(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+        if not self.running and self.tail != self.head:
+            raise RuntimeError("render thread not running")
+#
+# The thread on core 1: run the commands until STOP
+#
+    def run(self):
+        words = self.words
+        objs = self.objs
+        color = self.color
+        slots = self.slots
+        try:
+            while True:
+                tail = self.tail
+                if tail == self.head:
+                    time.sleep_us(10)
+                    continue
+                i = tail * WORDS
+                kind = words[i]
+                obj = objs[tail]
+                objs[tail] = None
+                if kind == WINDOW:
+                    self.io_setXY(words[i + 1], words[i + 2], words[i + 3], words[i + 4])
+                elif kind == FILL or kind == PIXEL:
+                    rgb = words[i + 3] if kind == PIXEL else words[i + 1]
+                    color[0] = rgb >> 16
+                    color[1] = (rgb >> 8) & 0xff
+                    color[2] = rgb & 0xff
+                    if kind == FILL:
+                        self.io_fillSCR(color, words[i + 2])
+                    else:
+                        self.io_drawPixel(words[i + 1], words[i + 2], color)
+                elif kind == DATA:
+                    self.io_tft_data_DMA(obj, words[i + 1])
+                elif kind == CMD:
+                    self.io_tft_cmd(words[i + 1])
+                    if obj is not None:
+                        self.io_tft_data(obj)
+                elif kind == READ:
+                    self.io_tft_read_cmd_data(words[i + 1], obj, words[i + 2])
+                elif kind == CALL:
+                    obj[0](*obj[1])
+                self.tail = tail + 1 if tail + 1 < slots else 0
+                if kind == STOP:
+                    break
+        except Exception as error:
+            self.error = error
+        self.running = False
+#
+# The replacements of the TFT_IO methods. Colors and command data are
+# copied, the data of bitmaps is sent from the caller's buffer.
+#
+    def setXY(self, x1, y1, x2, y2):
+        self.push(WINDOW, x1, y1, x2, y2)
+
+    def fillSCR(self, data, pixels):
+        self.push(FILL, (data[0] << 16) | (data[1] << 8) | data[2], pixels)
+
+    def drawPixel(self, x, y, color):
+        self.push(PIXEL, x, y, (color[0] << 16) | (color[1] << 8) | color[2])
+
+    def tft_data(self, data):
+        self.push(DATA, len(data), obj=bytes(data))
+
+    def tft_data_DMA(self, data, size):
+        self.push(DATA, size, obj=data)
+
+    def tft_cmd(self, cmd):
+        self.push(CMD, cmd)
+
+    def tft_cmd_data(self, cmd, data, size):
+        self.push(CMD, cmd, obj=bytes(data[0:size]))
+#
+# A read back has to wait until the data is there
+#
+    def tft_read_cmd_data(self, cmd, data, size):
+        self.push(READ, cmd, size, obj=data)
+        self.sync()
+
+    def tft_data565_DMA(self, data, pixels):
+        self.push(CALL, obj=(self.io_tft_data565_DMA, (data, pixels)))
+
+    def tft_data_indexed(self, data, pixels, bits, colortable):
+        self.push(CALL, obj=(self.io_tft_data_indexed, (data, pixels, bits, bytes(colortable))))
+
+    def drawPixels(self, coords, n, color):
+        self.push(CALL, obj=(self.io_drawPixels, (coords, n, bytes(color[0:3]))))
+
+    def drawPixelsColored(self, data, n):
+        self.push(CALL, obj=(self.io_drawPixelsColored, (data, n)))
+#
+# The encoders run on core 1 as well, writing into the scratch buffers of
+# the TFT, which are then sent by the following DATA command
+#
+    def encode_charbitmap(self, bits, size, control, bg_buf):
+        self.push(CALL, obj=(self.io_encode_charbitmap, (bits, size, bytes(control), bg_buf)))
+
+    def encode565(self, data, pixels, buffer):
+        self.push(CALL, obj=(self.io_encode565, (data, pixels, buffer)))
+
+    def encodeBMP(self, data, pixels, colortable, buffer):
+        self.push(CALL, obj=(self.io_encodeBMP, (data, pixels, bytes(colortable), buffer)))
+
+    def encodeBMP8(self, data, pixels, colortable, buffer):
+        self.push(CALL, obj=(self.io_encodeBMP8, (data, pixels, bytes(colortable), buffer)))
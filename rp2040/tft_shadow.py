@@ -0,0 +1,90 @@
+#
+# Shadow store of the background under text regions for the TFT lib
+#
+# Keeps a copy of the background of rectangles, in which transparent text
+# is printed. The copy is updated by the fills and bitmaps drawn over the
+# regions, such that the text takes its background from the copy instead of
+# reading it back from the frame memory. Text, lines, circles and pixels do
+# not change the copy, so printing text again shows it over the clean
+# background.
+#
+# Used by TFT.add_shadow(), clear_shadow(), fillRectangle(), clrSCR(),
+# drawBitmap(), printChar() and printString()
+#
+
+# index of the region fields
+X1 = const(0)
+Y1 = const(1)
+X2 = const(2)
+Y2 = const(3)
+PAGE = const(4)
+DATA = const(5)
+
+class Shadow:
+
+    def __init__(self):
+        self.regions = []
+#
+# Add a region and return its buffer, which has to be filled by the caller
+#
+    def add(self, x1, y1, x2, y2, page):
+        if x1 > x2:
+            x1, x2 = x2, x1
+        if y1 > y2:
+            y1, y2 = y2, y1
+        data = bytearray((x2 - x1 + 1) * (y2 - y1 + 1) * 3)
+        self.regions.append([x1, y1, x2, y2, page, data])
+        return data
+#
+# Yield the regions overlapping the rectangle, with the intersection
+#
+    def overlapping(self, x1, y1, x2, y2, page):
+        for region in self.regions:
+            if region[PAGE] != page:
+                continue
+            ix1, iy1 = max(x1, region[X1]), max(y1, region[Y1])
+            ix2, iy2 = min(x2, region[X2]), min(y2, region[Y2])
+            if ix1 <= ix2 and iy1 <= iy2:
+                yield region, ix1, iy1, ix2, iy2
+#
+# A fill with color
+#
+    def fill(self, x1, y1, x2, y2, page, color):
+        for region, ix1, iy1, ix2, iy2 in self.overlapping(x1, y1, x2, y2, page):
+            width = region[X2] - region[X1] + 1
+            line = bytes(color[0:3]) * (ix2 - ix1 + 1)
+            data = region[DATA]
+            for y in range(iy1, iy2 + 1):
+                pos = ((y - region[Y1]) * width + ix1 - region[X1]) * 3
+                data[pos:pos + len(line)] = line
+#
+# A bitmap of sx * sy pixels at x, y. row(n) returns the RGB data of
+# row n of the bitmap.
+#
+    def bitmap(self, x, y, sx, sy, page, row):
+        for region, ix1, iy1, ix2, iy2 in self.overlapping(x, y, x + sx - 1, y + sy - 1, page):
+            width = region[X2] - region[X1] + 1
+            size = (ix2 - ix1 + 1) * 3
+            src = (ix1 - x) * 3
+            data = region[DATA]
+            for y1 in range(iy1, iy2 + 1):
+                pos = ((y1 - region[Y1]) * width + ix1 - region[X1]) * 3
+                data[pos:pos + size] = row(y1 - y)[src:src + size]
+#
+# Copy the background of the rectangle into buffer and return True, if
+# a single region holds it
+#
+    def get(self, x1, y1, x2, y2, page, buffer):
+        for region in self.regions:
+            if (region[PAGE] == page and region[X1] <= x1 and region[Y1] <= y1
+                    and region[X2] >= x2 and region[Y2] >= y2):
+                width = region[X2] - region[X1] + 1
+                size = (x2 - x1 + 1) * 3
+                data = region[DATA]
+                dst = 0
+                for y in range(y1, y2 + 1):
+                    pos = ((y - region[Y1]) * width + x1 - region[X1]) * 3
+                    buffer[dst:dst + size] = data[pos:pos + size]
+                    dst += size
+                return True
+        return False
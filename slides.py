@@ -4,8 +4,8 @@
 import os
 import gc
 import tft
+import tft_image
 import pyb
-from struct import unpack
 from font14 import font14
 #
 # Global COnstants
@@ -25,99 +25,13 @@ TFT_SIZE = 9
 
 def displayfile(mytft, name, width, height):
     try:
-        with open(name, "rb") as f:
-            gc.collect()
-            row = 0
-            parts = name.split(".") # get extension
-            if len(parts) > 1:
-                mode = parts[-1].lower()
-            if mode == "raw": # raw 16 bit 565 format with swapped bytes
-                b = bytearray(width * 2)
-                imgheight = os.stat(name)[6] // (width * 2)
-                skip = (height - imgheight) // 2
-                if skip > 0:
-                    mytft.fillRectangle(0, 0, width - 1, skip, (0, 0, 0))
-                else:
-                    skip = 0
-                for row in range(skip, height):
-                    n = f.readinto(b)
-                    if not n:
-                        break
-                    tft.TFT_io.swapbytes(b, width * 2)
-                    mytft.drawBitmap(0, row, width, 1, b, 16)
-                mytft.fillRectangle(0, row, width - 1, height - 1, (0, 0, 0))
-            elif mode == "bmp":  # Windows bmp file
-                BM, filesize, res0, offset = unpack("<hiii", f.read(14))
-                (hdrsize, imgwidth, imgheight, planes, colors, compress, imgsize,
-                 h_res, v_res, ct_size, cti_size) = unpack("<iiihhiiiiii", f.read(40))
-                if imgwidth <= width: ##
-                    skip = ((height - imgheight) // 2)
-                    if skip > 0:
-                        mytft.fillRectangle(0, height - skip, width - 1, height - 1, (0, 0, 0))
-                    else:
-                        skip = 0
-                    if colors in (1,2,4,8):  # must have a color table
-                        if ct_size == 0: # if 0, size is 2**colors
-                            ct_size = 1 << colors
-                        colortable = bytearray(ct_size * 4)
-                        f.seek(hdrsize + 14) # go to colortable
-                        n = f.readinto(colortable) # read colortable
-                        if colors == 1:
-                            bsize = imgwidth // 8
-                        elif colors == 2:
-                            bsize = imgwidth // 4
-                        elif colors == 4:
-                            bsize = imgwidth // 2
-                        elif colors == 8:
-                            bsize = imgwidth
-                        bsize = (bsize + 3) & 0xfffc # must read a multiple of 4 bytes
-                        b = bytearray(bsize)
-                        f.seek(offset)
-                        for row in range(height - skip - 1, -1, -1):
-                            n = f.readinto(b)
-                            if n != bsize:
-                                break
-                            mytft.drawBitmap(0, row, imgwidth, 1, b, colors, colortable)
-                    else:
-                        f.seek(offset)
-                        if colors == 16:
-                            bsize = (imgwidth*2 + 3) & 0xfffc # must read a multiple of 4 bytes
-                            b = bytearray(bsize)
-                            for row in range(height - skip - 1, -1, -1):
-                                n = f.readinto(b)
-                                if n != bsize:
-                                    break
-                                mytft.drawBitmap(0, row, imgwidth, 1, b, colors)
-                        elif colors == 24:
-                            bsize = (imgwidth*3 + 3) & 0xfffc # must read a multiple of 4 bytes
-                            b = bytearray(bsize)
-                            for row in range(height - skip - 1, -1, -1):
-                                n = f.readinto(b)
-                                if n != bsize:
-                                    break
-                                mytft.drawBitmap(0, row, imgwidth, 1, b, colors)
-                    mytft.fillRectangle(0, 0, width - 1, row, (0, 0, 0))
-            elif mode == "data": # raw 24 bit format with rgb data (gimp export type data)
-                b = bytearray(width * 3)
-                imgheight = os.stat(name)[6] // (width * 3)
-                skip = (height - imgheight) // 2
-                if skip > 0:
-                    mytft.fillRectangle(0, 0, width - 1, skip, (0, 0, 0))
-                else:
-                    skip = 0
-                for row in range(skip, height):
-                    n = f.readinto(b)
-                    if not n:
-                        break
-                    tft.TFT_io.swapcolors(b, width * 3)
-                    mytft.drawBitmap(0, row, width, 1, b, 24)
-                mytft.fillRectangle(0, row, width - 1, height - 1, (0, 0, 0))
+        tft_image.displayfile(mytft, name, width, height)
         mytft.backlight(100)
         return True
     except OSError:
         mytft.clrSCR()
         return False
-        
+
 def display_batlevel(mytft, batval):
     if LOWBAT <= batval < WARNBAT:
         mytft.fillCircle(3, 3, 3, (255,255,0))
@@ -277,5 +191,5 @@ def main(v_flip = False, h_flip = False):
             PIR_flag = False
             start = COUNTER  # reset timer
 
-main()
-
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+#
+# Benchmark suite for the TFT lib
+#
+# Runs a fixed set of drawing tasks for every TFT primitive, measures the
+# time and, with tft_profile, the bus traffic, and returns the results as
+# dict, which can be saved as JSON file. It runs on the boards and with the
+# host emulation (host/bench.py). All data is generated
+# deterministically, such that the results of different releases can be
+# compared.
+#
+# Usage on the board:
+#
+#   import tft, tft_benchmark
+#   mytft = tft.TFT("SSD1963", "LB04301", tft.LANDSCAPE)
+#   tft_benchmark.run(mytft, "Pictures", out="bench.json")
+#
+import sys
+import time
+import gc
+import json
+
+import tft_profile
+from font14 import font14
+
+DIM_BG  = const(1)  # dim background data for text
+KEEP_BG = const(2)  # keep background data for text
+INV_BG  = const(4)  # invert the background data for text
+INV_FG  = const(8)  # use the inverted background data for text color
+
+VERSION = 1  # bump if the tasks change, such that results are not comparable
+
+TEXT_MODES = (0, DIM_BG, KEEP_BG, INV_BG, INV_FG,
+              DIM_BG | INV_FG, KEEP_BG | INV_FG, INV_BG | INV_FG)
+
+# sample pictures for slides.displayfile, one per format
+PICTURES = (
+    ("bmp1", "F0020_1.bmp"),
+    ("bmp4", "F0020_4.bmp"),
+    ("bmp8", "F0020_8.bmp"),
+    ("bmp16", "F0020.bmp"),
+    ("bmp24", "F0013.bmp"),
+    ("raw565", "F0010.raw"),
+    ("data24", "F0013.data"),
+)
+
+BITMAP_SIZE = 64  # bitmaps are BITMAP_SIZE x BITMAP_SIZE pixels
+
+#
+# Lines of a given slope: dx, dy for a line of about 200 pixels length
+# Every line is drawn in the four directions.
+#
+LINE_SLOPES = (
+    ("line_h", 200, 0),
+    ("line_v", 0, 200),
+    ("line_diag", 141, 141),
+    ("line_shallow", 200, 50),
+    ("line_flat", 200, 7),
+    ("line_steep", 50, 200),
+    ("line_upright", 7, 200),
+)
+
+def _lines(dx, dy, count):
+    def task(mytft):
+        w, h = mytft.getScreensize()
+        cx, cy = w // 2, h // 2
+        dx2, dy2 = min(dx, cx - 1), min(dy, cy - 1)
+        for i in range(count):
+            mytft.drawLine(cx, cy, cx + dx2, cy + dy2, (255, i, 0))
+            mytft.drawLine(cx, cy, cx - dx2, cy + dy2, (255, i, 0))
+            mytft.drawLine(cx, cy, cx + dx2, cy - dy2, (255, i, 0))
+            mytft.drawLine(cx + dx2, cy + dy2, cx, cy, (255, i, 0))
+    return task
+
+def _circles(method, radius, count):
+    def task(mytft):
+        w, h = mytft.getScreensize()
+        draw = getattr(mytft, method)
+        for i in range(count):
+            draw(w // 2, h // 2, radius, (0, 255, i))
+    return task
+
+def _pixels(colored, count):
+    coords = []
+    for i in range(count):
+        coords.append((i * 37) % 400 + 20)
+        coords.append((i * 53) % 200 + 20)
+        if colored:
+            coords.append((i * 0x10305) & 0xffffff)
+    def task(mytft):
+        if colored:
+            mytft.drawPixelsColored(coords)
+        else:
+            mytft.drawPixels(coords, (255, 255, 0))
+    return task
+
+def _rectangles(method, count):
+    def task(mytft):
+        draw = getattr(mytft, method)
+        for i in range(count):
+            draw(10 + i, 10 + i, 200 - i, 100 + i, (0, i, 255))
+    return task
+#
+# bitmaps, the same pattern in all modes. The color tables are in the
+# BMP order blue, green, red, 0
+#
+def _bitmap(mode, count):
+    pixels = BITMAP_SIZE * BITMAP_SIZE
+    if mode == 24:
+        data = bytearray(pixels * 3)
+    elif mode == 16:
+        data = bytearray(pixels * 2)
+    else:
+        data = bytearray(pixels * mode // 8)
+    for i in range(len(data)):
+        data[i] = (i * 7 + (i >> 6)) & 0xff
+    colortable = None
+    if mode <= 8:
+        colors = 1 << mode
+        colortable = bytearray(colors * 4)
+        for i in range(colors):
+            level = i * 255 // (colors - 1)
+            colortable[i * 4] = level
+            colortable[i * 4 + 1] = 255 - level
+            colortable[i * 4 + 2] = level
+    def task(mytft):
+        for i in range(count):
+            mytft.drawBitmap(i * 4, i * 2, BITMAP_SIZE, BITMAP_SIZE, data, mode, colortable)
+    return task
+
+#
+# A mostly flat bitmap like UI backgrounds or charts, in every row a run
+# of 48 pixels and 16 literal pixels, raw or PackBits compressed (RLE)
+#
+def _bitmap_flat(bits, rle, count):
+    size = bits // 8
+    data = bytearray()
+    for row in range(BITMAP_SIZE):
+        color = bytes(((row * 16 + i) & 0xff for i in range(size)))
+        literal = bytes(((row + i * 7) & 0xff for i in range(16 * size)))
+        if rle:
+            data += bytes((257 - 48,)) + color + bytes((15,)) + literal
+        else:
+            data += color * 48 + literal
+    colortable = None
+    if bits == 8:
+        colortable = bytearray(range(256)) * 4
+    mode = (0x100 | bits) if rle else bits  # 0x100 is tft.RLE
+    def task(mytft):
+        for i in range(count):
+            mytft.drawBitmap(i * 4, i * 2, BITMAP_SIZE, BITMAP_SIZE, data, mode, colortable)
+    return task
+
+#
+# copyRect: draw the bitmap or text block once and copy it count - 1 times
+# to the places the bitmap and text tasks draw to, for the comparison with
+# drawing it count times
+#
+def _copy_bitmap(mode, count):
+    draw = _bitmap(mode, 1)
+    def task(mytft):
+        draw(mytft)
+        for i in range(1, count):
+            mytft.copyRect((0, 0, BITMAP_SIZE - 1, BITMAP_SIZE - 1), (i * 4, i * 2))
+    return task
+
+def _copy_text(transparency, count):
+    draw = _text(transparency, 1)
+    def task(mytft):
+        draw(mytft)
+        x, y = mytft.getTextPos()
+        for i in range(1, count):
+            mytft.copyRect((10, 40, x - 1, 40 + font14.bits_vert - 1), (10, 40 + i * 16))
+    return task
+
+def _copy_page(count):
+    def task(mytft):
+        w, h = mytft.getScreensize()
+        if mytft.pages < 2: # no room for a second page
+            return
+        for i in range(count):
+            mytft.copyRect((0, 0, w - 1, h - 1, 0), (0, 0, 1))
+    return task
+
+def _text(transparency, count):
+    def task(mytft):
+        mytft.setTextStyle((255, 255, 255), (0, 0, 128), transparency, font14)
+        for i in range(count):
+            mytft.setTextPos(10, 40 + i * 16, scroll=False)
+            mytft.printString("The quick brown fox jumps over the lazy dog")
+        mytft.setTextStyle(transparency=0)
+    return task
+
+def _scroll(count):
+    def task(mytft):
+        w, h = mytft.getScreensize()
+        mytft.setScrollArea(0, h, 0)
+        for i in range(count):
+            mytft.scroll(1)
+        mytft.setScrollStart(0)
+    return task
+
+def _text_scroll(count):
+    def task(mytft):
+        w, h = mytft.getScreensize()
+        mytft.setScrollArea(0, h, 0)
+        mytft.setTextStyle((255, 255, 255), (0, 0, 0), 0, font14)
+        mytft.setTextPos(0, 0)
+        for i in range(count):
+            mytft.printString("line {} of the scroll test".format(i))
+            mytft.printCR()
+            mytft.printNewline(True)
+        mytft.setScrollStart(0)
+    return task
+
+def _picture(displayfile, name):
+    def task(mytft):
+        w, h = mytft.getScreensize()
+        if not displayfile(mytft, name, w, h):
+            raise OSError("cannot display " + name)
+    return task
+#
+# Return the list of tasks as (name, task) pairs
+#
+def tasks(picture_dir=None):
+    result = []
+    for name, dx, dy in LINE_SLOPES:
+        result.append((name, _lines(dx, dy, 4)))
+    for radius in (10, 50, 100):
+        result.append(("circle_{}".format(radius), _circles("drawCircle", radius, 4)))
+    for radius in (5, 10, 20, 50, 100, 200):
+        result.append(("fill_circle_{}".format(radius), _circles("fillCircle", radius, 4)))
+    result.append(("pixels", _pixels(False, 1000)))
+    result.append(("pixels_colored", _pixels(True, 1000)))
+    for method in ("drawRectangle", "fillRectangle",
+                   "drawClippedRectangle", "fillClippedRectangle"):
+        result.append((method, _rectangles(method, 10)))
+    for mode in (1, 2, 4, 8, 16, 24):
+        result.append(("bitmap_{}".format(mode), _bitmap(mode, 10)))
+    for transparency in TEXT_MODES:
+        result.append(("text_{}".format(transparency), _text(transparency, 4)))
+    for bits in (8, 16, 24):
+        result.append(("bitmap_flat_{}".format(bits), _bitmap_flat(bits, False, 10)))
+        result.append(("bitmap_rle_{}".format(bits), _bitmap_flat(bits, True, 10)))
+    for mode in (8, 24):
+        result.append(("copy_bitmap_{}".format(mode), _copy_bitmap(mode, 10)))
+    for transparency in (0, DIM_BG):
+        result.append(("copy_text_{}".format(transparency), _copy_text(transparency, 4)))
+    result.append(("copy_page", _copy_page(1)))
+    result.append(("scroll", _scroll(100)))
+    result.append(("text_scroll", _text_scroll(40)))
+    if picture_dir is not None:
+        try:
+            from slides import displayfile
+        except ImportError:
+            displayfile = None
+        if displayfile is not None:
+            for fmt, name in PICTURES:
+                result.append(("picture_" + fmt,
+                    _picture(displayfile, picture_dir + "/" + name)))
+    return result
+#
+# Run all tasks, optionally only those whose name starts with select.
+# Every task runs once for the time and once with the profiler for the
+# bus statistics.
+#
+def run(mytft, picture_dir=None, out=None, select=None, profile=True, verbose=True):
+    w, h = mytft.getScreensize()
+    results = {}
+    for name, task in tasks(picture_dir):
+        if select is not None and not name.startswith(select):
+            continue
+        mytft.clrSCR()
+        gc.collect()
+        start = time.ticks_us()
+        task(mytft)
+        res = {"us": time.ticks_diff(time.ticks_us(), start)}
+        if profile:
+            mytft.clrSCR()
+            gc.collect()
+            prof = tft_profile.Profiler(mytft)
+            task(mytft)
+            prof.remove()
+            total = prof.totals()
+            res["setxy"] = total[tft_profile.SETXY]
+            res["cmd_bytes"] = total[tft_profile.CMDS]
+            res["data_bytes"] = total[tft_profile.DATAS]
+            res["read_bytes"] = total[tft_profile.READS]
+            res["dma"] = total[tft_profile.DMAS]
+            res["est_us"] = total[tft_profile.EST_NS] // 1000
+        results[name] = res
+        if verbose:
+            print("{:<24}{:>10} us".format(name, res["us"]))
+    report = {
+        "version": VERSION,
+        "platform": sys.platform,
+        "implementation": sys.implementation.name,
+        "screen": [w, h],
+        "results": results,
+    }
+    if out is not None:
+        with open(out, "w") as f:
+            json.dump(report, f)
+    return report
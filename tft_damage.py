@@ -0,0 +1,105 @@
+#
+# Damage tracking for the TFT lib
+#
+# Records the rectangles touched by the drawing functions, by hooking into
+# the setXY() and drawPixel() functions of the TFT. Overlapping or close
+# rectangles are merged, if repainting the union costs less than repainting
+# the parts separately. The cost of an extra window is given as threshold in
+# pixels: about 800 pixels for the RP2040 (setXY 50 µs, fill 60 ns/pixel),
+# and about 28 pixels for the Pyboard (setXY 6 µs, fill 214 ns/pixel).
+#
+# Used by TFT.track_damage(), get_damage() and clear_damage()
+#
+
+class Damage:
+
+    def __init__(self, threshold, max_rects=16):
+        self.threshold = threshold
+        self.max_rects = max_rects
+        self.rects = []
+        self.paused = False  # set while windows are set for reading back
+#
+# Forget all damage
+#
+    def clear(self):
+        self.rects = []
+#
+# Return the damaged rectangles as list of (x1, y1, x2, y2) tuples,
+# which are inclusive like the arguments of setXY()
+#
+    def get(self):
+        return [tuple(r) for r in self.rects]
+#
+# number of pixels, which are repainted in addition when merging a and b
+#
+    @staticmethod
+    def extra(a, b):
+        x1, y1 = min(a[0], b[0]), min(a[1], b[1])
+        x2, y2 = max(a[2], b[2]), max(a[3], b[3])
+        union = (x2 - x1 + 1) * (y2 - y1 + 1)
+        ow = min(a[2], b[2]) - max(a[0], b[0]) + 1
+        oh = min(a[3], b[3]) - max(a[1], b[1]) + 1
+        overlap = ow * oh if ow > 0 and oh > 0 else 0
+        return (union - (a[2] - a[0] + 1) * (a[3] - a[1] + 1)
+                - (b[2] - b[0] + 1) * (b[3] - b[1] + 1) + overlap)
+#
+# Add a rectangle. The last added rectangles are checked first, since
+# successive drawing calls are mostly close to each other.
+#
+    def add(self, x1, y1, x2, y2):
+        if self.paused:
+            return
+        if x1 > x2:
+            x1, x2 = x2, x1
+        if y1 > y2:
+            y1, y2 = y2, y1
+        rects = self.rects
+        for i in range(len(rects) - 1, -1, -1):
+            q = rects[i]
+            if q[0] <= x1 and q[1] <= y1 and q[2] >= x2 and q[3] >= y2:
+                return
+        r = [x1, y1, x2, y2]
+        threshold = self.threshold
+        merged = True
+        while merged:
+            merged = False
+            for i in range(len(rects) - 1, -1, -1):
+                q = rects[i]
+                if Damage.extra(q, r) <= threshold:
+                    r = [min(q[0], r[0]), min(q[1], r[1]), max(q[2], r[2]), max(q[3], r[3])]
+                    del rects[i]
+                    merged = True
+                    break
+        rects.append(r)
+        if len(rects) > self.max_rects:
+            self.merge_cheapest()
+#
+# Too many rectangles: merge the pair with the smallest extra area
+#
+    def merge_cheapest(self):
+        rects = self.rects
+        best = None
+        for i in range(len(rects)):
+            for j in range(i + 1, len(rects)):
+                cost = Damage.extra(rects[i], rects[j])
+                if best is None or cost < best:
+                    best, bi, bj = cost, i, j
+        a, b = rects[bi], rects[bj]
+        del rects[bj]
+        rects[bi] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+#
+# Wrappers for the setXY and drawPixel functions
+#
+    def wrap_setXY(self, setXY):
+        add = self.add
+        def damage_setXY(x1, y1, x2, y2):
+            add(x1, y1, x2, y2)
+            setXY(x1, y1, x2, y2)
+        return damage_setXY
+
+    def wrap_drawPixel(self, drawPixel):
+        add = self.add
+        def damage_drawPixel(x, y, color):
+            add(x, y, x, y)
+            drawPixel(x, y, color)
+        return damage_drawPixel
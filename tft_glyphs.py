@@ -0,0 +1,58 @@
+#
+# Glyph cache for the TFT lib
+#
+# Holds the encoded RGB data of glyphs, ready to be sent to the TFT, keyed by
+# (font, char, colors), where colors is the 7 byte text_color of the TFT
+# with the background color, foreground color and transparency. The least
+# recently used glyphs are dropped when the data exceeds the byte budget.
+# Glyphs drawn with transparency depend on the frame content and are not
+# cached.
+#
+# Used by TFT.cache_glyphs(), get_glyph_stats() and printChar()
+#
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ucollections import OrderedDict
+
+class GlyphCache:
+
+    def __init__(self, budget=8192):
+        self.budget = budget
+        self.clear()
+#
+# Forget all glyphs and reset the counters
+#
+    def clear(self):
+        self.glyphs = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+#
+# Return the data of a glyph or None, and mark it as used last
+#
+    def get(self, key):
+        data = self.glyphs.pop(key, None)
+        if data is None:
+            self.misses += 1
+            return None
+        self.glyphs[key] = data
+        self.hits += 1
+        return data
+#
+# Add the data of a glyph, dropping the least recently used ones as needed
+#
+    def put(self, key, data):
+        size = len(data)
+        if size > self.budget or key in self.glyphs:
+            return
+        glyphs = self.glyphs
+        while self.size + size > self.budget:
+            self.size -= len(glyphs.pop(next(iter(glyphs))))
+        glyphs[key] = data
+        self.size += size
+#
+# Return hits, misses, number of glyphs and bytes used
+#
+    def stats(self):
+        return self.hits, self.misses, len(self.glyphs), self.size
@@ -0,0 +1,215 @@
+#
+# Streaming image decoder for the TFT lib
+#
+# Draws picture files strip by strip: every strip of rows is read with a
+# single readinto(), converted in place to the data drawBitmap() takes and
+# drawn with a single window. The strip height adapts to the free RAM. BMP
+# files, which store the rows bottom up and padded to 4 bytes, get the row
+# order reversed and the padding removed in the strip buffer. TFI files,
+# as made by host/img_to_tfi.py, hold the rows as drawBitmap() takes them,
+# such that they are sent without any conversion.
+#
+# Used by slides.py and the tft_test.py scripts
+#
+# Usage:
+#
+#   import tft_image
+#   tft_image.displayfile(mytft, "F0020.bmp", width, height)
+#
+import os
+import gc
+from struct import unpack
+
+STRIP_BYTES = const(32768)  # upper limit of the strip buffers together
+RAM_SHARE = const(4)  # the strip buffers take at most 1/RAM_SHARE of the free RAM
+TFI_HEADER = const(16)  # size of the header of TFI files
+TFI_MAGIC = b"TFI1"
+TFI_RLE = const(1)  # flag of PackBits compressed rows
+RLE = const(0x100)  # mode flag of drawBitmap for PackBits compressed data
+
+#
+# Return the number of rows of row_bytes each of a strip, at most rows
+#
+def strip_lines(row_bytes, rows, buffers=1):
+    gc.collect()
+    size = min(gc.mem_free() // RAM_SHARE, STRIP_BYTES) // buffers
+    return max(1, min(rows, size // row_bytes))
+#
+# Draw rows of imgwidth pixels with mode bits per pixel from the file f to
+# x, y and return the number of rows drawn. In the file, every row takes
+# row_bytes bytes including the padding. With bottom_up the first row of the
+# file is the bottom one. convert(buffer, size) is called for the data of
+# every strip, e.g. swapbytes or swapcolors of the TFT. If the TFT sends
+# the bitmaps asynchronously, two buffers are used in turn, such that the
+# next strip is read while the one before is sent.
+#
+def draw_strips(mytft, f, x, y, imgwidth, rows, row_bytes, mode,
+                colortable=None, bottom_up=False, convert=None):
+    line_bytes = (imgwidth * mode) >> 3
+    ring = getattr(mytft, "ring", None)
+    double = ring is not None or getattr(mytft, "async_mode", False)
+    if (imgwidth * mode) & 7: # rows do not end at a byte boundary
+        lines = 1
+    else:
+        lines = strip_lines(row_bytes, rows, 2 if double else 1)
+    buffers = [bytearray(lines * row_bytes) for _ in range(2 if double else 1)]
+    row = bytearray(row_bytes) if bottom_up and lines > 1 else None
+    done = 0
+    index = 0
+    while done < rows:
+        if ring is not None and index >= 2:
+            mytft.sync() # the ring sends from the buffer
+        buffer = buffers[index & 1]
+        data = memoryview(buffer)
+        count = min(lines, rows - done)
+        count = (f.readinto(data[:count * row_bytes]) or 0) // row_bytes
+        if count == 0:
+            break
+        if bottom_up: # reverse the order of the rows
+            for i in range(count // 2):
+                upper = i * row_bytes
+                lower = (count - 1 - i) * row_bytes
+                row[:] = data[upper:upper + row_bytes]
+                data[upper:upper + row_bytes] = data[lower:lower + row_bytes]
+                data[lower:lower + row_bytes] = row
+        if line_bytes != row_bytes: # remove the padding
+            for i in range(1, count):
+                data[i * line_bytes:(i + 1) * line_bytes] = data[i * row_bytes:i * row_bytes + line_bytes]
+        if convert is not None:
+            convert(buffer, count * line_bytes)
+        top = y + rows - done - count if bottom_up else y + done
+        mytft.drawBitmap(x, top, imgwidth, count, buffer, mode, colortable)
+        done += count
+        if double:
+            index += 1
+    return done
+#
+# Display the picture file name on a screen of width x height pixels,
+# centered vertically with black bars. Types are told by the extension:
+# .bmp: Windows BMP files with 1, 2, 4, 8, 16 or 24 bits per pixel
+# .raw: 565 type data with swapped bytes, width pixels per row
+# .data: 24 bit RGB data, width pixels per row, e.g. the GIMP export
+# .tfi: display native data, converted by host/img_to_tfi.py
+# Raises OSError if the file cannot be read.
+#
+def displayfile(mytft, name, width, height):
+    mode = name.split(".")[-1].lower()
+    with open(name, "rb") as f:
+        if mode == "raw" or mode == "data":
+            if mode == "raw":
+                row_bytes, bits, convert = width * 2, 16, mytft.swapbytes
+            else:
+                row_bytes, bits, convert = width * 3, 24, mytft.swapcolors
+            imgheight = min(os.stat(name)[6] // row_bytes, height)
+            skip = max((height - imgheight) // 2, 0)
+            drawn = draw_strips(mytft, f, 0, skip, width, imgheight,
+                                row_bytes, bits, convert=convert)
+            fill_bars(mytft, width, height, skip, skip + drawn)
+        elif mode == "tfi":
+            header = tfi_header(f)
+            if header is None or header[0] > width:
+                return
+            imgwidth, imgheight, bits, flags, colortable = header
+            skip = max((height - imgheight) // 2, 0)
+            rows = min(imgheight, height - skip)
+            if flags & TFI_RLE:
+                drawn = draw_rle_blocks(mytft, f, 0, skip, imgwidth, rows, bits, colortable)
+            else:
+                drawn = draw_strips(mytft, f, 0, skip, imgwidth, rows,
+                                    (imgwidth * bits + 7) >> 3, bits, colortable)
+            fill_bars(mytft, width, height, skip, skip + drawn)
+        elif mode == "bmp":
+            BM, filesize, res0, offset = unpack("<hiii", f.read(14))
+            (hdrsize, imgwidth, imgheight, planes, colors, compress, imgsize,
+             h_res, v_res, ct_size, cti_size) = unpack("<iiihhiiiiii", f.read(40))
+            if imgwidth > width or colors not in (1, 2, 4, 8, 16, 24):
+                return
+            bottom_up = imgheight > 0 # negative height: the rows are top down
+            imgheight = abs(imgheight)
+            skip = max((height - imgheight) // 2, 0)
+            rows = min(imgheight, height - skip)
+            top = height - skip - rows if bottom_up else skip
+            colortable = None
+            if colors <= 8: # must have a color table
+                if ct_size == 0: # if 0, size is 2**colors
+                    ct_size = 1 << colors
+                colortable = bytearray(ct_size * 4)
+                f.seek(hdrsize + 14) # go to colortable
+                f.readinto(colortable)
+            f.seek(offset)
+            row_bytes = ((imgwidth * colors + 31) >> 3) & ~3 # rows are padded to 4 bytes
+            drawn = draw_strips(mytft, f, 0, top, imgwidth, rows, row_bytes,
+                                colors, colortable, bottom_up)
+            if bottom_up:
+                fill_bars(mytft, width, height, top + rows - drawn, top + rows)
+            else:
+                fill_bars(mytft, width, height, top, top + drawn)
+#
+# Draw rows of PackBits compressed TFI data from the file f to x, y and
+# return the number of rows drawn. Every block of rows is read with a single
+# readinto() and drawn with drawBitmap(), two buffers in turn like
+# draw_strips().
+#
+def draw_rle_blocks(mytft, f, x, y, imgwidth, rows, bits, colortable=None):
+    ring = getattr(mytft, "ring", None)
+    double = ring is not None or getattr(mytft, "async_mode", False)
+    buffers = [bytearray(0), bytearray(0)]
+    header = bytearray(4)
+    done = 0
+    index = 0
+    while done < rows:
+        if f.readinto(header) != 4:
+            break
+        size, count = unpack("<HH", header)
+        if ring is not None and index >= 2:
+            mytft.sync() # the ring sends from the buffer
+        if len(buffers[index & 1]) < size:
+            buffers[index & 1] = bytearray(size)
+        buffer = buffers[index & 1]
+        if f.readinto(memoryview(buffer)[:size]) != size:
+            break
+        count = min(count, rows - done)
+        mytft.drawBitmap(x, y + done, imgwidth, count, buffer, RLE | bits, colortable)
+        done += count
+        if double:
+            index += 1
+    return done
+#
+# Read the header and the palette of a TFI file, as written by
+# host/img_to_tfi.py, and return (width, height, bits, flags, colortable), or None
+# if f is no TFI file. The file is left at the start of the rows.
+#
+def tfi_header(f):
+    header = f.read(TFI_HEADER)
+    if len(header) < TFI_HEADER or header[0:4] != TFI_MAGIC:
+        return None
+    magic, bits, flags, res0, imgwidth, imgheight, ct_size, res1 = unpack("<4sBBHHHHH", header)
+    colortable = None
+    if ct_size:
+        colortable = bytearray(ct_size * 4)
+        f.readinto(colortable)
+    return imgwidth, imgheight, bits, flags, colortable
+#
+# Draw the TFI file name at x, y and return its width and height. The rows
+# are stored as drawBitmap() takes them and are sent without conversion.
+#
+def draw_tfi(mytft, name, x=0, y=0):
+    with open(name, "rb") as f:
+        header = tfi_header(f)
+        if header is None:
+            return 0, 0
+        imgwidth, imgheight, bits, flags, colortable = header
+        if flags & TFI_RLE:
+            draw_rle_blocks(mytft, f, x, y, imgwidth, imgheight, bits, colortable)
+        else:
+            draw_strips(mytft, f, x, y, imgwidth, imgheight,
+                        (imgwidth * bits + 7) >> 3, bits, colortable)
+        return imgwidth, imgheight
+#
+# Fill the rows above first and from last on black
+#
+def fill_bars(mytft, width, height, first, last):
+    if first > 0:
+        mytft.fillRectangle(0, 0, width - 1, first - 1, (0, 0, 0))
+    if last < height:
+        mytft.fillRectangle(0, last, width - 1, height - 1, (0, 0, 0))
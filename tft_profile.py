@@ -0,0 +1,296 @@
+#
+# Bus transaction profiler for the TFT lib
+#
+# Counts the command bytes, data bytes, setXY windows, DMA transfers and
+# read back bytes caused by every public TFT method and estimates the bus
+# time from the speed figures given in rp2040/tft_pio.py, pyboard/tft_io.py
+# and pyboard/README.md. Works with both ports and the host emulator.
+#
+# Usage:
+#
+#   import tft_profile
+#   prof = tft_profile.Profiler(mytft)
+#   ... draw a screen ...
+#   prof.frame("screen 1")  # print the report and start the next frame
+#   prof.remove()           # restore the original methods
+#
+import time
+
+#
+# Kind of bus transaction caused by a TFT_IO method
+#
+WINDOW   = const(0)  # setXY: 3 command bytes, 8 data bytes
+PIXEL    = const(1)  # drawPixel: window plus one pixel
+FILL     = const(2)  # args[1] pixels of a constant color
+PIXELS   = const(3)  # args[1] pixels of bitmap data
+DATA     = const(4)  # data bytes, size in args[1] or len(args[0])
+CMD      = const(5)  # a single command byte
+CMD_DATA = const(6)  # command byte plus args[2] data bytes
+READ     = const(7)  # command byte plus args[2] read back bytes
+PIXEL_LIST = const(8)  # args[1] drawPixel sequences sent by DMA
+CHAIN    = const(9)  # args[0] is a list of window, fill and data operations
+
+CHAIN_FILL = const(0)    # operations of tft_chain
+CHAIN_WINDOW = const(3)
+
+#
+# Cost tables: name: (kind, fixed ns per call, ns per pixel or byte, DMA)
+# The rp2040 figures are from tft_pio.py. The data write speed is not
+# documented there and taken as 1/3 of the fill speed per pixel.
+#
+COST_RP2040 = {
+    "setXY": (WINDOW, 50_000, 0, False),
+    "drawPixel": (PIXEL, 85_000, 0, False),
+    "fillSCR": (FILL, 0, 60, True),
+    "tft_data": (DATA, 0, 20, False),
+    "tft_data_DMA": (DATA, 0, 20, True),
+    "tft_cmd": (CMD, 0, 0, False),
+    "tft_cmd_data": (CMD_DATA, 0, 20, False),
+    "tft_read_cmd_data": (READ, 0, 120, True),
+    "tft_read_cmd_data_poll": (READ, 0, 14_000, False),
+# 17 words per pixel, about 57 PIO cycles of 40 ns, without the encoding time
+    "drawPixels": (PIXEL_LIST, 0, 2_280, True),
+    "drawPixelsColored": (PIXEL_LIST, 0, 2_280, True),
+    "tft_queue": (DATA, 0, 120, True),
+    "tft_data565_DMA": (PIXELS, 0, 400, True),
+    "tft_data_indexed": (PIXELS, 0, 360, True),
+# per window 13 words, about 40 PIO cycles of 40 ns
+    "tft_chain": (CHAIN, 0, 1_600, True),
+}
+#
+# The Pyboard figures are from tft_io.py and the speed remarks in README.md.
+# The viper functions need about twice the time of the assembler ones.
+#
+COST_PYBOARD = {
+    "setXY": (WINDOW, 6_000, 0, False),
+    "setXY_L": (WINDOW, 6_000, 0, False),
+    "setXY_P": (WINDOW, 6_000, 0, False),
+    "drawPixel": (PIXEL, 9_000, 0, False),
+    "drawPixel_L": (PIXEL, 9_000, 0, False),
+    "drawPixel_P": (PIXEL, 9_000, 0, False),
+    "fillSCR_AS": (FILL, 4_000, 214, False),
+    "displaySCR_AS": (PIXELS, 4_000, 266, False),
+    "displaySCR565_AS": (PIXELS, 4_000, 266, False),
+    "displaySCR_bmp": (PIXELS, 4_000, 532, False),
+    "displaySCR_charbitmap": (PIXELS, 4_000, 532, False),
+    "tft_cmd": (CMD, 4_000, 0, False),
+    "tft_cmd_data": (CMD_DATA, 4_000, 240, False),
+    "tft_cmd_data_AS": (CMD_DATA, 4_000, 120, False),
+    "tft_write_data_AS": (DATA, 4_000, 120, False),
+    "tft_read_cmd_data_AS": (READ, 4_000, 130, False),
+}
+
+#
+# Index of the counters
+#
+CALLS  = const(0)
+SETXY  = const(1)
+CMDS   = const(2)
+DATAS  = const(3)
+READS  = const(4)
+DMAS   = const(5)
+EST_NS = const(6)
+MEAS_US = const(7)
+N_COUNTERS = const(8)
+
+DIRECT = "(direct)"
+
+class Profiler:
+
+    def __init__(self, mytft, cost=None):
+        self.tft = mytft
+        io = mytft.tft_io
+        if cost is None:
+            cost = COST_PYBOARD if hasattr(io, "fillSCR_AS") else COST_RP2040
+        self.cost = cost
+        self.patched = []  # (object, name, original or None)
+        self.method = DIRECT
+        self.depth = 0
+        self.in_io = False
+        self.reset()
+#
+# The TFT caches some TFT_IO methods as instance attributes. Wrap these,
+# then the TFT_IO methods themselves for the calls through self.tft_io
+#
+        inst = mytft.__dict__
+        for name in cost:
+            if name in inst:
+                self._patch(mytft, name, self._wrap_io(name, inst[name]), inst[name])
+            if hasattr(io, name):
+                self._patch(io, name, self._wrap_io(name, getattr(io, name)),
+                    io.__dict__.get(name))
+#
+# Wrap the public TFT methods, which are not cached IO methods
+#
+        for name in dir(type(mytft)):
+            if name[0] != "_" and name not in inst:
+                func = getattr(mytft, name)
+                if callable(func):
+                    self._patch(mytft, name, self._wrap_tft(name, func), None)
+#
+# Set an attribute and remember how to undo it
+#
+    def _patch(self, obj, name, func, orig):
+        setattr(obj, name, func)
+        self.patched.append((obj, name, orig))
+#
+# Restore the original methods
+#
+    def remove(self):
+        for obj, name, orig in reversed(self.patched):
+            if orig is None:
+                delattr(obj, name)
+            else:
+                setattr(obj, name, orig)
+        self.patched = []
+#
+# Wrapper for a public TFT method. Only the outermost call is accounted,
+# calls of other TFT methods from inside count to the caller.
+#
+    def _wrap_tft(self, name, func):
+        def wrapper(*args, **kwargs):
+            if self.depth:
+                self.depth += 1
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.depth -= 1
+            self.depth = 1
+            self.method = name
+            self._counters(name)[CALLS] += 1
+            start = time.ticks_us()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._counters(name)[MEAS_US] += time.ticks_diff(time.ticks_us(), start)
+                self.depth = 0
+                self.method = DIRECT
+        return wrapper
+#
+# Wrapper for a TFT_IO method. Calls nested in another IO method
+# (e.g. tft_cmd inside tft_cmd_data) are not counted twice.
+#
+    def _wrap_io(self, name, func):
+        kind, fixed, per_unit, dma = self.cost[name]
+        def wrapper(*args):
+            if self.in_io:
+                return func(*args)
+            self.in_io = True
+            try:
+                self._account(kind, fixed, per_unit, dma, args)
+                return func(*args)
+            finally:
+                self.in_io = False
+        return wrapper
+#
+# Add the cost of a single IO call to the counters of the current method
+#
+    def _account(self, kind, fixed, per_unit, dma, args):
+        c = self._counters(self.method)
+        if self.method == DIRECT:
+            c[CALLS] += 1
+        ns = fixed
+        if kind == WINDOW:
+            c[SETXY] += 1
+            c[CMDS] += 3
+            c[DATAS] += 8
+        elif kind == PIXEL:
+            c[SETXY] += 1
+            c[CMDS] += 3
+            c[DATAS] += 11
+        elif kind == PIXEL_LIST:
+            c[SETXY] += args[1]
+            c[CMDS] += args[1] * 3
+            c[DATAS] += args[1] * 11
+            ns += args[1] * per_unit
+        elif kind == FILL or kind == PIXELS:
+            c[DATAS] += args[1] * 3
+            ns += args[1] * per_unit
+        elif kind == DATA:
+            size = args[1] if len(args) > 1 else len(args[0])
+            c[DATAS] += size
+            ns += size * per_unit
+        elif kind == CMD:
+            c[CMDS] += 1
+        elif kind == CMD_DATA:
+            c[CMDS] += 1
+            c[DATAS] += args[2]
+            ns += args[2] * per_unit
+        elif kind == READ:
+            c[CMDS] += 1
+            c[READS] += args[2]
+            ns += args[2] * per_unit
+        elif kind == CHAIN:
+            for op in args[0]:
+                if op[0] == CHAIN_WINDOW:
+                    c[SETXY] += 1
+                    c[CMDS] += 3
+                    c[DATAS] += 8
+                    ns += per_unit
+                elif op[0] == CHAIN_FILL:
+                    c[DATAS] += op[2] * 3
+                    ns += op[2] * self.cost["fillSCR"][2]
+                else:
+                    c[DATAS] += op[2]
+                    ns += op[2] * self.cost["tft_data_DMA"][2]
+        if dma:
+            c[DMAS] += 1
+        c[EST_NS] += ns
+
+    def _counters(self, name):
+        c = self.stats.get(name)
+        if c is None:
+            c = self.stats[name] = [0] * N_COUNTERS
+        return c
+#
+# Clear all counters
+#
+    def reset(self):
+        self.stats = {}
+#
+# Return the sum over all methods as list of counters
+#
+    def totals(self):
+        total = [0] * N_COUNTERS
+        for c in self.stats.values():
+            for i in range(N_COUNTERS):
+                total[i] += c[i]
+        return total
+#
+# Return the counters as dict: method name: dict of counters
+#
+    def result(self):
+        names = ("calls", "setxy", "cmd_bytes", "data_bytes", "read_bytes",
+                 "dma", "est_us", "meas_us")
+        res = {}
+        for name, c in self.stats.items():
+            res[name] = d = dict(zip(names, c))
+            d["est_us"] = c[EST_NS] // 1000
+        return res
+#
+# Print the per method table and the totals, and return the totals
+#
+    def report(self, title=None):
+        if title:
+            print(title)
+        print("{:<16}{:>7}{:>7}{:>7}{:>10}{:>8}{:>6}{:>10}{:>10}".format(
+            "method", "calls", "setXY", "cmd", "data", "read", "DMA", "est_us", "meas_us"))
+        for name in sorted(self.stats):
+            self._print_line(name, self.stats[name])
+        total = self.totals()
+        self._print_line("total", total)
+        return total
+
+    def _print_line(self, name, c):
+        print("{:<16}{:>7}{:>7}{:>7}{:>10}{:>8}{:>6}{:>10}{:>10}".format(
+            name, c[CALLS], c[SETXY], c[CMDS], c[DATAS], c[READS], c[DMAS],
+            c[EST_NS] // 1000, c[MEAS_US]))
+#
+# Report the frame and start the next one
+#
+    def frame(self, title=None):
+        total = self.report(title)
+        print("this frame cost {} setXY calls and {} bytes".format(
+            total[SETXY], total[CMDS] + total[DATAS] + total[READS]))
+        self.reset()
+        return total
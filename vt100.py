@@ -332,4 +332,5 @@ def test():
                 break
     tty.printStr('\x0c')
 
-test()
+if __name__ == "__main__":
+    test()